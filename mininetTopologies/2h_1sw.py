@@ -32,12 +32,21 @@
 #
 
 # Do necessary imports
+import argparse
 from mininet.net import Mininet
 from mininet.cli import CLI
 from mininet.link import Link
+import bulkxfer
+from nodeconfig import NodeConfig
 
 if '__main__' == __name__:
 
+    parser = argparse.ArgumentParser(
+        description='Two hosts in one VLAN on L2 switch s5' )
+    parser.add_argument( '--xfer', action='store_true',
+                         help='measure h1 -> h2 throughput with bulkxfer' )
+    args = parser.parse_args()
+
     net = Mininet()
 
     # Add Hosts
@@ -71,17 +80,18 @@ if '__main__' == __name__:
     s5.cmd("ifconfig s5-eth0 0")
     s5.cmd("ifconfig s5-eth1 0")
 
-    # Create a vlan 10 on Switch s5
-    # Note to use brctl, you must have bridge-utils pkg installed.
-    # apt-get install bridge-utils
-    s5.cmd("brctl addbr vlan10")
+    # Create a vlan 10 on Switch s5: a Linux bridge made with iproute2
+    # (no bridge-utils needed), queued and pushed in one round trip
+    s5c = NodeConfig(s5)
+    s5c.bridgeAdd('vlan10')
     # Bring up the Vlan interfaces on L2 switch up
-    s5.cmd("ifconfig vlan10 up")
+    s5c.linkUp('vlan10')
 
     # Add s5-eth0 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth0")
+    s5c.linkMaster('s5-eth0', 'vlan10')
     # Add s5-eth1 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth1")
+    s5c.linkMaster('s5-eth1', 'vlan10')
+    s5c.run()
 
 
     # Assign IP Address to Hosts as ususal
@@ -90,7 +100,12 @@ if '__main__' == __name__:
 
     h1.cmd("ip route add default via 10.0.10.254 dev h1-eth0")
     h2.cmd("ip route add default via 10.0.10.254 dev h2-eth0")
-    
+
+    # Optionally measure h1 -> h2 throughput through s5
+    if args.xfer:
+        bulkxfer.serve( [ h2 ] )
+        bulkxfer.show( bulkxfer.transfer( h1, '10.0.10.2', streams=4 ) )
+
     # Start Mininet Cli prompt
     CLI(net)
 
@@ -35,6 +35,7 @@
 from mininet.net import Mininet
 from mininet.cli import CLI
 from mininet.link import Link
+from vlanswitch import VlanSwitch
 
 if '__main__' == __name__:
 
@@ -47,8 +48,12 @@ if '__main__' == __name__:
     h3 = net.addHost('h3')
     h4 = net.addHost('h4')
 
-    #Add L2 Switch s5
-    s5 = net.addHost('s5')
+    #Add L2 Switch s5: one VLAN-filtering bridge with s5-eth0 and
+    #s5-eth1 as access ports in vlan 10, s5-eth2 and s5-eth3 in vlan 20.
+    #VlanSwitch configures it when the net is built
+    s5 = net.addHost('s5', cls=VlanSwitch,
+                     access={'s5-eth0': 10, 's5-eth1': 10,
+                             's5-eth2': 20, 's5-eth3': 20})
 
     # link names are auto generated in the order eth0 eth1 eth2..
     # as they are added on the device
@@ -74,33 +79,6 @@ if '__main__' == __name__:
     h3.cmd("ifconfig h3-eth0 0")
     h4.cmd("ifconfig h4-eth0 0")
 
-    # Remove default IP addresses from Switch's Interfaces.
-    # Switch Interfaces do not contain any IP addresses anyway
-    s5.cmd("ifconfig s5-eth0 0")
-    s5.cmd("ifconfig s5-eth1 0")
-    s5.cmd("ifconfig s5-eth2 0")
-    s5.cmd("ifconfig s5-eth3 0")
-
-    # Create a vlan 10 on Switch s5
-    # Note to use brctl, you must have bridge-utils pkg installed.
-    # apt-get install bridge-utils
-    s5.cmd("brctl addbr vlan10")
-    s5.cmd("brctl addbr vlan20")
-
-    # Bring up the Vlan interfaces on L2 switch up
-    s5.cmd("ifconfig vlan10 up")
-    s5.cmd("ifconfig vlan20 up")
-
-    # Add s5-eth0 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth0")
-    # Add s5-eth1 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth1")
-
-    # Add s5-eth2 to vlan 20 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan20 s5-eth2")
-    # Add s5-eth3 to vlan 20 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan20 s5-eth3")
-
     # Assign IP Address to Hosts as ususal
     h1.cmd("ifconfig h1-eth0 10.0.10.1 netmask 255.255.255.0")
     h2.cmd("ifconfig h2-eth0 10.0.10.2 netmask 255.255.255.0")
@@ -9,7 +9,7 @@ topology enables one to pass in '--topo=mytopo' from the command line.
 
 To run this program, on terminal trigger the below command :
     
-    sudo python CustomTopo_2h2s.py
+    sudo python3 CustomTopo_2h2s.py
 
 """
 
@@ -27,6 +27,7 @@ from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.cli import CLI
 from mininet.util import dumpNodeConnections
+from connectivity import pingMatrix
 
 #Topology Description here
 class MyTopo( Topo ):
@@ -40,7 +41,6 @@ class MyTopo( Topo ):
 
         # Add hosts and switches
         h1 = self.addHost( 'h1' )
-	h1.cmd('sysctl net.ipv4.ip_forward=1')
         h2 = self.addHost( 'h2' )
         s1 = self.addSwitch( 's1' )
         s2 = self.addSwitch( 's2' )
@@ -61,11 +61,14 @@ net = Mininet(topo=customTopo)
 #start/deploy the Topology
 net.start()
 
-print "Dumping host connections"
+# Topo nodes are only names, so node commands run once the net is up
+net[ 'h1' ].cmd('sysctl net.ipv4.ip_forward=1')
+
+print("Dumping host connections")
 dumpNodeConnections(net.hosts)
 
-print "Testing network connectivity"
-net.pingAll()
+print("Testing network connectivity")
+pingMatrix(net.hosts)
 
 #Get Halt at Mininet CLI prompt
 CLI(net)
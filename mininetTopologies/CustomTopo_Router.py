@@ -4,6 +4,9 @@ from mininet.node import Node
 from mininet.log import setLogLevel, info
 from mininet.cli import CLI
 
+from nodeconfig import NodeConfig
+from procnet import netDev
+
 
 class LinuxRouter( Node ):
     "A Node with IP forwarding enabled."
@@ -18,6 +21,48 @@ class LinuxRouter( Node ):
         super( LinuxRouter, self ).terminate()
 
 
+class VlanRouter( Node ):
+    """A router on a stick: one VLAN subinterface, with its gateway
+       address, per VLAN on a single trunk interface"""
+
+    def config( self, vlans=None, trunk=None, **params ):
+        """vlans: { vid: gateway address }, e.g. { 10: '10.0.10.254/24' }
+           trunk: interface carrying the VLANs (default interface)"""
+        r = super( VlanRouter, self ).config( **params )
+        self.vlans = dict( ( int( vid ), cidr )
+                           for vid, cidr in ( vlans or {} ).items() )
+        self.trunk = str( trunk or self.defaultIntf() )
+        # Subinterfaces, addresses and forwarding in one batch
+        config = NodeConfig( self )
+        config.addrFlush( self.trunk )
+        config.linkUp( self.trunk )
+        for vid, cidr in sorted( self.vlans.items() ):
+            intf = self.vlanIntf( vid )
+            config.vlanAdd( self.trunk, vid, intf )
+            config.addrAdd( intf, cidr )
+            config.linkUp( intf )
+        config.ipForward()
+        config.run()
+        return r
+
+    def vlanIntf( self, vid ):
+        "Name of the subinterface for VLAN vid."
+        return '%s.%d' % ( self.trunk, vid )
+
+    def counters( self ):
+        """Return { vid: { counter: value } } from /proc/<pid>/net/dev:
+           the counters of each VLAN's subinterface, so rx_*/tx_* count
+           everything received from/sent to the VLAN, including traffic
+           to and from the router itself (ARP, pings of its gateway)"""
+        stats = netDev( self.pid )
+        return dict( ( vid, stats[ self.vlanIntf( vid ) ] )
+                     for vid in self.vlans if self.vlanIntf( vid ) in stats )
+
+    def terminate( self ):
+        self.cmd( 'sysctl net.ipv4.ip_forward=0' )
+        super( VlanRouter, self ).terminate()
+
+
 class NetworkTopo( Topo ):
     "A LinuxRouter connecting three IP subnets"
 
@@ -13,8 +13,8 @@
 #           |        +----------+                            |                                +----------+        |
 #           +--------+10.0.10.1/24                           |                                |  h4-eth0 |        |
 #                               |                            |                                |          +--++----+
-#                               |                            |s5-eth4.10, vlan 10             |                
-#                               |                            |s5-eth4.20, vlan 20             |                
+#                               |                            |s5-eth4, trunk                  |                
+#                               |                            |vlan 10 and 20                  |                
 #                               |                  s5-eth0+--+------+s5-eth3                  |
 #                               +-------------------------+         +-------------------------+
 #                                                   vlan10|   s5    +vlan20                                     
@@ -34,10 +34,34 @@
 # Do necessary imports
 from mininet.net import Mininet
 from mininet.cli import CLI
+import argparse
 from mininet.link import Link,TCLink,Intf
+from nodeconfig import NodeConfig, runConfigs
+from routecompiler import RouteCompiler
+from vlanswitch import VlanSwitch
+from CustomTopo_Router import VlanRouter
+from throughput import runFlows
+from ifstats import IfSampler
+import snapshot
+import linkflap
 
 if '__main__' == __name__:
 
+    parser = argparse.ArgumentParser(
+        description='Inter-VLAN routing between two VLANs through r' )
+    parser.add_argument( '--save', metavar='FILE',
+                         help='save the configured state to FILE' )
+    parser.add_argument( '--restore', metavar='FILE',
+                         help='restore the state saved in FILE instead of '
+                         'configuring from scratch' )
+    parser.add_argument( '--throughput', action='store_true',
+                         help='run TCP flows between all pairs of hosts' )
+    parser.add_argument( '--flap', action='store_true',
+                         help='flap the s5 - r trunk while probing h1 -> h3' )
+    parser.add_argument( '--ifstats', action='store_true',
+                         help='sample interface counters while the CLI runs' )
+    args = parser.parse_args()
+
     net = Mininet(link=TCLink)
 
     # Add Hosts
@@ -46,11 +70,23 @@ if '__main__' == __name__:
     h3 = net.addHost('h3')
     h4 = net.addHost('h4')
 
-    #Add L2 Switch s5
-    s5 = net.addHost('s5')
-
-    #r is a router
-    r = net.addHost('r')
+    #Add L2 Switch s5: one VLAN-filtering bridge with s5-eth0 and
+    #s5-eth1 as access ports in vlan 10, s5-eth2 and s5-eth3 in vlan 20,
+    #and s5-eth4 as the trunk to r carrying both. This is equivalent to:
+    # a. Make s5-eth4 of L2switch as Trunk, and
+    # b. Adding s5-eth4 to vlan 10 and 20 both
+    #VlanSwitch configures it when the net is built
+    s5 = net.addHost('s5', cls=VlanSwitch,
+                     access={'s5-eth0': 10, 's5-eth1': 10,
+                             's5-eth2': 20, 's5-eth3': 20},
+                     trunks={'s5-eth4': [10, 20]})
+
+    #r is a router on a stick: VlanRouter creates the Virtual LAN
+    #Interfaces r-eth0.10 and r-eth0.20 on the trunk r-eth0, assigns
+    #their IP addresses (which makes them SVIs, Switch Virtual
+    #Interfaces) and enables IP forwarding
+    r = net.addHost('r', cls=VlanRouter, trunk='r-eth0',
+                    vlans={10: '10.0.10.254/24', 20: '10.0.20.254/24'})
 
     # link names are auto generated in the order eth0 eth1 eth2..
     # as they are added on the device
@@ -70,38 +106,42 @@ if '__main__' == __name__:
 
     net.build()
 
+    # Queue each node's configuration instead of running it command by
+    # command; each node's whole queue is pushed in one shell round trip
+    h1c, h2c, h3c, h4c, rc = [ NodeConfig( n ) for n in ( h1, h2, h3, h4, r ) ]
+
     # Remove default IP addresses from host's interfaces 
-    h1.cmd("ifconfig h1-eth0 0")
-    h2.cmd("ifconfig h2-eth0 0")
-    h3.cmd("ifconfig h3-eth0 0")
-    h4.cmd("ifconfig h4-eth0 0")
-
-    # Remove default IP addresses from Switch's Interfaces.
-    # Switch Interfaces do not contain any IP addresses anyway
-    s5.cmd("ifconfig s5-eth0 0")
-    s5.cmd("ifconfig s5-eth1 0")
-    s5.cmd("ifconfig s5-eth2 0")
-    s5.cmd("ifconfig s5-eth3 0")
-    s5.cmd("ifconfig s5-eth4 0")
-
-    # Remove default IP addresses from Router's Interface
-    r.cmd("ifconfig r-eth0 0")
-
-    # Enable IP Forwarding on Router r
-    r.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-
-    # Assign Node IP address (also called loopback addr) to L3 device
-    r.cmd('ifconfig lo 122.1.1.122 netmask 255.255.255.255')
-    
+    h1c.cmd("ifconfig h1-eth0 0")
+    h2c.cmd("ifconfig h2-eth0 0")
+    h3c.cmd("ifconfig h3-eth0 0")
+    h4c.cmd("ifconfig h4-eth0 0")
+
+    # Interface addresses of every L3 device: VLAN 10 is 10.0.10.0/24,
+    # VLAN 20 is 10.0.20.0/24, and r's SVIs are .254 in each
+    addresses = {
+        'h1-eth0' : '10.0.10.1/24',
+        'h2-eth0' : '10.0.10.2/24',
+        'h3-eth0' : '10.0.20.1/24',
+        'h4-eth0' : '10.0.20.2/24',
+        'r-eth0.10' : '10.0.10.254/24',
+        'r-eth0.20' : '10.0.20.254/24',
+    }
+
+    # Node IP address (also called loopback addr) of every L3 device
+    loopbacks = {
+        'h1' : '122.1.1.1',
+        'h2' : '122.1.1.2',
+        'h3' : '122.1.1.3',
+        'h4' : '122.1.1.4',
+        'r' : '122.1.1.122',
+    }
+    configs = { 'h1' : h1c, 'h2' : h2c, 'h3' : h3c, 'h4' : h4c, 'r' : rc }
+    for name, addr in sorted( loopbacks.items() ):
+        configs[ name ].loopback( addr )
+
     # Assign IP Address to Hosts as ususal
-    h1.cmd("ifconfig h1-eth0 10.0.10.1 netmask 255.255.255.0")
-    h1.cmd('ifconfig lo 122.1.1.1 netmask 255.255.255.255')
-    h2.cmd("ifconfig h2-eth0 10.0.10.2 netmask 255.255.255.0")
-    h2.cmd('ifconfig lo 122.1.1.2 netmask 255.255.255.255')
-    h3.cmd("ifconfig h3-eth0 10.0.20.1 netmask 255.255.255.0")
-    h3.cmd('ifconfig lo 122.1.1.3 netmask 255.255.255.255')
-    h4.cmd("ifconfig h4-eth0 10.0.20.2 netmask 255.255.255.0")
-    h4.cmd('ifconfig lo 122.1.1.4 netmask 255.255.255.255')
+    for intf in ( 'h1-eth0', 'h2-eth0', 'h3-eth0', 'h4-eth0' ):
+        configs[ intf.split( '-' )[ 0 ] ].addrAdd( intf, addresses[ intf ] )
     
     
     
@@ -110,107 +150,52 @@ if '__main__' == __name__:
     
     
     
-    # s5-eth4 interface of switch s5 is connected to L3 router r.
-    # Therefore for Inter-Vlan routing, s5-eth4 interface need to 
-    # operate in Trunk mode in vlan 10 and 20. This is achieved by
-    # creating two virtual interfaces viz s5-eth4.10 and s5-eth4.20 
-    # out of actual physical interface s5-eth4 first. And then we 
-    # will add them to vlan 10 and 20 respectively. 
-    # This is equivalent to :
-    # a. Make s5-eth4 of L2switch as Trunk, and
-    # b. Adding s5-eth4 to vlan 10 and 20 both
-    # Note : To use vconfig, you should have vlan pkg install.
-    # apt-get install vlan
-    s5.cmd("vconfig add s5-eth4 10") # Create a Virtual LAN Interface s5-eth4.10 and mark it as Trunk 
-    s5.cmd("vconfig add s5-eth4 20") # Create a Virtual LAN Interface s5-eth4.20 and mark it as Trunk
-    
-    # bring the new vlan ports up
-    s5.cmd("ifconfig s5-eth4.10 up")
-    s5.cmd("ifconfig s5-eth4.20 up")
-
-
-    # Router's r-eth0 physical interface is connected to L2 swotch s5.
-    # We need to do same thing here, Create Virtual interface out of
-    # r-eth0 viz r-eth0.10 and r-eth0.20
-    r.cmd("vconfig add r-eth0 10") # Create a Virtual LAN Interface r-eth0.10 and mark it as Trunk
-    r.cmd("vconfig add r-eth0 20") # Create a Virtual LAN Interface r-eth0.20 and mark it as Trunk
-    r.cmd("ifconfig r-eth0.10 up");
-    r.cmd("ifconfig r-eth0.20 up");
-
-    # Create a vlan 10 on Switch s5
-    # Note to use brctl, you must have bridge-utils pkg installed.
-    # apt-get install bridge-utils
-    s5.cmd("brctl addbr vlan10")
-    # Create a vlan 20 on Switch s5
-    s5.cmd("brctl addbr vlan20")
-
-
-    # Add s5-eth0 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth0")
-    # Add s5-eth1 to vlan 10 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan10 s5-eth1")
-    # Add s5-eth4.10 to vlan 10 on L2 siwtch in Trunk Mode
-    s5.cmd("brctl addif vlan10 s5-eth4.10")
-    # Add s5-eth2 to vlan 20 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan20 s5-eth2")
-    # Add s5-eth3 to vlan 20 on L2 siwtch in Access mode
-    s5.cmd("brctl addif vlan20 s5-eth3")
-    # Add s5-eth4.20 to vlan 20 on L2 siwtch in Trunk Mode
-    s5.cmd("brctl addif vlan20 s5-eth4.20")
-
-    # Bring up the Vlan interfaces on L2 switch up
-    s5.cmd("ifconfig vlan10 up")
-    s5.cmd("ifconfig vlan20 up")
-    
-    # Assign IP Address to Virtual LAN Interfaces on Router. By assigning
-    # IP address, r-eth0.10 becomes SVI (Switch Virtual Interface)
-    r.cmd("ifconfig r-eth0.10 10.0.10.254 netmask 255.255.255.0")
-    r.cmd("ifconfig r-eth0.20 10.0.20.254 netmask 255.255.255.0")
-
-    # Lets us add actual L3 route to h1 instead of default. We have
-    # commented out the default route entry for h1
-    h1.cmd("ip route add to 10.0.20.0/24 via 10.0.10.254 dev h1-eth0")
-    #h1.cmd("ip route add default via 10.0.10.254 dev h1-eth0")
-    
-    h2.cmd("ip route add to 10.0.20.0/24 via 10.0.10.254 dev h2-eth0")
-
-    h3.cmd("ip route add to 10.0.10.0/24 via 10.0.20.254 dev h3-eth0")
-    h4.cmd("ip route add to 10.0.10.0/24 via 10.0.20.254 dev h4-eth0")
-
-    # Tell Each L3 device in the Topology (All hosts + L3 Router)
-    # to how to reach every other L3 device in the topology through 
-    # device's loopback addresses
-    # h1
-    h1.cmd("ip route add to 122.1.1.2/32 via 10.0.10.254 dev h1-eth0")
-    h1.cmd("ip route add to 122.1.1.3/32 via 10.0.10.254 dev h1-eth0")
-    h1.cmd("ip route add to 122.1.1.4/32 via 10.0.10.254 dev h1-eth0")
-    h1.cmd("ip route add to 122.1.1.122/32 via 10.0.10.254 dev h1-eth0")
-
-    #h2
-    h2.cmd("ip route add to 122.1.1.1/32 via 10.0.10.254 dev h2-eth0")
-    h2.cmd("ip route add to 122.1.1.3/32 via 10.0.10.254 dev h2-eth0")
-    h2.cmd("ip route add to 122.1.1.4/32 via 10.0.10.254 dev h2-eth0")
-    h2.cmd("ip route add to 122.1.1.122/32 via 10.0.10.254 dev h2-eth0")
-
-    #h3
-    h3.cmd("ip route add to 122.1.1.1/32 via 10.0.20.254 dev h3-eth0")
-    h3.cmd("ip route add to 122.1.1.2/32 via 10.0.20.254 dev h3-eth0")
-    h3.cmd("ip route add to 122.1.1.4/32 via 10.0.20.254 dev h3-eth0")
-    h3.cmd("ip route add to 122.1.1.122/32 via 10.0.20.254 dev h3-eth0")
-
-    #h4
-    h4.cmd("ip route add to 122.1.1.1/32 via 10.0.20.254 dev h4-eth0")
-    h4.cmd("ip route add to 122.1.1.2/32 via 10.0.20.254 dev h4-eth0")
-    h4.cmd("ip route add to 122.1.1.3/32 via 10.0.20.254 dev h4-eth0")
-    h4.cmd("ip route add to 122.1.1.122/32 via 10.0.20.254 dev h4-eth0")
-
-    #r
-    r.cmd("ip route add to 122.1.1.1/32 via 10.0.10.1 dev r-eth0.10")
-    r.cmd("ip route add to 122.1.1.2/32 via 10.0.10.2 dev r-eth0.10")
-    r.cmd("ip route add to 122.1.1.3/32 via 10.0.20.1 dev r-eth0.20")
-    r.cmd("ip route add to 122.1.1.4/32 via 10.0.20.2 dev r-eth0.20")
+    # Tell each L3 device in the topology (all hosts + L3 router) how
+    # to reach every other L3 device's subnet and loopback address. The
+    # routes are computed from the addresses above instead of being
+    # written by hand, then collapsed into the fewest equivalent routes:
+    # each host gets one default route via its VLAN's SVI, and r one
+    # route per loopback behind it
+    routes = RouteCompiler.fromNet( net, addresses, loopbacks,
+                                    hosts=( 'h1', 'h2', 'h3', 'h4' ) )
+    routes.install( [ h1c, h2c, h3c, h4c, rc ], aggregate=True )
+
+    # Push the queued configuration to all nodes in parallel; this returns
+    # once every node is configured. With --restore FILE, the state saved
+    # by an earlier run with --save FILE is put back instead
+    if args.restore:
+        snapshot.restore( net.hosts, snapshot.load( args.restore ) )
+    else:
+        runConfigs( [ h1c, h2c, h3c, h4c, rc ] )
+    if args.save:
+        snapshot.save( snapshot.capture( net.hosts ), args.save )
+
+    # With --throughput, load the network with TCP flows between all
+    # pairs of hosts at once: same-VLAN flows cross s5's bridge only,
+    # the others are routed by r
+    if args.throughput:
+        runFlows( net, 'all', hosts=[ h1, h2, h3, h4 ], duration=5 )
+
+    # With --flap, take the s5 - r trunk down and up twice while probing
+    # h1 (VLAN 10) -> h3 (VLAN 20) through r, and record each event's
+    # outage and loss
+    if args.flap:
+        linkflap.show( linkflap.run(
+            net, h1, h3, '10.0.20.1',
+            linkflap.schedule( [ ( 's5', 'r' ) ], repeat=2 ),
+            path='/tmp/linkflap.csv' ) )
+
+    # With --ifstats, record every interface's counters (s5-eth0..4,
+    # br0, r-eth0.10, ...) each second while the CLI runs
+    sampler = None
+    if args.ifstats:
+        sampler = IfSampler( net.hosts, interval=1 ).start()
 
     # Start Mininet Cli prompt
     CLI(net)
 
+    if sampler:
+        sampler.close()
+        sampler.toCSV( '/tmp/ifstats.csv' )
+
     net.stop()
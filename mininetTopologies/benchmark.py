@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+
+"""Startup/teardown benchmark for the topologies in this directory.
+
+Each scenario builds one of our topology shapes at a given size, and
+every run times these phases separately:
+
+    setup    scenario code; scenarios that add nodes straight to the
+             net (rather than through a Topo) create them here
+    build    net.build()            namespaces, shells, veth pairs
+    config   runConfigs( configs )  addresses, bridges, VLANs, routes
+    start    net.start()            controllers and switches
+    stop     net.stop()             teardown (or teardown.fastStop()
+                                    with --fast-stop)
+
+Scenarios (sizes apply to the first six):
+
+    line      switchline.py's LineTopo, N hops
+    vlan      4h_1sw.py / vlan_ex.py style host-switch, N hosts over
+              two VLAN bridges
+    l3chain   pure_l3_routing.py style chain of N routers between two
+              hosts, with compiled and aggregated routes
+    intervlan N hosts over two VLANs, trunked to a router, like
+              Intervlan-routing-working-example.py
+    vlanfilter intervlan with a vlanswitch.VlanSwitch as the switch
+              (configured during build)
+    vlanrouter N VLANs of one host each, routed by a
+              CustomTopo_Router.VlanRouter on a stick
+    router    CustomTopo_Router.py's NetworkTopo (fixed size)
+    spec      specs/intervlan.json through topospec (fixed size)
+
+Results are appended as JSON lines, one record per run, so successive
+runs of the benchmark can be compared to catch setup-time regressions:
+
+    sudo python benchmark.py --scenarios line,l3chain --sizes 10,50,100 \\
+        --runs 3 --out bench.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from ipaddress import ip_address
+
+from mininet.net import Mininet
+from mininet.node import OVSKernelSwitch, DefaultController
+from mininet.clean import cleanup
+from mininet.log import setLogLevel
+
+from nodeconfig import NodeConfig, runConfigs
+from routecompiler import RouteCompiler
+from teardown import fastStop, cleanLeftovers
+from vlanswitch import VlanSwitch, MAX_VID, vlanRanges
+
+HERE = os.path.dirname( os.path.abspath( __file__ ) )
+
+
+def lineScenario( n ):
+    "switchline.py's LineTopo with n hops."
+    from switchline import LineTopo
+    net = Mininet( topo=LineTopo( N=n ), switch=OVSKernelSwitch,
+                   controller=DefaultController, autoSetMacs=True,
+                   build=False )
+    return net, []
+
+
+def vlanScenario( n, trunk=False, filtering=False ):
+    """n hosts on a Linux-bridge switch s, the first half in VLAN 10 and
+       the rest in VLAN 20; with trunk, s also trunks both to router r.
+       filtering: make s a VlanSwitch instead of one bridge per VLAN"""
+    net = Mininet( build=False )
+    hosts = [ net.addHost( 'h%d' % i ) for i in range( 1, n + 1 ) ]
+    vids = [ 10 if i < n // 2 else 20 for i in range( n ) ]
+    if filtering:
+        s = net.addHost( 's', cls=VlanSwitch, access=dict(
+            ( 's-eth%d' % i, vid ) for i, vid in enumerate( vids ) ),
+            trunks={ 's-trunk': [ 10, 20 ] } if trunk else {} )
+    else:
+        s = net.addHost( 's' )
+    for h in hosts:
+        net.addLink( h, s )
+    r = None
+    if trunk:
+        r = net.addHost( 'r' )
+        net.addLink( s, r, intfName1='s-trunk', intfName2='r-eth0' )
+    sc = NodeConfig( s )
+    configs = [ sc ]
+    for vid in ( 10, 20 ) if not filtering else ():
+        sc.bridgeAdd( 'vlan%d' % vid )
+        if trunk:
+            sc.vlanAdd( 's-trunk', vid )
+            sc.linkUp( 's-trunk.%d' % vid )
+            sc.linkMaster( 's-trunk.%d' % vid, 'vlan%d' % vid )
+        sc.linkUp( 'vlan%d' % vid )
+    for i, h in enumerate( hosts ):
+        vid = vids[ i ]
+        if not filtering:
+            sc.addrFlush( 's-eth%d' % i )
+            sc.linkMaster( 's-eth%d' % i, 'vlan%d' % vid )
+        hc = NodeConfig( h )
+        hc.addrFlush( '%s-eth0' % h )
+        hc.addrAdd( '%s-eth0' % h, '10.%d.%d.%d/16' % (
+            vid, ( i + 1 ) // 250, ( i + 1 ) % 250 + 1 ) )
+        hc.routeAdd( 'default', via='10.%d.255.254' % vid )
+        configs.append( hc )
+    if trunk:
+        rc = NodeConfig( r )
+        rc.addrFlush( 'r-eth0' )
+        for vid in 10, 20:
+            rc.vlanAdd( 'r-eth0', vid )
+            rc.linkUp( 'r-eth0.%d' % vid )
+            rc.addrAdd( 'r-eth0.%d' % vid, '10.%d.255.254/16' % vid )
+        rc.ipForward()
+        configs.append( rc )
+    return net, configs
+
+
+def intervlanScenario( n ):
+    "Intervlan-routing-working-example.py's shape with n hosts."
+    return vlanScenario( n, trunk=True )
+
+
+def vlanfilterScenario( n ):
+    "intervlan with a VlanSwitch (one VLAN-filtering bridge) as s."
+    return vlanScenario( n, trunk=True, filtering=True )
+
+
+def vlanrouterScenario( n ):
+    """n VLANs with one host each, a VlanSwitch trunking all of them to
+       a VlanRouter"""
+    from CustomTopo_Router import VlanRouter
+    if not 1 <= n <= MAX_VID - 99:
+        raise ValueError( 'vlanrouter takes 1 to %d VLANs (ids 100 and up)'
+                          % ( MAX_VID - 99 ) )
+    net = Mininet( build=False )
+    vids = range( 100, 100 + n )
+    subnets = [ ip_address( '10.0.0.0' ) + 256 * i for i in range( n ) ]
+    hosts = [ net.addHost( 'h%d' % vid ) for vid in vids ]
+    s = net.addHost( 's', cls=VlanSwitch, access=dict(
+        ( 's-eth%d' % i, vid ) for i, vid in enumerate( vids ) ),
+        trunks={ 's-trunk': vlanRanges( vids ) } )
+    for h in hosts:
+        net.addLink( h, s )
+    r = net.addHost( 'r', cls=VlanRouter, trunk='r-eth0', vlans=dict(
+        ( vid, '%s/24' % ( subnet + 254 ) )
+        for vid, subnet in zip( vids, subnets ) ) )
+    net.addLink( s, r, intfName1='s-trunk', intfName2='r-eth0' )
+    configs = []
+    for h, subnet in zip( hosts, subnets ):
+        hc = NodeConfig( h )
+        hc.addrFlush( '%s-eth0' % h )
+        hc.addrAdd( '%s-eth0' % h, '%s/24' % ( subnet + 1 ) )
+        hc.routeAdd( 'default', via=str( subnet + 254 ) )
+        configs.append( hc )
+    return net, configs
+
+
+def l3chainScenario( n ):
+    "h1 - r1 - ... - rn - h2 with /30 links and routes compiled per node."
+    net = Mininet( build=False )
+    names = [ 'h1' ] + [ 'r%d' % i for i in range( 1, n + 1 ) ] + [ 'h2' ]
+    nodes = [ net.addHost( name ) for name in names ]
+    addresses, loopbacks = {}, {}
+    base = int( ip_address( '10.0.0.0' ) )
+    loopback = int( ip_address( '122.0.0.0' ) )
+    for i in range( len( nodes ) - 1 ):
+        left, right = nodes[ i ], nodes[ i + 1 ]
+        intf1 = '%s-eth%d' % ( left, 0 if i == 0 else 1 )
+        intf2 = '%s-eth0' % right
+        net.addLink( left, right, intfName1=intf1, intfName2=intf2 )
+        addresses[ intf1 ] = '%s/30' % ip_address( base + 4 * i + 1 )
+        addresses[ intf2 ] = '%s/30' % ip_address( base + 4 * i + 2 )
+    for i, name in enumerate( names ):
+        loopbacks[ name ] = str( ip_address( loopback + i + 1 ) )
+    configs = dict( ( node.name, NodeConfig( node ) ) for node in nodes )
+    for intf, cidr in addresses.items():
+        config = configs[ intf.split( '-' )[ 0 ] ]
+        config.addrFlush( intf )
+        config.addrAdd( intf, cidr )
+    for name, addr in loopbacks.items():
+        configs[ name ].loopback( addr )
+        if name.startswith( 'r' ):
+            configs[ name ].ipForward()
+    rc = RouteCompiler( hosts=( 'h1', 'h2' ) )
+    owner = dict( ( intf, intf.split( '-' )[ 0 ] ) for intf in addresses )
+    for intf, cidr in sorted( addresses.items() ):
+        rc.addAddress( owner[ intf ], intf, cidr )
+    for name, addr in sorted( loopbacks.items() ):
+        rc.addLoopback( name, addr )
+    rc.install( configs.values(), aggregate=True )
+    return net, list( configs.values() )
+
+
+def routerScenario( _n ):
+    "CustomTopo_Router.py's NetworkTopo."
+    from CustomTopo_Router import NetworkTopo
+    return Mininet( topo=NetworkTopo(), build=False ), []
+
+
+def specScenario( _n ):
+    "specs/intervlan.json, compiled (or cached) by topospec."
+    from topospec import TopoSpec
+    spec = TopoSpec.load( os.path.join( HERE, 'specs', 'intervlan.json' ) )
+    plan = spec.compile()
+    net = Mininet( build=False )
+    for name in plan[ 'nodes' ]:
+        net.addHost( name )
+    for node1, intf1, node2, intf2 in plan[ 'links' ]:
+        net.addLink( node1, node2, intfName1=intf1, intfName2=intf2 )
+    configs = []
+    for name in plan[ 'nodes' ]:
+        config = NodeConfig( net[ name ] )
+        for cmd in plan[ 'config' ].get( name, [] ):
+            config.cmd( cmd )
+        configs.append( config )
+    return net, configs
+
+
+SCENARIOS = {
+    'line': ( lineScenario, True ),
+    'vlan': ( vlanScenario, True ),
+    'l3chain': ( l3chainScenario, True ),
+    'intervlan': ( intervlanScenario, True ),
+    'vlanfilter': ( vlanfilterScenario, True ),
+    'vlanrouter': ( vlanrouterScenario, True ),
+    'router': ( routerScenario, False ),
+    'spec': ( specScenario, False ),
+}
+
+
+def timed( fn, *args ):
+    "Return the wall-clock seconds fn( *args ) took."
+    start = time.time()
+    fn( *args )
+    return time.time() - start
+
+
+def runOnce( scenario, size, fast=False ):
+    """Set up, time and tear down one network; return its record.
+       fast: tear down with teardown.fastStop() instead of net.stop()"""
+    setup, _sized = SCENARIOS[ scenario ]
+    start = time.time()
+    net = None
+    try:
+        net, configs = setup( size )
+        phases = { 'setup': time.time() - start }
+        phases[ 'build' ] = timed( net.build )
+        phases[ 'config' ] = timed( runConfigs, configs )
+        phases[ 'start' ] = timed( net.start )
+    except BaseException:
+        # Namespaces and veths left behind would make every later run
+        # fail; the error to report is the one that got us here
+        if net is not None:
+            try:
+                net.stop()
+            except Exception:
+                pass
+        cleanLeftovers()
+        raise
+    nodes = len( net.hosts ) + len( net.switches )
+    links = len( net.links )
+    if fast:
+        phases[ 'stop' ] = timed( fastStop, net )
+    else:
+        phases[ 'stop' ] = timed( net.stop )
+    return { 'scenario': scenario, 'size': size, 'nodes': nodes,
+             'links': links, 'phases': phases }
+
+
+def median( values ):
+    values = sorted( values )
+    mid = len( values ) // 2
+    return values[ mid ] if len( values ) % 2 else \
+        ( values[ mid - 1 ] + values[ mid ] ) / 2.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time build/config/start/stop of our topologies' )
+    parser.add_argument( '--scenarios', default=','.join( sorted(
+        SCENARIOS ) ), help='comma-separated, from: %s' %
+        ', '.join( sorted( SCENARIOS ) ) )
+    parser.add_argument( '--sizes', default='4,16,64',
+                         help='comma-separated sizes' )
+    parser.add_argument( '--runs', type=int, default=3,
+                         help='repetitions per scenario and size' )
+    parser.add_argument( '--out', default='bench.jsonl',
+                         help='JSON lines file to append results to' )
+    parser.add_argument( '--fast-stop', action='store_true',
+                         help='tear down with teardown.fastStop()' )
+    args = parser.parse_args()
+    setLogLevel( 'warning' )
+    sizes = [ int( size ) for size in args.sizes.split( ',' ) ]
+    host = { 'kernel': platform.release(), 'hostname': platform.node(),
+             'time': time.strftime( '%Y-%m-%dT%H:%M:%S' ) }
+    cleanup()
+    with open( args.out, 'a' ) as out:
+        for scenario in args.scenarios.split( ',' ):
+            if scenario not in SCENARIOS:
+                parser.error( 'unknown scenario %s' % scenario )
+            _setup, sized = SCENARIOS[ scenario ]
+            for size in ( sizes if sized else [ None ] ):
+                records = []
+                for run in range( args.runs ):
+                    record = runOnce( scenario, size, args.fast_stop )
+                    record.update( host, run=run, fastStop=args.fast_stop )
+                    out.write( json.dumps( record, sort_keys=True ) + '\n' )
+                    out.flush()
+                    records.append( record )
+                    cleanup()
+                print( '%-10s size %-5s %s' % ( scenario, size, '  '.join(
+                    '%s %.3fs' % ( phase, median(
+                        [ r[ 'phases' ][ phase ] for r in records ] ) )
+                    for phase in ( 'setup', 'build', 'config', 'start',
+                                   'stop' ) ) ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+"""Bulk transfer client and server.
+
+Measures how many bytes/s the path between two hosts forwards, with a
+sender that costs as little CPU as possible so that it is not the
+bottleneck:
+
+    h2 python bulkxfer.py server --port 5201 &
+    h1 python bulkxfer.py client 10.0.10.2 --streams 4 --duration 10
+
+The client sends with sendfile() from a file kept in page cache (a
+generated one in /dev/shm, or --file), so the payload is never copied
+through user space. --copy sends with send() from a buffer instead, for
+comparison. The server reads each stream with recv_into() into one
+preallocated buffer. Streams are TCP connections run in parallel; each
+sends for --duration seconds, or --bytes bytes if given.
+
+At the end of a stream the server answers with the bytes it got and the
+CPU time its receiving thread used. The client reports bytes/s and the
+CPU seconds per GB of the sending and receiving threads (user and
+system time, syscalls included): what the applications cost, apart from
+what forwarding through the namespaces costs.
+
+From a Mininet script, serve() starts servers on hosts and waits until
+they listen (see services), and transfer() runs a client on a host and
+returns its report:
+
+    serve( [ h2 ] )
+    report = transfer( h1, '10.0.10.2', streams=4, duration=10 )
+"""
+
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+# Sent by the server when a stream ends: bytes received, seconds from
+# first to last byte, CPU seconds of the receiving thread
+REPLY = struct.Struct( '!Qdd' )
+CHUNK = 1 << 20
+FILE_SIZE = 1 << 26
+
+
+# Server
+
+def receive( conn ):
+    "Read conn to its end; answer with what we got and what it cost."
+    cpu = time.thread_time()
+    buf = memoryview( bytearray( CHUNK ) )
+    nbytes, first, last = 0, None, None
+    try:
+        while True:
+            n = conn.recv_into( buf )
+            if not n:
+                break
+            nbytes += n
+            last = time.time()
+            if first is None:
+                first = last
+        conn.sendall( REPLY.pack( nbytes, last - first if first else 0,
+                                  time.thread_time() - cpu ) )
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def server( args ):
+    sock = socket.socket()
+    sock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+    sock.bind( ( '', args.port ) )
+    sock.listen( 128 )
+    while True:
+        conn, _peer = sock.accept()
+        thread = threading.Thread( target=receive, args=( conn, ) )
+        thread.daemon = True
+        thread.start()
+
+
+# Client
+
+def source( path=None, size=FILE_SIZE ):
+    "Return an open file to send from; generate one if path is None."
+    if path:
+        return open( path, 'rb' )
+    f = tempfile.TemporaryFile(
+        dir='/dev/shm' if os.path.isdir( '/dev/shm' ) else None )
+    block = bytes( CHUNK )
+    for _ in range( size // CHUNK ):
+        f.write( block )
+    f.flush()
+    return f
+
+
+def stream( args, f, size, ready, result, i ):
+    "Send one stream; store its stats in result[ i ]."
+    try:
+        sock = socket.create_connection( ( args.host, args.port ) )
+    except OSError as e:
+        result[ i ] = { 'error': str( e ) }
+        ready.abort()
+        return
+    buf = memoryview( bytearray( CHUNK ) )
+    sent, offset = 0, 0
+    try:
+        ready.wait()
+        cpu = time.thread_time()
+        deadline = time.time() + args.duration
+        while ( sent < args.bytes if args.bytes
+                else time.time() < deadline ):
+            count = min( CHUNK, size - offset )
+            if args.bytes:
+                count = min( count, args.bytes - sent )
+            if args.copy:
+                n = sock.send( buf[ :count ] )
+            else:
+                n = os.sendfile( sock.fileno(), f.fileno(), offset, count )
+            sent += n
+            offset = ( offset + n ) % size
+        sock.shutdown( socket.SHUT_WR )
+        sendCpu = time.thread_time() - cpu
+        received, seconds, recvCpu = REPLY.unpack(
+            sock.recv( REPLY.size, socket.MSG_WAITALL ) )
+        result[ i ] = { 'sent': sent, 'bytes': received,
+                        'seconds': seconds, 'senderCpu': sendCpu,
+                        'receiverCpu': recvCpu }
+    except ( OSError, struct.error, threading.BrokenBarrierError ) as e:
+        result[ i ] = { 'error': str( e ) or e.__class__.__name__ }
+    finally:
+        sock.close()
+
+
+def client( args ):
+    "Run the transfer; return the report."
+    f = source( args.file )
+    size = os.fstat( f.fileno() ).st_size
+    if not size:
+        raise ValueError( '%s is empty' % args.file )
+    # Streams connect first, then all start sending together
+    ready = threading.Barrier( args.streams + 1 )
+    result = [ None ] * args.streams
+    threads = [ threading.Thread( target=stream,
+                                  args=( args, f, size, ready, result, i ) )
+                for i in range( args.streams ) ]
+    for thread in threads:
+        thread.start()
+    try:
+        ready.wait()
+    except threading.BrokenBarrierError:
+        pass
+    start = time.time()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - start
+    f.close()
+    done = [ s for s in result if 'error' not in s ]
+    nbytes = sum( s[ 'bytes' ] for s in done )
+
+    def perGB( key ):
+        cpu = sum( s[ key ] for s in done )
+        return cpu / ( nbytes / 1e9 ) if nbytes else None
+
+    return {
+        'streams': args.streams, 'mode': 'copy' if args.copy else 'sendfile',
+        'bytes': nbytes, 'seconds': seconds,
+        'bytesPerSec': nbytes / seconds if seconds else 0,
+        'senderCpuPerGB': perGB( 'senderCpu' ),
+        'receiverCpuPerGB': perGB( 'receiverCpu' ),
+        'errors': [ s[ 'error' ] for s in result if 'error' in s ],
+        'perStream': result }
+
+
+def show( report ):
+    "Print a report like the client does."
+    print( '%d streams (%s): %d bytes in %.2fs, %.1f MB/s, %.3f Gbit/s' % (
+        report[ 'streams' ], report[ 'mode' ], report[ 'bytes' ],
+        report[ 'seconds' ], report[ 'bytesPerSec' ] / 1e6,
+        report[ 'bytesPerSec' ] * 8 / 1e9 ) )
+    if report[ 'bytes' ]:
+        print( 'cpu s/GB: sender %.3f receiver %.3f' % (
+            report[ 'senderCpuPerGB' ], report[ 'receiverCpuPerGB' ] ) )
+    for i, s in enumerate( report[ 'perStream' ] ):
+        if 'error' in s:
+            print( 'stream %d: %s' % ( i, s[ 'error' ] ) )
+        else:
+            print( 'stream %d: %d bytes, %.1f MB/s' % (
+                i, s[ 'bytes' ], s[ 'bytes' ] / s[ 'seconds' ] / 1e6
+                if s[ 'seconds' ] else 0 ) )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[ 0 ] )
+    sub = parser.add_subparsers( dest='mode' )
+    sub.required = True
+    for mode in 'server', 'client':
+        p = sub.add_parser( mode )
+        p.add_argument( '--port', type=int, default=5201 )
+        if mode == 'client':
+            p.add_argument( 'host' )
+            p.add_argument( '--streams', type=int, default=1 )
+            p.add_argument( '--duration', type=float, default=10 )
+            p.add_argument( '--bytes', type=int, default=0,
+                            help='bytes per stream (default: --duration)' )
+            p.add_argument( '--file',
+                            help='file to send (default: generated)' )
+            p.add_argument( '--copy', action='store_true',
+                            help='send() from a buffer, not sendfile()' )
+            p.add_argument( '--json', action='store_true',
+                            help='print the report as JSON' )
+    args = parser.parse_args( argv )
+    if args.mode == 'server':
+        server( args )
+        return
+    report = client( args )
+    if args.json:
+        json.dump( report, sys.stdout )
+    else:
+        show( report )
+
+
+# Mininet helpers
+
+def serve( hosts, port=5201, timeout=10 ):
+    "Start servers on hosts and wait until they listen; see launch()."
+    from services import Service, launch
+    return launch( hosts, Service(
+        'bulkxfer', '%s %s server --port %d '
+        '> /tmp/bulkxfer-%%(node)s.log 2>&1 &' % (
+            sys.executable, os.path.abspath( __file__ ), port ),
+        port=port ), timeout=timeout )
+
+
+def transfer( node, host, **opts ):
+    """Run a client on node against host; return its report.
+       opts: client options, e.g. streams=4, duration=10, copy=True"""
+    argv = [ sys.executable, os.path.abspath( __file__ ), 'client', host,
+             '--json' ]
+    for name, value in sorted( opts.items() ):
+        if value is True:
+            argv.append( '--%s' % name )
+        elif value not in ( None, False ):
+            argv += [ '--%s' % name, str( value ) ]
+    out, err, _code = node.pexec( argv )
+    try:
+        return json.loads( out )
+    except ValueError:
+        raise RuntimeError( 'bulkxfer client on %s failed: %s' % (
+            node, err.strip() ) )
+
+
+if __name__ == '__main__':
+    main()
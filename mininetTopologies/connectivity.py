@@ -0,0 +1,106 @@
+"""All-pairs connectivity matrix.
+
+net.pingAll() pings every ordered pair of hosts one after another, one
+packet each, and waits out a fixed timeout for every failure. On a
+200-host net that takes minutes and only yields a drop percentage.
+pingMatrix() runs the probes concurrently, at most maxInFlight at a
+time. It sends count packets per pair and returns what each pair saw:
+
+    matrix = pingMatrix( net.hosts, count=3 )
+    matrix[ 'h1', 'h2' ]   # { 'sent': 3, 'received': 3, 'loss': 0.0,
+                           #   'min': 0.041, 'avg': 0.052, 'p99': 0.07 }
+
+RTTs are in milliseconds, and None for pairs that got no reply. With
+failFast=True, no more probes are started once a pair gets no reply at
+all (a partition), and the pairs probed so far are returned.
+"""
+
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import info, error
+
+RTT = re.compile( r'time=([\d.]+) ms' )
+COUNTS = re.compile(
+    r'(\d+) packets transmitted, (\d+) (?:packets )?received' )
+
+
+def percentile( values, p ):
+    "Nearest-rank percentile p (0-100) of sorted values."
+    rank = int( math.ceil( p / 100.0 * len( values ) ) )
+    return values[ max( rank, 1 ) - 1 ]
+
+
+def stats( sent, rtts ):
+    "Summarize a pair's replies; rtts must be sorted."
+    return { 'sent': sent, 'received': len( rtts ),
+             'loss': 1 - float( len( rtts ) ) / sent if sent else 1.0,
+             'min': rtts[ 0 ] if rtts else None,
+             'avg': sum( rtts ) / len( rtts ) if rtts else None,
+             'p99': percentile( rtts, 99 ) if rtts else None }
+
+
+def probe( src, dst, count=3, interval=.2, timeout=1 ):
+    "Ping dst from src; return the pair's stats and the sorted RTTs."
+    out, _err, _code = src.pexec( 'ping -n -c %d -i %s -W %s %s' % (
+        count, interval, timeout, dst.IP() ) )
+    rtts = sorted( float( rtt ) for rtt in RTT.findall( out ) )
+    m = COUNTS.search( out )
+    return stats( int( m.group( 1 ) ) if m else count, rtts ), rtts
+
+
+def pingMatrix( hosts, count=3, interval=.2, timeout=1, maxInFlight=64,
+                failFast=False ):
+    """Ping between every ordered pair of hosts, maxInFlight pairs at a
+       time; return { ( src name, dst name ): stats }"""
+    hosts = [ h for h in hosts if h.IP() ]
+    pairs = [ ( src, dst ) for src in hosts for dst in hosts
+              if src is not dst ]
+    matrix = {}
+    if not pairs:
+        return matrix
+    partitioned = threading.Event()
+
+    def run( pair ):
+        if partitioned.is_set():
+            return None
+        result, rtts = probe( pair[ 0 ], pair[ 1 ], count, interval, timeout )
+        if failFast and not result[ 'received' ]:
+            partitioned.set()
+        return pair, result, rtts
+
+    start = time.time()
+    allRtts = []
+    sent = 0
+    with ThreadPoolExecutor(
+            max_workers=min( maxInFlight, len( pairs ) ) ) as pool:
+        for done in pool.map( run, pairs ):
+            if done is None:
+                continue
+            ( src, dst ), result, rtts = done
+            matrix[ src.name, dst.name ] = result
+            allRtts.extend( rtts )
+            sent += result[ 'sent' ]
+    for src in hosts:
+        row = [ matrix.get( ( src.name, dst.name ) ) for dst in hosts ]
+        if any( row ):
+            info( '%s -> %s\n' % ( src, ' '.join(
+                dst.name if result[ 'received' ] else 'X'
+                for dst, result in zip( hosts, row ) if result ) ) )
+    down = sorted( pair for pair, result in matrix.items()
+                   if not result[ 'received' ] )
+    if partitioned.is_set():
+        error( '*** Partition: %s -> %s unreachable, stopped after %d of '
+               '%d pairs\n' % ( down[ 0 ][ 0 ], down[ 0 ][ 1 ],
+                                len( matrix ), len( pairs ) ) )
+    total = stats( sent, sorted( allRtts ) )
+    info( '*** Results: %d/%d pairs reachable, %.1f%% packets lost' % (
+        len( matrix ) - len( down ), len( matrix ), 100 * total[ 'loss' ] ) )
+    if allRtts:
+        info( ', rtt min/avg/p99 %.3f/%.3f/%.3f ms' % (
+            total[ 'min' ], total[ 'avg' ], total[ 'p99' ] ) )
+    info( ' (%.1fs)\n' % ( time.time() - start ) )
+    return matrix
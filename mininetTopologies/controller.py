@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+"""Bundled proactive OpenFlow 1.0 controller.
+
+test.py points its switch at a RemoteController on 127.0.0.1:6633 that
+nothing provides, and then programs the switch behind its back with
+ovs-ofctl. ProactiveController is that controller, run by the Mininet
+script itself on an event loop in a thread:
+
+    c0 = net.addController( 'c0', controller=ProactiveController,
+                            port=6633 )
+    ...
+    c0.start()
+    c0.program( s1, FlowCompiler.fromSwitch( s1, gateways=[ r1 ] ) )
+    s1.start( [ c0 ] )
+
+When a switch connects, its programmed table (see flowcompiler) is
+pushed proactively: flow-mods go out in batches of up to batch, each
+followed by a barrier whose reply is awaited before the next batch.
+program() on a connected switch sends only the rules that changed.
+Traffic no rule matches reaches the controller as packet-ins. With
+learning=True the controller then acts as a learning switch: it floods
+unknown destinations and installs a flow for known ones.
+
+stats() returns per-switch install times, packet-ins and the flow setup
+latency. That is the time from a packet-in to the barrier reply that
+confirms the switch installed its flow; it is the controller's share of
+a flow's first-packet latency. The controller also runs standalone:
+
+    python controller.py --port 6633
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+import time
+
+from mininet.log import info, error, setLogLevel
+from mininet.node import RemoteController
+
+from connectivity import percentile
+
+OFP_VERSION = 1
+HEADER = struct.Struct( '!BBHI' )
+# version, type, length, xid + ( dpid, buffers, tables, caps, actions )
+FEATURES = struct.Struct( '!QIB3xII' )
+MATCH = struct.Struct( '!IH6s6sHBxHBBxxIIHH' )
+# cookie, command, idle timeout, hard timeout, priority, buffer id,
+# out port, flags
+FLOW_MOD = struct.Struct( '!QHHHHIHH' )
+PACKET_IN = struct.Struct( '!IHHBx' )
+PACKET_OUT = struct.Struct( '!IHH' )
+OUTPUT = struct.Struct( '!HHHH' )
+ERROR = struct.Struct( '!HH' )
+
+# Message types
+HELLO, ERROR_MSG, ECHO_REQUEST, ECHO_REPLY = 0, 1, 2, 3
+FEATURES_REQUEST, FEATURES_REPLY = 5, 6
+PACKET_IN_MSG, PACKET_OUT_MSG, FLOW_MOD_MSG = 10, 13, 14
+BARRIER_REQUEST, BARRIER_REPLY = 18, 19
+
+# Flow-mod commands
+ADD, DELETE, DELETE_STRICT = 0, 3, 4
+
+# Special ports
+PORTS = { 'in_port': 0xfff8, 'normal': 0xfffa, 'flood': 0xfffb,
+          'all': 0xfffc, 'controller': 0xfffd }
+PORT_NONE = 0xffff
+NO_BUFFER = 0xffffffff
+
+# Match wildcards
+FW_IN_PORT, FW_DL_VLAN, FW_DL_SRC, FW_DL_DST = 1, 2, 4, 8
+FW_DL_TYPE, FW_NW_PROTO, FW_TP_SRC, FW_TP_DST = 16, 32, 64, 128
+FW_NW_SRC_SHIFT, FW_NW_DST_SHIFT = 8, 14
+FW_ALL = ( 1 << 22 ) - 1
+
+# ovs-ofctl shorthands: ( dl_type, nw_proto )
+PROTOCOLS = { 'ip': ( 0x800, None ), 'arp': ( 0x806, None ),
+              'icmp': ( 0x800, 1 ), 'tcp': ( 0x800, 6 ),
+              'udp': ( 0x800, 17 ) }
+
+LEARNING_PRIORITY = 0
+LEARNING_IDLE = 60
+
+
+def message( msgType, body=b'', xid=0 ):
+    return HEADER.pack( OFP_VERSION, msgType, HEADER.size + len( body ),
+                        xid ) + body
+
+
+def mac( text ):
+    return bytes( int( byte, 16 ) for byte in text.split( ':' ) )
+
+
+def ipv4( text ):
+    "Return ( address as int, wildcarded low bits ) of addr[/len]."
+    addr, _, length = text.partition( '/' )
+    value = struct.unpack( '!I', bytes( int( b ) for b in
+                                        addr.split( '.' ) ) )[ 0 ]
+    return value, 32 - int( length or 32 )
+
+
+def encodeMatch( text ):
+    "Encode an ovs-ofctl match ( 'ip,nw_dst=10.0.1.0/24' ) as ofp_match."
+    fields = dict( inPort=0, dlSrc=bytes( 6 ), dlDst=bytes( 6 ), dlVlan=0,
+                   dlType=0, nwProto=0, nwSrc=0, nwDst=0, tpSrc=0,
+                   tpDst=0 )
+    wildcards = FW_ALL
+
+    def setField( key, value, flag ):
+        fields[ key ] = value
+        return wildcards & ~flag
+
+    for item in filter( None, text.split( ',' ) ):
+        name, _, value = item.strip().partition( '=' )
+        if name in PROTOCOLS:
+            dlType, nwProto = PROTOCOLS[ name ]
+            wildcards = setField( 'dlType', dlType, FW_DL_TYPE )
+            if nwProto is not None:
+                wildcards = setField( 'nwProto', nwProto, FW_NW_PROTO )
+        elif name == 'in_port':
+            wildcards = setField( 'inPort', int( value ), FW_IN_PORT )
+        elif name in ( 'dl_src', 'dl_dst' ):
+            wildcards = setField( 'dlSrc' if name == 'dl_src' else 'dlDst',
+                                  mac( value ), FW_DL_SRC
+                                  if name == 'dl_src' else FW_DL_DST )
+        elif name == 'dl_vlan':
+            wildcards = setField( 'dlVlan', int( value ), FW_DL_VLAN )
+        elif name == 'dl_type':
+            wildcards = setField( 'dlType', int( value, 0 ), FW_DL_TYPE )
+        elif name == 'nw_proto':
+            wildcards = setField( 'nwProto', int( value ), FW_NW_PROTO )
+        elif name in ( 'nw_src', 'nw_dst' ):
+            addr, free = ipv4( value )
+            shift = FW_NW_SRC_SHIFT if name == 'nw_src' else \
+                FW_NW_DST_SHIFT
+            fields[ 'nwSrc' if name == 'nw_src' else 'nwDst' ] = addr
+            wildcards = ( wildcards & ~( 0x3f << shift ) ) | ( free << shift )
+        elif name in ( 'tp_src', 'tp_dst' ):
+            wildcards = setField( 'tpSrc' if name == 'tp_src' else 'tpDst',
+                                  int( value ), FW_TP_SRC
+                                  if name == 'tp_src' else FW_TP_DST )
+        else:
+            raise ValueError( 'unsupported match field %s' % item )
+    f = fields
+    return MATCH.pack( wildcards, f[ 'inPort' ], f[ 'dlSrc' ], f[ 'dlDst' ],
+                       f[ 'dlVlan' ], 0, f[ 'dlType' ], 0, f[ 'nwProto' ],
+                       f[ 'nwSrc' ], f[ 'nwDst' ], f[ 'tpSrc' ],
+                       f[ 'tpDst' ] )
+
+
+def output( port ):
+    return OUTPUT.pack( 0, OUTPUT.size, port,
+                        0xffff if port == PORTS[ 'controller' ] else 0 )
+
+
+def encodeActions( text ):
+    "Encode ovs-ofctl actions ( 'output:2', 'flood', 'drop' )."
+    actions = b''
+    for item in filter( None, text.split( ',' ) ):
+        item = item.strip().lower()
+        if item == 'drop':
+            continue
+        if item.startswith( 'output:' ):
+            actions += output( int( item.split( ':' )[ 1 ] ) )
+        elif item in PORTS:
+            actions += output( PORTS[ item ] )
+        else:
+            raise ValueError( 'unsupported action %s' % item )
+    return actions
+
+
+def flowMod( command, match, priority, actions=b'', bufferId=NO_BUFFER,
+             idle=0, xid=0 ):
+    return message( FLOW_MOD_MSG, match + FLOW_MOD.pack(
+        0, command, idle, 0, priority, bufferId, PORT_NONE, 0 ) + actions,
+        xid )
+
+
+class Datapath( object ):
+    "A connected switch."
+
+    def __init__( self, writer ):
+        self.writer = writer
+        self.dpid = None
+        self.macs = {}          # MAC -> port, when learning
+        self.installed = {}     # ( priority, match ) -> actions
+        self.lock = asyncio.Lock()
+
+    def send( self, data ):
+        self.writer.write( data )
+
+
+class OFController( object ):
+    "OpenFlow 1.0 controller on an asyncio event loop."
+
+    def __init__( self, learning=True, batch=1000 ):
+        self.learning = learning
+        self.batch = batch
+        self.tables = {}        # dpid -> { ( priority, match ): actions }
+        self.datapaths = {}     # dpid -> Datapath
+        self.barriers = {}      # xid -> ( future, start )
+        self.xid = 0
+        self.server = None
+        self.installs = {}      # dpid -> { flows, seconds, batches }
+        self.packetIns = 0
+        self.floods = 0
+        self.errors = 0
+        self.setups = []        # flow setup latencies, seconds
+
+    def nextXid( self ):
+        self.xid = ( self.xid + 1 ) & 0xffffffff
+        return self.xid
+
+    async def serve( self, ip='127.0.0.1', port=6633 ):
+        self.server = await asyncio.start_server(
+            self.connection, ip, port, reuse_address=True )
+
+    async def close( self ):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for dp in list( self.datapaths.values() ):
+            dp.writer.close()
+
+    def barrier( self, dp, start=None ):
+        "Send a barrier; return a future done at its reply."
+        xid = self.nextXid()
+        future = asyncio.get_running_loop().create_future()
+        self.barriers[ xid ] = ( future, start )
+        dp.send( message( BARRIER_REQUEST, xid=xid ) )
+        return future
+
+    def program( self, dpid, rules ):
+        """Set dpid's table to rules { ( priority, match ): actions };
+           push the change if the switch is connected"""
+        self.tables[ dpid ] = dict( rules )
+        dp = self.datapaths.get( dpid )
+        if dp:
+            asyncio.ensure_future( self.push( dp ) )
+
+    async def push( self, dp, reset=False ):
+        "Bring dp's flow table to its programmed rules."
+        async with dp.lock:
+            start = time.time()
+            table = self.tables.get( dp.dpid, {} )
+            mods = []
+            if reset:
+                mods.append( flowMod( DELETE, encodeMatch( '' ), 0 ) )
+                dp.installed = {}
+            for key in sorted( set( dp.installed ) - set( table ) ):
+                mods.append( flowMod( DELETE_STRICT, encodeMatch( key[ 1 ] ),
+                                      key[ 0 ] ) )
+            for key, actions in sorted( table.items() ):
+                if dp.installed.get( key ) != actions:
+                    mods.append( flowMod( ADD, encodeMatch( key[ 1 ] ),
+                                          key[ 0 ],
+                                          encodeActions( actions ) ) )
+            batches = 0
+            for i in range( 0, len( mods ), self.batch ):
+                dp.send( b''.join( mods[ i:i + self.batch ] ) )
+                await self.barrier( dp )
+                batches += 1
+            dp.installed = dict( table )
+            self.installs[ dp.dpid ] = {
+                'flows': len( table ), 'flowMods': len( mods ),
+                'batches': batches, 'seconds': time.time() - start }
+            info( '*** controller: %016x programmed, %d flow-mods in %d '
+                  'batches in %.3fs\n' % ( dp.dpid, len( mods ), batches,
+                                           time.time() - start ) )
+
+    async def connection( self, reader, writer ):
+        dp = Datapath( writer )
+        dp.send( message( HELLO ) + message( FEATURES_REQUEST,
+                                             xid=self.nextXid() ) )
+        try:
+            while True:
+                msgType, xid, body = await self.receive( reader )
+                self.handle( dp, msgType, xid, body )
+        except ( asyncio.IncompleteReadError, ConnectionError ):
+            pass
+        finally:
+            if dp.dpid is not None and \
+                    self.datapaths.get( dp.dpid ) is dp:
+                del self.datapaths[ dp.dpid ]
+                info( '*** controller: %016x disconnected\n' % dp.dpid )
+            writer.close()
+
+    @staticmethod
+    async def receive( reader ):
+        _version, msgType, length, xid = HEADER.unpack(
+            await reader.readexactly( HEADER.size ) )
+        body = await reader.readexactly( length - HEADER.size )
+        return msgType, xid, body
+
+    def handle( self, dp, msgType, xid, body ):
+        if msgType == ECHO_REQUEST:
+            dp.send( message( ECHO_REPLY, body, xid ) )
+        elif msgType == FEATURES_REPLY:
+            dp.dpid = FEATURES.unpack_from( body )[ 0 ]
+            self.datapaths[ dp.dpid ] = dp
+            info( '*** controller: %016x connected\n' % dp.dpid )
+            asyncio.ensure_future( self.push( dp, reset=True ) )
+        elif msgType == BARRIER_REPLY:
+            future, start = self.barriers.pop( xid, ( None, None ) )
+            if start is not None:
+                self.setups.append( time.time() - start )
+            if future and not future.done():
+                future.set_result( None )
+        elif msgType == PACKET_IN_MSG:
+            self.packetIn( dp, body )
+        elif msgType == ERROR_MSG:
+            self.errors += 1
+            errType, code = ERROR.unpack_from( body )
+            error( '*** controller: %016x error type %d code %d\n' % (
+                dp.dpid or 0, errType, code ) )
+
+    def packetIn( self, dp, body ):
+        start = time.time()
+        self.packetIns += 1
+        bufferId, _total, inPort, _reason = PACKET_IN.unpack_from( body )
+        data = body[ PACKET_IN.size: ]
+        if not self.learning or len( data ) < 12:
+            return
+        dst, src = data[ :6 ], data[ 6:12 ]
+        dp.macs[ src ] = inPort
+        port = None if dst[ 0 ] & 1 else dp.macs.get( dst )
+        if port is None:
+            self.floods += 1
+            self.packetOut( dp, bufferId, inPort, output( PORTS[ 'flood' ] ),
+                            data )
+            return
+        match = MATCH.pack( FW_ALL & ~FW_DL_DST, 0, bytes( 6 ), dst,
+                            0, 0, 0, 0, 0, 0, 0, 0, 0 )
+        dp.send( flowMod( ADD, match, LEARNING_PRIORITY, output( port ),
+                          bufferId, idle=LEARNING_IDLE ) )
+        if bufferId == NO_BUFFER:
+            self.packetOut( dp, bufferId, inPort, output( port ), data )
+        self.barrier( dp, start )
+
+    def packetOut( self, dp, bufferId, inPort, actions, data ):
+        dp.send( message( PACKET_OUT_MSG, PACKET_OUT.pack(
+            bufferId, inPort, len( actions ) ) + actions +
+            ( data if bufferId == NO_BUFFER else b'' ) ) )
+
+    def stats( self ):
+        "Return install, packet-in and flow setup statistics."
+        setups = sorted( self.setups )
+        latency = {}
+        if setups:
+            latency = { 'min': setups[ 0 ] * 1e3,
+                        'avg': sum( setups ) / len( setups ) * 1e3,
+                        'p99': percentile( setups, 99 ) * 1e3,
+                        'max': setups[ -1 ] * 1e3 }
+        switches = dict( ( '%016x' % dpid, install )
+                         for dpid, install in self.installs.items() )
+        return { 'switches': switches,
+                 'packetIns': self.packetIns, 'floods': self.floods,
+                 'flowSetups': len( setups ), 'setupLatencyMs': latency,
+                 'errors': self.errors }
+
+
+class ProactiveController( RemoteController ):
+    "A RemoteController that Mininet runs itself, on an event loop thread."
+
+    def __init__( self, name, ip='127.0.0.1', port=6633, learning=True,
+                  batch=1000, **kwargs ):
+        self.core = OFController( learning=learning, batch=batch )
+        self.loop = None
+        self.thread = None
+        RemoteController.__init__( self, name, ip=ip, port=port, **kwargs )
+
+    def checkListening( self ):
+        "We are the listener; start() fails if the port is taken."
+        return
+
+    def call( self, coro ):
+        "Run coro on the controller's loop and wait for its result."
+        return asyncio.run_coroutine_threadsafe( coro, self.loop ).result()
+
+    def start( self ):
+        if self.thread:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread( target=self.loop.run_forever )
+        self.thread.daemon = True
+        self.thread.start()
+        self.call( self.core.serve( self.ip, self.port ) )
+        info( '*** controller %s listening on %s:%d\n' % (
+            self.name, self.ip, self.port ) )
+
+    def program( self, switch, table ):
+        "Install FlowCompiler table on switch, now or when it connects."
+
+        async def program():
+            self.core.program( int( switch.dpid, 16 ), table.rules )
+
+        self.call( program() )
+
+    def stats( self ):
+        async def stats():
+            return self.core.stats()
+
+        return self.call( stats() )
+
+    def stop( self, *args, **kwargs ):
+        if self.thread:
+            self.close()
+        # RemoteController.stop() does nothing and Mininet.stop() does not
+        # terminate controllers, so our node's shell (mininet:c0) has to
+        # be killed here
+        self.terminate()
+
+    def close( self ):
+        "Close the switch connections and stop the loop."
+        stats = self.stats()
+        info( '*** controller %s: %d packet-ins, %d flow setups' % (
+            self.name, stats[ 'packetIns' ], stats[ 'flowSetups' ] ) )
+        if stats[ 'setupLatencyMs' ]:
+            info( ', setup latency avg/p99 %(avg).3f/%(p99).3f ms' %
+                  stats[ 'setupLatencyMs' ] )
+        info( '\n' )
+        self.call( self.core.close() )
+        self.loop.call_soon_threadsafe( self.loop.stop )
+        self.thread.join()
+        self.loop.close()
+        self.thread = None
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[ 0 ] )
+    parser.add_argument( '--ip', default='0.0.0.0' )
+    parser.add_argument( '--port', type=int, default=6633 )
+    parser.add_argument( '--no-learning', action='store_true',
+                         help='only count packet-ins' )
+    args = parser.parse_args( argv )
+    setLogLevel( 'info' )
+    core = OFController( learning=not args.no_learning )
+
+    async def run():
+        await core.serve( args.ip, args.port )
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run( run() )
+    except KeyboardInterrupt:
+        pass
+    print( core.stats() )
+
+
+if __name__ == '__main__':
+    main()
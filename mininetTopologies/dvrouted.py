@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+
+"""Distance-vector routing daemon.
+
+The routers of pure_l3_routing.py only know the static routes written
+(or compiled) for them. dvrouted runs in a router's namespace and finds
+the routes itself, RIP style: every router advertises the subnets and
+loopbacks it is attached to, learns its neighbours' tables, and keeps
+the route with the fewest hops to each prefix:
+
+    r1 python dvrouted.py --stats /tmp/dv-r1.json &
+
+- Updates are UDP broadcasts on every addressed interface, a full table
+  every --interval seconds, plus triggered updates carrying only what
+  changed as soon as something changes (coalesced for TRIGGER_DELAY).
+- Split horizon: a route is not advertised back out of the interface it
+  was learned from.
+- Routes not refreshed for --timeout seconds become unreachable (metric
+  INFINITY) and are advertised as such before they are forgotten.
+- Link and address changes are seen at once through rtnetlink
+  notifications: the routes of an interface that goes down are
+  withdrawn without waiting for the timeout.
+- With --redistribute, the router also advertises its static routes
+  ('ip route add' ones, e.g. to the loopbacks of the hosts behind it)
+  as if it were attached to their prefixes, for as long as they are in
+  its FIB. Default routes are never advertised.
+- Routes go straight into the kernel FIB over rtnetlink (see rtnl),
+  with protocol RTPROT_DV, batched per event; no ip process is run.
+
+The daemon records when its FIB last changed, how many messages and
+bytes it sent and received and the CPU time it used, and keeps them in
+the --stats JSON file. From a Mininet script:
+
+    start( routers )
+    report = converge( routers, reachable=7 )
+    show( report )
+    ...
+    stop( routers )
+
+converge() waits until every router reaches the given number of
+prefixes and no FIB has changed for a while; the convergence time is
+from the first daemon start to the last FIB change.
+"""
+
+import argparse
+import errno
+import json
+import os
+import selectors
+import signal
+import socket
+import struct
+import sys
+import time
+from ipaddress import ip_interface
+
+from rtnl import ( RtnlSocket, NETLINK_ROUTE, IFF_UP, IFF_LOWER_UP,
+                   NLMSGHDR, RTMSG, RTM_NEWROUTE, RTM_DELROUTE,
+                   RTPROT_BOOT, RTPROT_STATIC )
+
+PORT = 5520
+INTERVAL = 5.0
+INFINITY = 16
+TRIGGER_DELAY = .05
+STATS_DELAY = .2
+# Protocol number of our routes in the FIB ('ip route' shows 'proto 98')
+RTPROT_DV = 98
+RTMGRP_LINK, RTMGRP_IPV4_IFADDR, RTMGRP_IPV4_ROUTE = 0x1, 0x10, 0x40
+SO_BINDTODEVICE = 25
+
+MAGIC = b'DV01'
+HEADER = struct.Struct( '!4s' )
+# prefix, prefix length, metric
+ENTRY = struct.Struct( '!4sBB' )
+MAX_ENTRIES = ( 1472 - HEADER.size ) // ENTRY.size
+
+
+class Route( object ):
+    "A learned route."
+
+    __slots__ = ( 'metric', 'via', 'intf', 'updated' )
+
+    def __init__( self, metric, via, intf, updated ):
+        self.metric = metric
+        self.via = via
+        self.intf = intf
+        self.updated = updated
+
+
+class DVRouter( object ):
+    "The daemon: interfaces, routing table and FIB of one namespace."
+
+    def __init__( self, port=PORT, interval=INTERVAL, timeout=None,
+                  statsPath=None, redistribute=False ):
+        "redistribute: also advertise our static routes"
+        self.port = port
+        self.redistribute = redistribute
+        self.interval = interval
+        self.timeout = timeout or 3 * interval
+        self.statsPath = statsPath
+        self.rtnl = RtnlSocket()
+        self.monitor = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                                      NETLINK_ROUTE )
+        self.monitor.bind( ( 0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | (
+            RTMGRP_IPV4_ROUTE if redistribute else 0 ) ) )
+        self.monitor.setblocking( False )
+        self.selector = selectors.DefaultSelector()
+        self.selector.register( self.monitor, selectors.EVENT_READ )
+        self.intfs = {}         # name -> ( ifindex, socket )
+        self.local = set()      # our addresses
+        self.connected = {}     # prefix -> interface (or static route's)
+        self.routes = {}        # prefix -> Route
+        self.fibPending = set()
+        self.triggered = set()
+        self.triggerAt = None
+        self.running = True
+        self.counters = dict( ( key, 0 ) for key in (
+            'sent', 'received', 'bytesSent', 'bytesReceived',
+            'triggeredUpdates', 'fibChanges', 'fibErrors' ) )
+        self.started = time.time()
+        self.lastChange = None
+        self.statsDirty = True
+
+    # Interfaces
+
+    def scan( self, now ):
+        "Read links and addresses; follow what changed."
+        states = self.rtnl.linkStates()
+        names = dict( ( index, name ) for name, ( index, flags )
+                      in states.items()
+                      if flags & IFF_UP and flags & IFF_LOWER_UP )
+        connected, intfs, local = {}, {}, set()
+        for index, addr, plen in self.rtnl.addrs():
+            name = names.get( index )
+            if name is None or addr.startswith( '127.' ):
+                continue
+            local.add( addr )
+            connected[ str( ip_interface(
+                '%s/%d' % ( addr, plen ) ).network ) ] = name
+            if name != 'lo' and plen < 32:
+                intfs.setdefault( name, index )
+        if self.redistribute:
+            for prefix, proto, oif in self.rtnl.routes():
+                if proto in ( RTPROT_BOOT, RTPROT_STATIC ) and \
+                        not prefix.endswith( '/0' ) and oif in names:
+                    connected.setdefault( prefix, names[ oif ] )
+        self.local = local
+        for name in sorted( set( self.intfs ) - set( intfs ) ):
+            self.selector.unregister( self.intfs[ name ][ 1 ] )
+            self.intfs.pop( name )[ 1 ].close()
+        for name, index in sorted( intfs.items() ):
+            if name not in self.intfs:
+                sock = self.open( name )
+                self.selector.register( sock, selectors.EVENT_READ, name )
+                self.intfs[ name ] = ( index, sock )
+        # Withdraw what we reached through interfaces that went away,
+        # and the subnets we were attached to but no longer are
+        for prefix, route in self.routes.items():
+            if route.intf is not None and route.intf not in self.intfs:
+                self.unreachable( prefix, route, now )
+        for prefix in set( self.connected ) - set( connected ):
+            self.routes[ prefix ] = Route( INFINITY, None, None, now )
+            self.changed( prefix, fib=False )
+        for prefix in set( connected ) - set( self.connected ):
+            # The kernel's connected route takes over from ours
+            route = self.routes.pop( prefix, None )
+            self.changed( prefix, fib=route is not None and
+                          route.metric < INFINITY )
+        self.connected = connected
+
+    def open( self, name ):
+        sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+        sock.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+        sock.setsockopt( socket.SOL_SOCKET, socket.SO_BROADCAST, 1 )
+        sock.setsockopt( socket.SOL_SOCKET, SO_BINDTODEVICE,
+                         name.encode() )
+        sock.bind( ( '', self.port ) )
+        sock.setblocking( False )
+        return sock
+
+    @staticmethod
+    def ours( data ):
+        "Are the notifications in data all about our own routes?"
+        offset = 0
+        while offset + NLMSGHDR.size <= len( data ):
+            length, kind, _flags, _seq, _pid = NLMSGHDR.unpack_from(
+                data, offset )
+            if length < NLMSGHDR.size:
+                break
+            if kind not in ( RTM_NEWROUTE, RTM_DELROUTE ) or \
+                    RTMSG.unpack_from( data, offset + NLMSGHDR.size )[
+                        5 ] != RTPROT_DV:
+                return False
+            offset += ( length + 3 ) & ~3
+        return True
+
+    # Routing table
+
+    def changed( self, prefix, fib=True ):
+        if fib:
+            self.fibPending.add( prefix )
+        self.triggered.add( prefix )
+        if self.triggerAt is None:
+            self.triggerAt = time.monotonic() + TRIGGER_DELAY
+
+    def unreachable( self, prefix, route, now ):
+        if route.metric < INFINITY:
+            route.metric = INFINITY
+            route.updated = now
+            self.changed( prefix )
+
+    def update( self, intf, via, entries, now ):
+        "Merge a neighbour's advertisement, received on intf."
+        for prefix, metric in entries:
+            if prefix in self.connected:
+                continue
+            metric = min( metric + 1, INFINITY )
+            route = self.routes.get( prefix )
+            if route is None or route.metric >= INFINITY:
+                if metric < INFINITY:
+                    self.routes[ prefix ] = Route( metric, via, intf, now )
+                    self.changed( prefix )
+            elif route.via == via and route.intf == intf:
+                if metric >= INFINITY:
+                    self.unreachable( prefix, route, now )
+                else:
+                    route.updated = now
+                    if metric != route.metric:
+                        route.metric = metric
+                        self.changed( prefix, fib=False )
+            elif metric < route.metric:
+                route.metric, route.via, route.intf = metric, via, intf
+                route.updated = now
+                self.changed( prefix )
+
+    def expire( self, now ):
+        "Time out silent routes; forget unreachable ones after a while."
+        for prefix, route in list( self.routes.items() ):
+            age = now - route.updated
+            if route.metric < INFINITY and age > self.timeout:
+                self.unreachable( prefix, route, now )
+            elif route.metric >= INFINITY and age > self.timeout and \
+                    prefix not in self.triggered:
+                del self.routes[ prefix ]
+
+    def installFib( self ):
+        "Push the pending route changes to the FIB in one batch."
+        if not self.fibPending:
+            return
+        for prefix in sorted( self.fibPending ):
+            route = self.routes.get( prefix )
+            if route is not None and route.metric < INFINITY:
+                self.rtnl.routeAdd( prefix, via=route.via,
+                                    oif=self.intfs[ route.intf ][ 0 ],
+                                    replace=True, proto=RTPROT_DV,
+                                    request=prefix )
+            else:
+                self.rtnl.routeDel( prefix, proto=RTPROT_DV,
+                                    request=prefix )
+        self.counters[ 'fibChanges' ] += len( self.fibPending )
+        self.fibPending = set()
+        for prefix, err in self.rtnl.flush():
+            # A withdrawn route may be gone with its interface already
+            if err.errno != errno.ESRCH:
+                self.counters[ 'fibErrors' ] += 1
+                sys.stderr.write( 'dvrouted: %s: %s\n' % (
+                    prefix, os.strerror( err.errno ) ) )
+        self.lastChange = time.time()
+        self.statsDirty = True
+
+    # Messages
+
+    def entries( self, intf, prefixes ):
+        "What to advertise on intf about prefixes (split horizon)."
+        for prefix in prefixes:
+            if prefix in self.connected:
+                yield prefix, 0
+                continue
+            route = self.routes.get( prefix )
+            if route is not None and route.intf != intf:
+                yield prefix, route.metric
+
+    def advertise( self, prefixes ):
+        "Send what we know about prefixes out of every interface."
+        for intf, ( _index, sock ) in sorted( self.intfs.items() ):
+            entries = list( self.entries( intf, prefixes ) )
+            for i in range( 0, len( entries ), MAX_ENTRIES ):
+                data = HEADER.pack( MAGIC ) + b''.join(
+                    ENTRY.pack( socket.inet_aton( prefix.split( '/' )[ 0 ] ),
+                                int( prefix.split( '/' )[ 1 ] ), metric )
+                    for prefix, metric in entries[ i:i + MAX_ENTRIES ] )
+                try:
+                    sock.sendto( data, ( '255.255.255.255', self.port ) )
+                except OSError:
+                    continue
+                self.counters[ 'sent' ] += 1
+                self.counters[ 'bytesSent' ] += len( data )
+
+    def table( self ):
+        return sorted( set( self.connected ) | set( self.routes ) )
+
+    def receive( self, intf, sock, now ):
+        while True:
+            try:
+                data, ( via, _port ) = sock.recvfrom( 65535 )
+            except BlockingIOError:
+                return
+            # Our own broadcasts come back to us
+            if via in self.local or data[ :HEADER.size ] != MAGIC:
+                continue
+            self.counters[ 'received' ] += 1
+            self.counters[ 'bytesReceived' ] += len( data )
+            entries = []
+            for offset in range( HEADER.size, len( data ) - ENTRY.size + 1,
+                                 ENTRY.size ):
+                addr, plen, metric = ENTRY.unpack_from( data, offset )
+                entries.append( ( '%s/%d' % ( socket.inet_ntoa( addr ),
+                                              plen ), metric ) )
+            self.update( intf, via, entries, now )
+
+    # Statistics
+
+    def stats( self ):
+        return dict( self.counters, pid=os.getpid(), started=self.started,
+                     lastChange=self.lastChange,
+                     reachable=len( self.connected ) + sum(
+                         1 for route in self.routes.values()
+                         if route.metric < INFINITY ),
+                     cpu=time.process_time() )
+
+    def writeStats( self ):
+        if not self.statsPath:
+            return
+        tmp = self.statsPath + '.tmp'
+        with open( tmp, 'w' ) as f:
+            json.dump( self.stats(), f )
+        os.rename( tmp, self.statsPath )
+        self.statsDirty = False
+
+    # Main loop
+
+    def run( self ):
+        now = time.monotonic()
+        self.scan( now )
+        nextFull = now
+        nextStats = now
+        while self.running:
+            now = time.monotonic()
+            if now >= nextFull:
+                self.advertise( self.table() )
+                nextFull = now + self.interval
+                self.statsDirty = True
+            if self.triggerAt is not None and now >= self.triggerAt:
+                self.advertise( sorted( self.triggered ) )
+                self.counters[ 'triggeredUpdates' ] += 1
+                self.triggered = set()
+                self.triggerAt = None
+            self.expire( now )
+            self.installFib()
+            if self.statsDirty and now >= nextStats:
+                self.writeStats()
+                nextStats = now + STATS_DELAY
+            due = [ nextFull ]
+            if self.triggerAt is not None:
+                due.append( self.triggerAt )
+            if self.statsDirty:
+                due.append( nextStats )
+            for key, _mask in self.selector.select(
+                    max( 0, min( due ) - time.monotonic() ) ):
+                now = time.monotonic()
+                if key.fileobj is self.monitor:
+                    # One scan for a whole burst of notifications, and
+                    # none for our own FIB changes
+                    rescan = False
+                    try:
+                        while True:
+                            data = self.monitor.recv( 65535 )
+                            if not data:
+                                break
+                            rescan = rescan or not self.ours( data )
+                    except BlockingIOError:
+                        pass
+                    if rescan:
+                        self.scan( now )
+                elif key.data in self.intfs:
+                    self.receive( key.data, key.fileobj, now )
+        self.shutdown()
+
+    def shutdown( self ):
+        "Poison our routes on the wire and take them out of the FIB."
+        for route in self.routes.values():
+            route.metric = INFINITY
+        self.advertise( self.table() )
+        self.fibPending = set( self.routes )
+        self.installFib()
+        self.writeStats()
+        for _index, sock in self.intfs.values():
+            sock.close()
+        self.monitor.close()
+        self.rtnl.close()
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[ 0 ] )
+    parser.add_argument( '--port', type=int, default=PORT )
+    parser.add_argument( '--interval', type=float, default=INTERVAL,
+                         help='seconds between full updates' )
+    parser.add_argument( '--timeout', type=float,
+                         help='route timeout (default: 3 intervals)' )
+    parser.add_argument( '--stats', help='keep statistics in this file' )
+    parser.add_argument( '--pidfile' )
+    parser.add_argument( '--redistribute', action='store_true',
+                         help='also advertise static routes' )
+    args = parser.parse_args( argv )
+    router = DVRouter( args.port, args.interval, args.timeout, args.stats,
+                       args.redistribute )
+
+    def stop( _signum, _frame ):
+        router.running = False
+
+    signal.signal( signal.SIGTERM, stop )
+    signal.signal( signal.SIGINT, stop )
+    if args.pidfile:
+        with open( args.pidfile, 'w' ) as f:
+            f.write( '%d\n' % os.getpid() )
+    router.run()
+
+
+# Mininet helpers
+
+def statsPath( node ):
+    return '/tmp/dvrouted-%s.json' % node
+
+
+def start( routers, port=PORT, interval=INTERVAL, timeout=10,
+           redistribute=False ):
+    """Start the daemon on routers and wait until they listen; see
+       launch(). redistribute: advertise static routes too"""
+    from services import Service, launch
+    for node in routers:
+        if os.path.exists( statsPath( node ) ):
+            os.unlink( statsPath( node ) )
+    return launch( routers, Service(
+        'dvrouted', '%s %s --port %d --interval %s --stats %s%s '
+        '--pidfile /tmp/dvrouted-%%(node)s.pid '
+        '> /tmp/dvrouted-%%(node)s.log 2>&1 &' % (
+            sys.executable, os.path.abspath( __file__ ), port, interval,
+            statsPath( '%(node)s' ),
+            ' --redistribute' if redistribute else '' ),
+        port=port, proto='udp',
+        pidfile='/tmp/dvrouted-%(node)s.pid' ), timeout=timeout )
+
+
+def stats( routers ):
+    "Return { router name: its daemon's statistics } (None if missing)."
+    result = {}
+    for node in routers:
+        try:
+            with open( statsPath( node ) ) as f:
+                result[ node.name ] = json.load( f )
+        except ( IOError, OSError, ValueError ):
+            result[ node.name ] = None
+    return result
+
+
+def converge( routers, reachable=None, quiet=1.0, timeout=60,
+              interval=.1 ):
+    """Wait until every router reaches reachable prefixes (if given) and
+       no FIB changed for quiet seconds, or timeout; return
+       { 'converged': bool, 'seconds': first start to last FIB change,
+         'messages', 'bytes', 'cpu': totals, 'routers': stats() }"""
+    deadline = time.time() + timeout
+    while True:
+        current = stats( routers )
+        ready = all( s is not None and s[ 'lastChange' ] is not None and
+                     ( reachable is None or s[ 'reachable' ] >= reachable )
+                     for s in current.values() )
+        last = max( [ s[ 'lastChange' ] for s in current.values()
+                      if s and s[ 'lastChange' ] ] or [ 0 ] )
+        now = time.time()
+        if ready and now - last >= quiet or now >= deadline:
+            break
+        time.sleep( interval )
+    known = [ s for s in current.values() if s ]
+    first = min( [ s[ 'started' ] for s in known ] or [ last ] )
+    return { 'converged': ready, 'seconds': last - first if known else None,
+             'messages': sum( s[ 'sent' ] for s in known ),
+             'bytes': sum( s[ 'bytesSent' ] for s in known ),
+             'cpu': sum( s[ 'cpu' ] for s in known ),
+             'routers': current }
+
+
+def show( report ):
+    print( '%s in %.3fs: %d messages, %d bytes, %.3f CPU seconds' % (
+        'converged' if report[ 'converged' ] else 'NOT converged',
+        report[ 'seconds' ] or 0, report[ 'messages' ], report[ 'bytes' ],
+        report[ 'cpu' ] ) )
+    for name, s in sorted( report[ 'routers' ].items() ):
+        if s is None:
+            print( '%s: no statistics' % name )
+            continue
+        print( '%s: %d prefixes, last change +%.3fs, %d/%d messages '
+               'sent/received, %d FIB changes, %.3f CPU seconds' % (
+                   name, s[ 'reachable' ],
+                   ( s[ 'lastChange' ] or s[ 'started' ] ) - s[ 'started' ],
+                   s[ 'sent' ], s[ 'received' ], s[ 'fibChanges' ],
+                   s[ 'cpu' ] ) )
+
+
+def stop( routers, timeout=5 ):
+    "Stop the daemons on routers; they withdraw their routes first."
+    from procnet import readPid, alive
+    pids = []
+    for node in routers:
+        pid = readPid( '/tmp/dvrouted-%s.pid' % node )
+        if pid is not None and alive( pid ):
+            os.kill( pid, signal.SIGTERM )
+            pids.append( pid )
+    deadline = time.time() + timeout
+    while any( alive( pid ) for pid in pids ) and time.time() < deadline:
+        time.sleep( .05 )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""Interface counter sampling.
+
+IfSampler records the rx/tx byte, packet, error and drop counters of
+every interface of a set of nodes at a fixed interval, including the
+ones made by hand after net.build() (vlan10, r-eth0.10, ...):
+
+    sampler = IfSampler( net.hosts + net.switches, interval=1 ).start()
+    ...
+    sampler.stop()
+    sampler.toCSV( '/tmp/ifstats.csv' )     # or toJSON(), series()
+
+The counters are read from /proc/<pid>/net/dev (see procnet), once per
+network namespace whatever the number of nodes in it. Each namespace's
+file is opened once and re-read, so a sample costs one read per
+namespace and no process at all. Samples go into ring buffers allocated
+up front (slots samples deep), so memory stays bounded however long the
+sampler runs and the oldest samples are overwritten. Nodes outside a
+namespace (OVS switches) share the root namespace, where only their own
+interfaces are recorded.
+
+Rates are computed per second between consecutive samples. stats()
+reports what sampling costs.
+"""
+
+import csv
+import json
+import os
+import threading
+import time
+from array import array
+
+from mininet.log import error
+
+from procnet import NET_DEV_FIELDS
+
+FIELDS = ( 'rx_bytes', 'rx_packets', 'rx_errs', 'rx_drop',
+           'tx_bytes', 'tx_packets', 'tx_errs', 'tx_drop' )
+# Marks a slot where the interface did not exist
+MISSING = -1
+
+
+class IfSampler( object ):
+    "Sample the interface counters of nodes into ring buffers."
+
+    def __init__( self, nodes, interval=1.0, slots=3600, fields=FIELDS ):
+        self.interval = interval
+        self.slots = slots
+        self.fields = tuple( fields )
+        self.columns = [ NET_DEV_FIELDS.index( f ) for f in self.fields ]
+        self.times = array( 'd', [ 0.0 ] ) * slots
+        self.costs = array( 'd', [ 0.0 ] ) * slots
+        self.count = 0              # samples taken
+        self.rings = {}             # 'node:intf' -> array of counters
+        self.known = {}             # ( source, raw name ) -> ring or False
+        self.sources = []           # ( file, label, names or None )
+        self.thread = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        byNs = {}
+        for node in nodes:
+            try:
+                ns = os.stat( '/proc/%d/ns/net' % node.pid ).st_ino
+            except OSError:
+                error( '*** ifstats: cannot read %s\n' % node )
+                continue
+            byNs.setdefault( ns, [] ).append( node )
+        for ns, members in sorted( byNs.items() ):
+            namespaced = [ n for n in members if n.inNamespace ]
+            if namespaced:
+                label, names = namespaced[ 0 ].name, None
+            else:
+                # Root namespace: only our nodes' interfaces
+                label = 'root'
+                names = set( intf for n in members
+                             for intf in n.intfNames() )
+            f = open( '/proc/%d/net/dev' % members[ 0 ].pid, 'rb' )
+            self.sources.append( ( f, label, names ) )
+
+    def ring( self, name ):
+        r = self.rings.get( name )
+        if r is None:
+            r = self.rings[ name ] = array( 'q', [ MISSING ] ) * (
+                self.slots * len( self.fields ) )
+        return r
+
+    def sample( self ):
+        "Take one sample now."
+        start = time.time()
+        width = len( self.fields )
+        columns = self.columns
+        with self.lock:
+            slot = self.count % self.slots
+            base = slot * width
+            seen = set()
+            for i, ( f, label, names ) in enumerate( self.sources ):
+                f.seek( 0 )
+                for line in f.read().splitlines()[ 2: ]:
+                    intf, _, counters = line.partition( b':' )
+                    r = self.known.get( ( i, intf ) )
+                    if r is None:
+                        r = self.add( i, intf.strip().decode(), label,
+                                      names )
+                        self.known[ i, intf ] = r
+                    if r is False:
+                        continue
+                    values = counters.split()
+                    r[ base:base + width ] = array(
+                        'q', [ int( values[ c ] ) for c in columns ] )
+                    seen.add( id( r ) )
+            if len( seen ) < len( self.rings ):
+                missing = array( 'q', [ MISSING ] ) * width
+                for r in self.rings.values():
+                    if id( r ) not in seen:
+                        r[ base:base + width ] = missing
+            self.times[ slot ] = start
+            self.costs[ slot ] = time.time() - start
+            self.count += 1
+
+    def add( self, i, intf, label, names ):
+        "Return the ring of interface intf of source i, False to skip it."
+        if intf == 'lo' or ( names is not None and intf not in names ):
+            return False
+        return self.ring( intf if label == 'root' else
+                          '%s:%s' % ( label, intf ) )
+
+    def run( self ):
+        due = time.time()
+        while not self.stopped.is_set():
+            self.sample()
+            due += self.interval
+            now = time.time()
+            # Skip the ticks a slow sample overran
+            if due < now:
+                due += ( ( now - due ) // self.interval + 1 ) * \
+                    self.interval
+            self.stopped.wait( due - now )
+
+    def start( self ):
+        "Sample every interval seconds in a thread; return self."
+        self.stopped.clear()
+        self.thread = threading.Thread( target=self.run )
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop( self ):
+        if self.thread:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def close( self ):
+        self.stop()
+        for f, _label, _names in self.sources:
+            f.close()
+        self.sources = []
+
+    def kept( self ):
+        "Slot numbers of the samples still held, oldest first."
+        first = max( 0, self.count - self.slots )
+        return [ n % self.slots for n in range( first, self.count ) ]
+
+    def series( self ):
+        """Return { 'node:intf': { 'time': [ t ], field: [ value ],
+           field + '/s': [ rate ] } } for the samples held; values are
+           None where the interface did not exist, rates where there is
+           no previous sample or the counter went back (reset)"""
+        width = len( self.fields )
+        with self.lock:
+            slots = self.kept()
+            times = [ self.times[ s ] for s in slots ]
+            out = {}
+            for name, r in sorted( self.rings.items() ):
+                data = { 'time': times }
+                for i, field in enumerate( self.fields ):
+                    values = [ r[ s * width + i ] for s in slots ]
+                    values = [ None if v == MISSING else v for v in values ]
+                    rates = [ None ]
+                    for k in range( 1, len( values ) ):
+                        a, b = values[ k - 1 ], values[ k ]
+                        dt = times[ k ] - times[ k - 1 ]
+                        rates.append( ( b - a ) / dt if None not in ( a, b )
+                                      and b >= a and dt > 0 else None )
+                    data[ field ] = values
+                    data[ field + '/s' ] = rates
+                out[ name ] = data
+        return out
+
+    def toJSON( self, path ):
+        with open( path, 'w' ) as f:
+            json.dump( self.series(), f )
+
+    def toCSV( self, path ):
+        "One row per sample and interface: time, interface, counters, rates."
+        series = self.series()
+        rates = [ field + '/s' for field in self.fields ]
+        with open( path, 'w' ) as f:
+            writer = csv.writer( f )
+            writer.writerow( ( 'time', 'interface' ) + self.fields +
+                             tuple( rates ) )
+            for name, data in series.items():
+                for k, t in enumerate( data[ 'time' ] ):
+                    if data[ self.fields[ 0 ] ][ k ] is None:
+                        continue
+                    writer.writerow(
+                        [ '%.6f' % t, name ] +
+                        [ data[ field ][ k ] for field in self.fields ] +
+                        [ '' if data[ rate ][ k ] is None else
+                          '%.1f' % data[ rate ][ k ] for rate in rates ] )
+
+    def stats( self ):
+        "What sampling costs: { samples, interfaces, namespaces, cost }."
+        with self.lock:
+            costs = [ self.costs[ s ] for s in self.kept() ]
+        return { 'samples': self.count, 'interfaces': len( self.rings ),
+                 'namespaces': len( self.sources ),
+                 'avgCost': sum( costs ) / len( costs ) if costs else 0,
+                 'maxCost': max( costs ) if costs else 0 }
@@ -0,0 +1,225 @@
+"""IP address management for generated topologies.
+
+The example scripts write their addresses by hand (10.0.10.x per VLAN,
+11/12/13.1.1.0/24 per router link, 122.1.1.x loopbacks), which runs out
+after 254 nodes. IPAM hands out point to point subnets, LAN subnets,
+loopbacks and MACs from named pools instead:
+
+    ipam = IPAM()
+    a, b = ipam.p2p()               # '10.0.0.1/30', '10.0.0.2/30'
+    base, plen = ipam.subnet( 'lan' )
+    gateway = cidr( base + 254, plen )
+    lo = ipam.loopback()            # '122.0.0.1'
+    mac = ipam.mac()                # '02:00:00:00:00:01'
+
+A pool is a prefix cut into equal subnets (/32 for loopbacks), tracked
+as one bit per subnet in a bytearray that grows with what is handed
+out: 100k /30 links take 16 KB. Addresses are plain integers until
+they are formatted. Allocation takes the lowest free subnet: amortized
+O(1) when subnets are only allocated, and O(log n) in the number of
+released subnets when it reuses one, which are kept in a heap. It
+depends on nothing but the sequence of calls, so the same script gets
+the same addresses on every run.
+"""
+
+import heapq
+import socket
+import struct
+
+# name: ( prefix, prefix length of the subnets it hands out )
+POOLS = { 'transit': ( '10.0.0.0/8', 30 ),
+          'stub': ( '172.16.0.0/12', 30 ),
+          'lan': ( '11.0.0.0/8', 24 ),
+          'loopback': ( '122.0.0.0/8', 32 ) }
+# Locally administered unicast MACs
+MAC_BASE = 0x020000000000
+MAC_BITS = 32
+
+
+def ntoa( n ):
+    return socket.inet_ntoa( struct.pack( '!I', n ) )
+
+
+def aton( addr ):
+    return struct.unpack( '!I', socket.inet_aton( addr ) )[ 0 ]
+
+
+def cidr( addr, plen ):
+    "Format integer addr as 'a.b.c.d/plen'."
+    return '%s/%d' % ( ntoa( addr ), plen )
+
+
+def macStr( n ):
+    return ':'.join( '%02x' % b for b in struct.pack( '!Q', n )[ 2: ] )
+
+
+class Bitmap( object ):
+    "Lowest-free allocator of slots 0..size-1, one bit per slot."
+
+    def __init__( self, size ):
+        self.size = size
+        self.bits = bytearray()
+        self.high = 0           # no slot from here up was ever allocated
+        self.freed = []         # heap of released slots below high
+        self.count = 0
+
+    def __len__( self ):
+        return self.count
+
+    def used( self, slot ):
+        byte = slot >> 3
+        return byte < len( self.bits ) and \
+            bool( self.bits[ byte ] & ( 1 << ( slot & 7 ) ) )
+
+    def take( self, slot ):
+        "Mark slot used; False if it already was."
+        if not 0 <= slot < self.size:
+            raise ValueError( 'slot %d out of range' % slot )
+        if self.used( slot ):
+            return False
+        byte = slot >> 3
+        if byte >= len( self.bits ):
+            # Grow geometrically, so growing costs O(1) per allocation
+            self.bits.extend( bytes( min(
+                max( byte + 1, 2 * len( self.bits ) ),
+                ( self.size + 7 ) >> 3 ) - len( self.bits ) ) )
+        self.bits[ byte ] |= 1 << ( slot & 7 )
+        self.count += 1
+        return True
+
+    def allocate( self ):
+        "Take and return the lowest free slot."
+        freed = self.freed
+        # Released slots may have been take()n again since
+        while freed and self.used( freed[ 0 ] ):
+            heapq.heappop( freed )
+        if freed:
+            # Every free slot below high is in the heap
+            slot = heapq.heappop( freed )
+        else:
+            slot = self.high
+            bits = self.bits
+            # Skip full bytes whole
+            while ( slot >> 3 ) < len( bits ) and bits[ slot >> 3 ] == 0xff:
+                slot = ( ( slot >> 3 ) + 1 ) << 3
+            while self.used( slot ):
+                slot += 1
+            if slot >= self.size:
+                raise ValueError( 'no free slot left' )
+            self.high = slot + 1
+        self.take( slot )
+        return slot
+
+    def release( self, slot ):
+        if not self.used( slot ):
+            raise ValueError( 'slot %d is not allocated' % slot )
+        self.bits[ slot >> 3 ] &= ~( 1 << ( slot & 7 ) ) & 0xff
+        self.count -= 1
+        if slot < self.high:
+            heapq.heappush( self.freed, slot )
+
+
+class Pool( object ):
+    "Equal subnets of a prefix, handed out lowest first."
+
+    def __init__( self, prefix, plen, reserved=None ):
+        """prefix: '10.0.0.0/8'
+           plen: prefix length of the subnets handed out
+           reserved: subnets (addresses) never handed out; by default
+           the prefix's first and last addresses when plen is 32"""
+        base, _, bits = prefix.partition( '/' )
+        bits = int( bits or 32 )
+        if not bits <= plen <= 32:
+            raise ValueError( 'cannot cut %s into /%d' % ( prefix, plen ) )
+        self.prefix = prefix
+        self.base = aton( base ) & ( ( 0xffffffff << ( 32 - bits ) )
+                                     & 0xffffffff )
+        self.plen = plen
+        self.shift = 32 - plen
+        self.slots = Bitmap( 1 << ( plen - bits ) )
+        if reserved is None:
+            reserved = []
+            if plen == 32 and self.slots.size > 2:
+                reserved = [ self.base, self.base + self.slots.size - 1 ]
+        for addr in reserved:
+            self.take( addr if isinstance( addr, int ) else aton( addr ) )
+        self.reserved = len( self.slots )
+
+    def __len__( self ):
+        return len( self.slots )
+
+    def slot( self, addr ):
+        slot = ( addr - self.base ) >> self.shift
+        if not 0 <= slot < self.slots.size:
+            raise ValueError( '%s is not in %s' % ( ntoa( addr ),
+                                                    self.prefix ) )
+        return slot
+
+    def allocate( self ):
+        "Return the first address of the lowest free subnet."
+        try:
+            return self.base + ( self.slots.allocate() << self.shift )
+        except ValueError:
+            raise ValueError( 'pool %s is exhausted' % self.prefix )
+
+    def take( self, addr ):
+        "Reserve the subnet holding integer addr; False if it was taken."
+        return self.slots.take( self.slot( addr ) )
+
+    def release( self, addr ):
+        self.slots.release( self.slot( addr ) )
+
+
+class IPAM( object ):
+    "Named address pools, and a MAC pool."
+
+    def __init__( self, pools=None, macBase=MAC_BASE, macBits=MAC_BITS ):
+        "pools: { name: ( prefix, plen ) } overriding POOLS"
+        self.pools = {}
+        specs = dict( POOLS )
+        specs.update( pools or {} )
+        for name, ( prefix, plen ) in sorted( specs.items() ):
+            self.add( name, prefix, plen )
+        self.macBase = macBase
+        # MAC 0 of the pool is never handed out
+        self.macs = Bitmap( 1 << macBits )
+        self.macs.take( 0 )
+
+    def add( self, name, prefix, plen, reserved=None ):
+        "Add (or replace) pool name."
+        self.pools[ name ] = Pool( prefix, plen, reserved )
+        return self.pools[ name ]
+
+    def subnet( self, pool ):
+        "Return ( first address as an integer, prefix length )."
+        p = self.pools[ pool ]
+        return p.allocate(), p.plen
+
+    def p2p( self, pool='transit' ):
+        "Return the two addresses ( 'a/plen', 'b/plen' ) of a new link."
+        base, plen = self.subnet( pool )
+        return cidr( base + 1, plen ), cidr( base + 2, plen )
+
+    def loopback( self, pool='loopback' ):
+        return ntoa( self.pools[ pool ].allocate() )
+
+    def release( self, pool, addr ):
+        "Give back the subnet of pool holding addr (integer or string)."
+        self.pools[ pool ].release(
+            addr if isinstance( addr, int ) else
+            aton( addr.split( '/' )[ 0 ] ) )
+
+    def mac( self ):
+        return macStr( self.macBase + self.macs.allocate() )
+
+    def releaseMac( self, mac ):
+        self.macs.release( int( mac.replace( ':', '' ), 16 ) -
+                           self.macBase )
+
+    def usage( self ):
+        "Return { pool: ( subnets handed out, capacity ) }."
+        result = dict( ( name, ( len( p ) - p.reserved,
+                                 p.slots.size - p.reserved ) )
+                       for name, p in self.pools.items() )
+        result[ 'mac' ] = ( len( self.macs ) - 1, self.macs.size - 1 )
+        return result
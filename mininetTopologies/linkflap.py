@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+
+"""Link failure and recovery benchmark.
+
+Measures how long traffic stops when a link goes down or comes back. A
+sender streams sequence-numbered UDP probes at a steady rate while
+links are brought down and up on a schedule (net.configLinkStatus), and
+a receiver records which probes arrived, in what order and when:
+
+    events = schedule( [ ( 'r1', 'r2' ), ( 'r2', 'r3' ) ], down=1, up=2 )
+    report = run( net, h1, h2, '13.1.1.2', events, rate=1000,
+                  path='/tmp/linkflap.csv' )
+    show( report )
+
+Events are ( seconds from the start, node, node, 'down' or 'up' ); each
+event is measured over the probes sent from it to the next event:
+- lost: probes never received (including those the sender could not
+  send, e.g. for lack of a route);
+- outage: the longest run of consecutive lost probes, in seconds, and
+  recovery: from the event to the end of that run;
+- reordered: probes that arrived after a later one; duplicates;
+- maxLatency: highest one-way delay (sender and receiver share the
+  clock of the machine running Mininet).
+
+The resolution is the probe interval (1 ms at 1000 probes/s). The
+sender paces probes on an absolute schedule, so a late probe does not
+shift the ones after it. The per-event results go to path, as CSV if it
+ends in .csv, JSON otherwise.
+
+The sender and receiver can also be run by hand:
+
+    h2 python linkflap.py receiver --out /tmp/probes.json &
+    h1 python linkflap.py sender 13.1.1.2 --rate 1000 --duration 10
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from array import array
+
+PORT = 5530
+# Sequence number, send time
+PROBE = struct.Struct( '!Id' )
+END = 0xffffffff
+
+
+# Receiver
+
+def receiver( args ):
+    "Record probes until the sender's end marker, or SIGTERM."
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    sock.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22 )
+    sock.bind( ( '', args.port ) )
+    seqs, sent, received = array( 'I' ), array( 'd' ), array( 'd' )
+
+    def stop( _signum, _frame ):
+        raise SystemExit()
+
+    signal.signal( signal.SIGTERM, stop )
+    if args.pidfile:
+        with open( args.pidfile, 'w' ) as f:
+            f.write( '%d\n' % os.getpid() )
+    buf = bytearray( 64 )
+    try:
+        while True:
+            n = sock.recv_into( buf )
+            now = time.time()
+            if n < PROBE.size:
+                continue
+            seq, t = PROBE.unpack_from( buf )
+            if seq == END:
+                break
+            seqs.append( seq )
+            sent.append( t )
+            received.append( now )
+    finally:
+        tmp = args.out + '.tmp'
+        with open( tmp, 'w' ) as f:
+            json.dump( { 'seqs': seqs.tolist(), 'sent': sent.tolist(),
+                         'received': received.tolist() }, f )
+        os.rename( tmp, args.out )
+
+
+# Sender
+
+def sender( args ):
+    "Send the probes; return what was sent."
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    addr = ( args.host, args.port )
+    interval = 1.0 / args.rate
+    start = args.start or time.time()
+    count = int( args.duration * args.rate )
+    errors, late = 0, 0.0
+    for seq in range( count ):
+        delay = start + seq * interval - time.time()
+        if delay > 0:
+            time.sleep( delay )
+        else:
+            late = max( late, -delay )
+        try:
+            sock.sendto( PROBE.pack( seq, time.time() ), addr )
+        except OSError:
+            errors += 1
+    # Let the last probes in before the end marker
+    time.sleep( args.drain )
+    for _ in range( 3 ):
+        try:
+            sock.sendto( PROBE.pack( END, 0 ), addr )
+        except OSError:
+            pass
+    return { 'start': start, 'interval': interval, 'count': count,
+             'sendErrors': errors, 'late': late }
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[ 0 ] )
+    sub = parser.add_subparsers( dest='mode' )
+    sub.required = True
+    for mode in 'receiver', 'sender':
+        p = sub.add_parser( mode )
+        p.add_argument( '--port', type=int, default=PORT )
+        if mode == 'receiver':
+            p.add_argument( '--out', default='/tmp/linkflap-probes.json',
+                            help='where to write the probes received' )
+            p.add_argument( '--pidfile' )
+        else:
+            p.add_argument( 'host' )
+            p.add_argument( '--rate', type=float, default=1000,
+                            help='probes per second' )
+            p.add_argument( '--duration', type=float, default=10 )
+            p.add_argument( '--start', type=float,
+                            help='wall clock time to start at' )
+            p.add_argument( '--drain', type=float, default=.2,
+                            help='seconds to wait before the end marker' )
+    args = parser.parse_args( argv )
+    if args.mode == 'receiver':
+        receiver( args )
+    else:
+        json.dump( sender( args ), sys.stdout )
+
+
+# Analysis
+
+def analyze( sent, probes, events ):
+    """Measure each event over the probes sent until the next one.
+       sent: the sender's report
+       probes: the receiver's { 'seqs', 'sent', 'received' }
+       events: [ { 'time': wall clock, ... } ], in time order"""
+    start, interval, count = sent[ 'start' ], sent[ 'interval' ], \
+        sent[ 'count' ]
+    got = bytearray( count )
+    reordered = bytearray( count )
+    duplicates = array( 'I', [ 0 ] ) * count
+    latency = [ 0.0 ] * count
+    highest = -1
+    for seq, t, r in zip( probes[ 'seqs' ], probes[ 'sent' ],
+                          probes[ 'received' ] ):
+        if seq >= count:
+            continue
+        if got[ seq ]:
+            duplicates[ seq ] += 1
+            continue
+        got[ seq ] = 1
+        latency[ seq ] = r - t
+        if seq < highest:
+            reordered[ seq ] = 1
+        highest = max( highest, seq )
+
+    def first( t ):
+        "The first probe sent at or after t."
+        return min( count, max( 0, int( math.ceil(
+            ( t - start ) / interval - 1e-9 ) ) ) )
+
+    results = []
+    for i, event in enumerate( events ):
+        a = first( event[ 'time' ] )
+        b = first( events[ i + 1 ][ 'time' ] ) if i + 1 < len( events ) \
+            else count
+        longest, end, run = 0, a, 0
+        for seq in range( a, b ):
+            run = 0 if got[ seq ] else run + 1
+            if run > longest:
+                longest, end = run, seq + 1
+        result = dict( event )
+        result.update(
+            sent=b - a, lost=b - a - sum( got[ a:b ] ),
+            outage=longest * interval,
+            recovery=max( 0.0, start + end * interval - event[ 'time' ] )
+            if longest else 0.0,
+            reordered=sum( reordered[ a:b ] ),
+            duplicates=sum( duplicates[ a:b ] ),
+            maxLatency=max( latency[ a:b ] or [ 0.0 ] ) )
+        results.append( result )
+    return { 'rate': 1.0 / interval, 'sent': count, 'received': sum( got ),
+             'lost': count - sum( got ), 'reordered': sum( reordered ),
+             'duplicates': sum( duplicates ),
+             'sendErrors': sent[ 'sendErrors' ],
+             'senderLate': sent[ 'late' ], 'events': results }
+
+
+# Mininet helpers
+
+def schedule( links, down=1.0, up=2.0, start=1.0, repeat=1 ):
+    """Take each link of links (( node, node ) pairs) down for down
+       seconds then up for up seconds, one after the other, repeat
+       times; return the events"""
+    events, t = [], start
+    for _ in range( repeat ):
+        for node1, node2 in links:
+            events.append( ( t, node1, node2, 'down' ) )
+            events.append( ( t + down, node1, node2, 'up' ) )
+            t += down + up
+    return events
+
+
+def run( net, src, dst, addr, events, rate=1000, port=PORT, settle=2.0,
+         path=None, timeout=10 ):
+    """Stream probes from src to dst (at address addr) while applying
+       events; return the report and write its events to path if given.
+       settle: seconds of probes after the last event"""
+    from mininet.log import info
+    from services import Service, launch
+    from procnet import readPid
+    out = '/tmp/linkflap-%s.json' % dst
+    pidfile = '/tmp/linkflap-%s.pid' % dst
+    if os.path.exists( out ):
+        os.unlink( out )
+    report = launch( [ dst ], Service(
+        'linkflap', '%s %s receiver --port %d --out %s --pidfile %s '
+        '> /tmp/linkflap-%s.log 2>&1 &' % (
+            sys.executable, os.path.abspath( __file__ ), port, out,
+            pidfile, dst ),
+        port=port, proto='udp', pidfile=pidfile ), timeout=timeout )
+    if report[ 'failed' ]:
+        raise RuntimeError( 'linkflap receiver failed on %s' % dst )
+    events = sorted( events )
+    duration = ( events[ -1 ][ 0 ] if events else 0 ) + settle
+    # Leave the sender time to start before its first probe
+    start = time.time() + .5
+    proc = src.popen( [ sys.executable, os.path.abspath( __file__ ),
+                        'sender', addr, '--port', str( port ),
+                        '--rate', str( rate ),
+                        '--duration', str( duration ),
+                        '--start', '%.6f' % start ] )
+    applied = []
+    for offset, node1, node2, status in events:
+        delay = start + offset - time.time()
+        if delay > 0:
+            time.sleep( delay )
+        t = time.time()
+        net.configLinkStatus( node1, node2, status )
+        applied.append( { 'time': t, 'offset': t - start,
+                          'link': '%s-%s' % ( node1, node2 ),
+                          'status': status,
+                          'applied': time.time() - t } )
+        info( '*** %.3fs: %s-%s %s\n' % ( t - start, node1, node2,
+                                          status ) )
+    stdout, stderr = proc.communicate()
+    try:
+        sent = json.loads( stdout.decode() )
+    except ValueError:
+        raise RuntimeError( 'linkflap sender on %s failed: %s' % (
+            src, stderr.decode().strip() ) )
+    deadline = time.time() + timeout
+    while not os.path.exists( out ):
+        if time.time() >= deadline:
+            # The end marker got lost: stop the receiver ourselves
+            pid = readPid( pidfile )
+            if pid is not None:
+                os.kill( pid, signal.SIGTERM )
+            deadline = time.time() + timeout
+        time.sleep( .05 )
+    with open( out ) as f:
+        probes = json.load( f )
+    report = analyze( sent, probes, applied )
+    if path:
+        save( report, path )
+    return report
+
+
+COLUMNS = ( 'offset', 'link', 'status', 'applied', 'sent', 'lost',
+            'outage', 'recovery', 'reordered', 'duplicates', 'maxLatency' )
+
+
+def save( report, path ):
+    "Write report's events to path: CSV if it ends in .csv, else JSON."
+    with open( path, 'w' ) as f:
+        if not path.endswith( '.csv' ):
+            json.dump( report, f )
+            return
+        writer = csv.writer( f )
+        writer.writerow( COLUMNS )
+        for event in report[ 'events' ]:
+            writer.writerow( [ '%.6f' % event[ c ]
+                               if isinstance( event[ c ], float )
+                               else event[ c ] for c in COLUMNS ] )
+
+
+def show( report ):
+    print( '%d probes at %d/s: %d lost, %d reordered, %d duplicates, '
+           '%d send errors' % (
+               report[ 'sent' ], report[ 'rate' ], report[ 'lost' ],
+               report[ 'reordered' ], report[ 'duplicates' ],
+               report[ 'sendErrors' ] ) )
+    for e in report[ 'events' ]:
+        print( '%8.3fs %s %-4s: %d/%d lost, outage %.3fs, recovered '
+               'after %.3fs, %d reordered, max latency %.2fms' % (
+                   e[ 'offset' ], e[ 'link' ], e[ 'status' ], e[ 'lost' ],
+                   e[ 'sent' ], e[ 'outage' ], e[ 'recovery' ],
+                   e[ 'reordered' ], e[ 'maxLatency' ] * 1e3 ) )
+
+
+if __name__ == '__main__':
+    main()
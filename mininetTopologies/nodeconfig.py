@@ -0,0 +1,251 @@
+"""Batched node configuration.
+
+Every node.cmd() call is a full round trip on the node's shell, and most
+of them fork an ifconfig/ip process just to set one attribute. NodeConfig
+queues a node's configuration and pushes it in a single round trip:
+consecutive 'ip' (or 'bridge') commands are fed to one 'ip -batch' (or
+'bridge -batch') process and everything else runs from one generated
+shell script, in queue order.
+
+    r1c = NodeConfig( r1 )
+    r1c.cmd( 'ifconfig r1-eth0 0' )
+    r1c.addrAdd( 'r1-eth0', '10.1.1.2/24' )
+    r1c.routeAdd( '122.1.1.2/32', via='11.1.1.1', dev='r1-eth1' )
+    failures = r1c.run()
+
+Commands that fail do not stop the batch; run() returns one CmdFailure
+per failed command so the caller can see exactly what went wrong.
+
+Node namespaces are independent, so runConfigs() pushes many nodes'
+queues at once on a bounded worker pool and returns when all are done:
+
+    report = runConfigs( [ h1c, h2c, r1c, r2c, r3c ] )
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import info, error, debug
+
+# Marker echoed by the generated script after every shell command
+MARKER = '@@nodeconfig'
+
+# Tools whose commands can be fed to one '<tool> -force -batch' process
+BATCH_TOOLS = ( 'ip', 'bridge' )
+
+# Shell syntax that cannot be passed through 'ip -batch'
+SHELL_CHARS = re.compile( r'[|&;<>$`\'"\\]' )
+
+IP_FAILED = re.compile( r'Command failed (\S+):(\d+)' )
+
+
+class CmdFailure( object ):
+    "A queued command that failed when its batch ran."
+
+    def __init__( self, node, index, command, status, output ):
+        self.node = node
+        self.index = index
+        self.command = command
+        self.status = status
+        self.output = output
+
+    def __repr__( self ):
+        return '<CmdFailure %s #%d %r status=%s: %s>' % (
+            self.node, self.index, self.command, self.status,
+            self.output.strip() )
+
+
+class NodeConfig( object ):
+    "Configuration commands queued for one node."
+
+    def __init__( self, node ):
+        self.node = node
+        self.cmds = []
+
+    def __len__( self ):
+        return len( self.cmds )
+
+    def cmd( self, command ):
+        """Queue a shell command; plain 'ip ...' and 'bridge ...' commands
+           join a batch"""
+        self.cmds.append( command.strip() )
+        return self
+
+    def ip( self, args ):
+        "Queue an ip(8) command, e.g. ip( 'link set lo up' )."
+        return self.cmd( 'ip ' + args )
+
+    def addrFlush( self, intf ):
+        "Remove all addresses from intf."
+        return self.ip( 'addr flush dev %s' % intf )
+
+    def addrAdd( self, intf, cidr ):
+        "Add address cidr ('10.0.0.1/24') to intf."
+        return self.ip( 'addr add %s dev %s' % ( cidr, intf ) )
+
+    def loopback( self, addr ):
+        "Add the node's /32 loopback address."
+        return self.addrAdd( 'lo', addr if '/' in addr else addr + '/32' )
+
+    def linkUp( self, intf ):
+        "Bring intf up."
+        return self.ip( 'link set dev %s up' % intf )
+
+    def bridgeAdd( self, name ):
+        "Create a bridge."
+        return self.ip( 'link add name %s type bridge' % name )
+
+    def vlanAdd( self, parent, vid, name=None ):
+        "Create VLAN subinterface parent.vid (or name)."
+        return self.ip( 'link add link %s name %s type vlan id %d' % (
+            parent, name or '%s.%d' % ( parent, vid ), vid ) )
+
+    def linkMaster( self, intf, master ):
+        "Enslave intf to bridge master."
+        return self.ip( 'link set dev %s master %s' % ( intf, master ) )
+
+    def bridgeVlan( self, intf, vids, pvid=False, untagged=False,
+                    master=False ):
+        """Add VLANs vids ( 10, or a '10-4000' range ) to bridge port intf;
+           master: to the bridge device itself rather than a port"""
+        args = 'vlan add vid %s dev %s' % ( vids, intf )
+        if pvid:
+            args += ' pvid'
+        if untagged:
+            args += ' untagged'
+        return self.cmd( 'bridge %s%s' % ( args, ' self' if master else '' ) )
+
+    def routeAdd( self, dst, via=None, dev=None ):
+        "Add a route to dst, optionally via a gateway and/or device."
+        args = 'route add to %s' % dst
+        if via:
+            args += ' via %s' % via
+        if dev:
+            args += ' dev %s' % dev
+        return self.ip( args )
+
+    def unreachable( self, dst ):
+        "Add an unreachable route for dst."
+        return self.ip( 'route add unreachable %s' % dst )
+
+    def sysctl( self, key, value ):
+        "Set a sysctl inside the node's namespace."
+        return self.cmd( 'sysctl -q -w %s=%s' % ( key, value ) )
+
+    def ipForward( self, enable=True ):
+        "Enable or disable IPv4 forwarding."
+        return self.sysctl( 'net.ipv4.ip_forward', int( enable ) )
+
+    @staticmethod
+    def batchTool( command ):
+        "Return the tool whose batch can run command, or None."
+        tool = command.split( ' ', 1 )[ 0 ]
+        if tool in BATCH_TOOLS and ' ' in command and \
+                not SHELL_CHARS.search( command ):
+            return tool
+        return None
+
+    def script( self, tmpdir ):
+        """Write the batch files and driver script for the queued commands
+           into tmpdir; return ( script path, { ( batch, line ): index } )"""
+        lines = [ '#!/bin/sh' ]
+        iplines = {}
+        batch, batchFor = None, None
+        for index, command in enumerate( self.cmds ):
+            tool = self.batchTool( command )
+            if batch is not None and tool != batchFor:
+                batch.close()
+                batch = None
+            if tool:
+                if batch is None:
+                    path = os.path.join( tmpdir, 'batch%d' % index )
+                    batch, batchFor = open( path, 'w' ), tool
+                    lineno = 0
+                    lines.append( '%s -force -batch %s 2>&1' % ( tool, path ) )
+                    lines.append( 'echo %s' % MARKER )
+                lineno += 1
+                batch.write( command[ len( tool ) + 1: ] + '\n' )
+                iplines[ ( batch.name, lineno ) ] = index
+                continue
+            lines.append( command )
+            lines.append( 'echo %s %d $?' % ( MARKER, index ) )
+        if batch is not None:
+            batch.close()
+        path = os.path.join( tmpdir, 'config.sh' )
+        with open( path, 'w' ) as f:
+            f.write( '\n'.join( lines ) + '\n' )
+        return path, iplines
+
+    def parse( self, output, iplines ):
+        "Turn the driver script's output into a list of CmdFailures."
+        failures = []
+        pending = []
+        for line in output.splitlines():
+            m = IP_FAILED.search( line )
+            if m:
+                index = iplines.get( ( m.group( 1 ), int( m.group( 2 ) ) ) )
+                if index is not None:
+                    failures.append( CmdFailure(
+                        self.node, index, self.cmds[ index ], 1,
+                        '\n'.join( pending ) ) )
+                pending = []
+            elif line.startswith( MARKER ):
+                fields = line.split()
+                if len( fields ) == 3 and fields[ 2 ] != '0':
+                    index = int( fields[ 1 ] )
+                    failures.append( CmdFailure(
+                        self.node, index, self.cmds[ index ],
+                        int( fields[ 2 ] ), '\n'.join( pending ) ) )
+                pending = []
+            else:
+                pending.append( line )
+        return failures
+
+    def run( self ):
+        "Push all queued commands to the node; return list of CmdFailures."
+        if not self.cmds:
+            return []
+        tmpdir = tempfile.mkdtemp( prefix='nodeconfig-%s-' % self.node )
+        try:
+            path, iplines = self.script( tmpdir )
+            output = self.node.cmd( 'sh %s' % path )
+        finally:
+            shutil.rmtree( tmpdir, ignore_errors=True )
+        failures = self.parse( output, iplines )
+        for failure in failures:
+            error( '*** %s: %s failed (%s): %s\n' % (
+                self.node, failure.command, failure.status,
+                failure.output.strip() ) )
+        self.cmds = []
+        return failures
+
+
+def runConfigs( configs, maxWorkers=32 ):
+    """Run NodeConfigs concurrently, at most maxWorkers at a time, and wait
+       for all of them; return { node name: ( seconds, failures ) }"""
+    def timed( config ):
+        start = time.time()
+        failures = config.run()
+        return config.node.name, time.time() - start, failures
+
+    configs = [ c for c in configs if len( c ) ]
+    if not configs:
+        return {}
+    report = {}
+    start = time.time()
+    with ThreadPoolExecutor( max_workers=min( maxWorkers, len( configs ) ) ) \
+            as pool:
+        for name, seconds, failures in pool.map( timed, configs ):
+            debug( '*** %s configured in %.3fs\n' % ( name, seconds ) )
+            report[ name ] = ( seconds, failures )
+    slowest = max( report, key=lambda name: report[ name ][ 0 ] )
+    failed = sum( len( failures ) for _seconds, failures in report.values() )
+    info( '*** Configured %d nodes in %.3fs (slowest %s: %.3fs, '
+          '%d failed commands)\n' % (
+              len( report ), time.time() - start, slowest,
+              report[ slowest ][ 0 ], failed ) )
+    return report
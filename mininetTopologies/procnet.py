@@ -0,0 +1,73 @@
+"""Network state read straight from /proc.
+
+/proc/<pid>/net shows the network namespace that process pid lives in,
+so the sockets and interface counters of any Mininet node can be read
+from the root namespace through its shell's pid (node.pid): no round
+trip on the node's shell and no ss, netstat or ifconfig process per
+check.
+
+    if 22 in listening( h1.pid ):
+        ...
+"""
+
+# Socket states in /proc/net/{tcp,udp}
+TCP_LISTEN = '0A'
+UDP_UNCONNECTED = '07'
+
+
+def sockets( pid, proto='tcp' ):
+    "Generate ( local port, state ) for the proto sockets pid can see."
+    for name in proto, proto + '6':
+        try:
+            f = open( '/proc/%d/net/%s' % ( pid, name ) )
+        except ( IOError, OSError ):
+            continue
+        with f:
+            next( f, None )
+            for line in f:
+                fields = line.split()
+                yield int( fields[ 1 ].rsplit( ':', 1 )[ 1 ], 16 ), fields[ 3 ]
+
+
+def listening( pid, proto='tcp' ):
+    "Return the ports with a listening (tcp) or bound (udp) socket."
+    state = TCP_LISTEN if proto == 'tcp' else UDP_UNCONNECTED
+    return set( port for port, st in sockets( pid, proto ) if st == state )
+
+
+def alive( pid ):
+    "Is process pid running (and not a zombie)?"
+    try:
+        with open( '/proc/%d/stat' % pid ) as f:
+            # The state follows the parenthesized command name
+            return f.read().rsplit( ')', 1 )[ 1 ].split()[ 0 ] != 'Z'
+    except ( IOError, OSError, IndexError ):
+        return False
+
+
+def readPid( path ):
+    "Return the pid stored in pidfile path, or None."
+    try:
+        with open( path ) as f:
+            return int( f.read().split()[ 0 ] )
+    except ( IOError, OSError, ValueError, IndexError ):
+        return None
+
+
+# Counter columns of /proc/net/dev, in order
+NET_DEV_FIELDS = tuple( 'rx_' + f for f in (
+    'bytes', 'packets', 'errs', 'drop', 'fifo', 'frame', 'compressed',
+    'multicast' ) ) + tuple( 'tx_' + f for f in (
+        'bytes', 'packets', 'errs', 'drop', 'fifo', 'colls', 'carrier',
+        'compressed' ) )
+
+
+def netDev( pid ):
+    "Return { interface: { counter: value } } for pid's namespace."
+    stats = {}
+    with open( '/proc/%d/net/dev' % pid ) as f:
+        for line in f.readlines()[ 2: ]:
+            name, _, counters = line.partition( ':' )
+            stats[ name.strip() ] = dict(
+                zip( NET_DEV_FIELDS, map( int, counters.split() ) ) )
+    return stats
@@ -1,12 +1,33 @@
 #!/usr/bin/env python
 
 # Do necessary imports
+import argparse
 from mininet.net import Mininet
 from mininet.cli import CLI
 from mininet.link import Link
+from nodeconfig import NodeConfig, runConfigs
+from routecompiler import RouteCompiler
+import socketload
+import bulkxfer
+import dvrouted
+import linkflap
 
 if '__main__' == __name__:
 
+    parser = argparse.ArgumentParser(
+        description='Routing between h1 and h2 across r1 - r2 - r3' )
+    parser.add_argument( '--load', action='store_true',
+                         help='load h2 from h1 with socketload' )
+    parser.add_argument( '--xfer', action='store_true',
+                         help='measure h1 -> h2 throughput with bulkxfer' )
+    parser.add_argument( '--dv', action='store_true',
+                         help='let dvrouted learn the routers\' routes '
+                         'instead of installing static ones' )
+    parser.add_argument( '--flap', action='store_true',
+                         help='flap r1 - r2 and r2 - r3 while probing '
+                         'h1 -> h2' )
+    args = parser.parse_args()
+
     net = Mininet()
 
     # Add Hosts
@@ -26,91 +47,106 @@ if '__main__' == __name__:
 
     net.build()
 
-    # Remove default IP addresses from host's interfaces 
-    h1.cmd("ifconfig h1-eth0 0")
-    h2.cmd("ifconfig h2-eth0 0")
-
-    # Assign IP Address to Hosts as ususal
-    h1.cmd("ifconfig h1-eth0 10.1.1.1 netmask 255.255.255.0")
-    h2.cmd("ifconfig h2-eth0 13.1.1.2 netmask 255.255.255.0")
-
-    # Default Route in hosts
-    h1.cmd("ip route add default via 10.1.1.2 dev h1-eth0")
-    h2.cmd("ip route add default via 13.1.1.1 dev h2-eth0")
-
-    # config loop back addresses of hosts
-    h1.cmd("ifconfig lo 122.1.1.4 netmask 255.255.255.255")
-    h2.cmd("ifconfig lo 122.1.1.5 netmask 255.255.255.255")
-    
-    # config Router R1
-    r1.cmd("ifconfig r1-eth0 0")
-    r1.cmd("ifconfig r1-eth1 0")
-    r1.cmd("ifconfig r1-eth0 10.1.1.2 netmask 255.255.255.0")
-    r1.cmd("ifconfig r1-eth1 11.1.1.2 netmask 255.255.255.0")
-    r1.cmd("ifconfig lo 122.1.1.1 netmask 255.255.255.255")
-    
-    # config Router R2
-    r2.cmd("ifconfig r2-eth0 0")
-    r2.cmd("ifconfig r2-eth1 0")
-    r2.cmd("ifconfig r2-eth0 11.1.1.1 netmask 255.255.255.0")
-    r2.cmd("ifconfig r2-eth1 12.1.1.1 netmask 255.255.255.0")
-    r2.cmd("ifconfig lo 122.1.1.2 netmask 255.255.255.255")
-    
-    # config Router R3
-    r3.cmd("ifconfig r3-eth0 0")
-    r3.cmd("ifconfig r3-eth1 0")
-    r3.cmd("ifconfig r3-eth0 12.1.1.2 netmask 255.255.255.0")
-    r3.cmd("ifconfig r3-eth1 13.1.1.1 netmask 255.255.255.0")
-    r3.cmd("ifconfig lo 122.1.1.3 netmask 255.255.255.255")
-
-    #enable IP forwarding on Router
-    r1.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-
-    #install L3 routes on the router R1 for all remote subnets
-    r1.cmd("ip route add to 122.1.1.4/32 via 10.1.1.1 dev r1-eth0") # Route to h1
-    r1.cmd("ip route add to 122.1.1.2/32 via 11.1.1.1 dev r1-eth1") # Route to r2
-    r1.cmd("ip route add to 122.1.1.3/32 via 11.1.1.1 dev r1-eth1") # Route to r3
-    r1.cmd("ip route add to 122.1.1.5/32 via 11.1.1.1 dev r1-eth1") # Route to h2
-    r1.cmd("ip route add to 12.1.1.0/24  via 11.1.1.1 dev r1-eth1") # Route to subnet S3
-    r1.cmd("ip route add to 13.1.1.0/24  via 11.1.1.1 dev r1-eth1") # Route to subnet S4
-
-    #install L3 routes on the router R2 for all remote subnets
-    r2.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-    r2.cmd("ip route add to 122.1.1.4/32 via 11.1.1.2 dev r2-eth0") # Route to h1
-    r2.cmd("ip route add to 122.1.1.1/32 via 11.1.1.2 dev r2-eth0") # Route to r1
-    r2.cmd("ip route add to 122.1.1.3/32 via 12.1.1.2 dev r2-eth1") # Route to r3
-    r2.cmd("ip route add to 122.1.1.5/32 via 12.1.1.2 dev r2-eth1") # Route to h2
-    r2.cmd("ip route add to 10.1.1.0/24  via 11.1.1.2 dev r2-eth0") # Route to subnet S1
-    r2.cmd("ip route add to 13.1.1.0/24  via 12.1.1.2 dev r2-eth1") # Route to subnet S4
-
-    #install L3 routes on the router R3 for all remote subnets
-    r3.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-    r3.cmd("ip route add to 122.1.1.4/32 via 12.1.1.1 dev r3-eth0") # Route to h1
-    r3.cmd("ip route add to 122.1.1.1/32 via 12.1.1.1 dev r3-eth0") # Route to r1
-    r3.cmd("ip route add to 122.1.1.2/32 via 12.1.1.2 dev r3-eth0") # Route to r2
-    r3.cmd("ip route add to 122.1.1.5/32 via 13.1.1.2 dev r3-eth1") # Route to h2
-    r3.cmd("ip route add to 10.1.1.0/24  via 12.1.1.1 dev r3-eth0") # Route to subnet S1
-    r3.cmd("ip route add to 11.1.1.0/24  via 12.1.1.1 dev r3-eth0") # Route to subnet S2
-
-    #install L3 routes on the host h1 for all remote subnets
-    h1.cmd("ip route add to 122.1.1.1/32 via 10.1.1.2 dev h1-eth0") # Route to r1
-    h1.cmd("ip route add to 122.1.1.2/32 via 10.1.1.2 dev h1-eth0") # Route to r2
-    h1.cmd("ip route add to 122.1.1.3/32 via 10.1.1.2 dev h1-eth0") # Route to r3
-    h1.cmd("ip route add to 122.1.1.5/32 via 10.1.1.2 dev h1-eth0") # Route to h2
-    h1.cmd("ip route add to 11.1.1.0/24  via 10.1.1.2 dev h1-eth0") # Route to subnet S2
-    h1.cmd("ip route add to 12.1.1.0/24  via 10.1.1.2 dev h1-eth0") # Route to subnet S3
-    h1.cmd("ip route add to 13.1.1.0/24  via 10.1.1.2 dev h1-eth0") # Route to subnet S4
-
-    #install L3 routes on the host h2 for all remote subnets
-    h2.cmd("ip route add to 122.1.1.1/32 via 13.1.1.1 dev h2-eth0") # Route to r1
-    h2.cmd("ip route add to 122.1.1.2/32 via 13.1.1.1 dev h2-eth0") # Route to r2
-    h2.cmd("ip route add to 122.1.1.3/32 via 13.1.1.1 dev h2-eth0") # Route to r3
-    h2.cmd("ip route add to 122.1.1.4/32 via 13.1.1.1 dev h2-eth0") # Route to h2
-    h2.cmd("ip route add to 11.1.1.0/24  via 13.1.1.1 dev h2-eth0") # Route to subnet S2
-    h2.cmd("ip route add to 12.1.1.0/24  via 13.1.1.1 dev h2-eth0") # Route to subnet S3
-    h2.cmd("ip route add to 10.1.1.0/24  via 13.1.1.1 dev h2-eth0") # Route to subnet S1
-    
+    # Interface addresses of every L3 device. Each link is its own subnet:
+    # S1 = 10.1.1.0/24 (h1-r1), S2 = 11.1.1.0/24 (r1-r2),
+    # S3 = 12.1.1.0/24 (r2-r3), S4 = 13.1.1.0/24 (r3-h2)
+    addresses = {
+        'h1-eth0' : '10.1.1.1/24',
+        'r1-eth0' : '10.1.1.2/24',
+        'r1-eth1' : '11.1.1.2/24',
+        'r2-eth0' : '11.1.1.1/24',
+        'r2-eth1' : '12.1.1.1/24',
+        'r3-eth0' : '12.1.1.2/24',
+        'r3-eth1' : '13.1.1.1/24',
+        'h2-eth0' : '13.1.1.2/24',
+    }
+
+    # Node IP address (also called loopback addr) of every L3 device
+    loopbacks = {
+        'r1' : '122.1.1.1',
+        'r2' : '122.1.1.2',
+        'r3' : '122.1.1.3',
+        'h1' : '122.1.1.4',
+        'h2' : '122.1.1.5',
+    }
+
+    # Queue each node's configuration instead of running it command by
+    # command; each node's whole queue is pushed in one shell round trip
+    configs = dict( ( n.name, NodeConfig( n ) ) for n in ( h1, h2, r1, r2, r3 ) )
+
+    # Remove default IP addresses and assign ours
+    for intf, cidr in sorted( addresses.items() ):
+        c = configs[ intf.split( '-' )[ 0 ] ]
+        c.addrFlush( intf )
+        c.addrAdd( intf, cidr )
+
+    # config loop back addresses
+    for name, addr in sorted( loopbacks.items() ):
+        configs[ name ].loopback( addr )
+
+    #enable IP forwarding on Routers
+    for name in ( 'r1', 'r2', 'r3' ):
+        configs[ name ].ipForward()
+
+    # install L3 routes on every router and host for all remote subnets
+    # and loopbacks; the routes are computed from the addresses above
+    # (shortest path per node) instead of being written by hand, then
+    # collapsed into the fewest equivalent routes. Hosts have a single
+    # gateway, so all of their routes become one default route.
+    # With --dv the routers learn their routes from dvrouted instead,
+    # and only the hosts get static (default) routes
+    dv = args.dv
+    rc = RouteCompiler.fromNet( net, addresses, loopbacks, hosts=( 'h1', 'h2' ) )
+    rc.install( [ configs[ 'h1' ], configs[ 'h2' ] ] if dv
+                else configs.values(), aggregate=True )
+
+    # dvrouted only knows the prefixes a router is attached to, and the
+    # hosts' loopbacks are one hop further: each router gets a static
+    # route to the loopbacks of the hosts on its links, which dvrouted
+    # redistributes to the others
+    routers = [ r1, r2, r3 ]
+    if dv:
+        for r in routers:
+            for prefix, via, dev in rc.routes( r.name ):
+                if via in ( addresses[ 'h1-eth0' ].split( '/' )[ 0 ],
+                            addresses[ 'h2-eth0' ].split( '/' )[ 0 ] ):
+                    configs[ r.name ].routeAdd( prefix, via=via, dev=dev )
+
+    # Push the queued configuration to all nodes in parallel; this returns
+    # once every node is configured
+    runConfigs( configs.values() )
+
+    # Start the routing daemons and wait until every router reaches all
+    # subnets and loopbacks, the hosts' included
+    if dv:
+        dvrouted.start( routers, redistribute=True )
+        dvrouted.show( dvrouted.converge(
+            routers, reachable=len( set( rc.prefixes ) ) + len( loopbacks ) ) )
+
+    # Optionally load h2 from h1 across r1 - r2 - r3 with socketload
+    if args.load:
+        socketload.serve( [ h2 ] )
+        socketload.show( socketload.load(
+            h1, addresses[ 'h2-eth0' ].split( '/' )[ 0 ],
+            connections=1000, duration=10 ) )
+
+    # Optionally measure h1 -> h2 throughput across the router chain
+    if args.xfer:
+        bulkxfer.serve( [ h2 ] )
+        bulkxfer.show( bulkxfer.transfer(
+            h1, addresses[ 'h2-eth0' ].split( '/' )[ 0 ], streams=4 ) )
+
+    # Optionally take r1 - r2 then r2 - r3 down for a second each while
+    # probing h1 -> h2, and record what each failure and recovery cost
+    if args.flap:
+        linkflap.show( linkflap.run(
+            net, h1, h2, addresses[ 'h2-eth0' ].split( '/' )[ 0 ],
+            linkflap.schedule( [ ( 'r1', 'r2' ), ( 'r2', 'r3' ) ] ),
+            path='/tmp/linkflap.csv' ) )
+
     # Start Mininet Cli prompt
     CLI(net)
 
+    if dv:
+        dvrouted.stop( routers )
     net.stop()
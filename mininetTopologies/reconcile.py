@@ -0,0 +1,303 @@
+"""Desired-state reconciliation for a running network.
+
+Changing one address or route of a running lab used to mean a full
+stop and rebuild. reconcile() reads the current state of the nodes a
+DesiredState covers, compares it with what is desired, and applies only
+the difference:
+
+    rc = RouteCompiler.fromNet( net, addresses, loopbacks,
+                                hosts=( 'h1', 'h2' ) )
+    report = reconcile( net, DesiredState.fromRouteCompiler( rc ) )
+
+or, built by hand:
+
+    desired = DesiredState()
+    desired.address( 'r1', 'r1-eth0', '10.1.1.2/24' )
+    desired.route( 'r1', '122.1.1.3/32', via='11.1.1.1', dev='r1-eth1' )
+    desired.master( 's5', 's5-eth0', 'vlan10' )
+    reconcile( net, desired )
+
+A DesiredState only manages what it names: the IPv4 addresses of the
+interfaces it lists (127.0.0.0/8 on lo is left alone), the bridge
+master of the interfaces it lists, and the whole IPv4 main table
+(connected routes excepted) of the nodes it gives routes for.
+
+Current state is read in one round trip per node (see snapshot), all
+nodes at once; like capture(), reconcile() only handles nodes with their
+own network namespace and rejects the others. Each node's changes are pushed as one NodeConfig batch,
+and unchanged nodes are not touched at all. A node's changes apply as
+a whole: if any command fails, the node is read again and taken back to
+the state it was in before.
+"""
+
+import time
+from ipaddress import ip_interface, ip_network
+
+from mininet.log import info, error
+
+from nodeconfig import NodeConfig, runConfigs
+from snapshot import capture
+
+# Route types that come before the destination in 'ip route' arguments
+ROUTE_TYPES = ( 'unreachable', 'blackhole', 'prohibit', 'throw' )
+
+
+def routeDst( prefix ):
+    "Write prefix the way 'ip route' prints destinations."
+    if prefix == 'default':
+        return prefix
+    net = ip_network( prefix, strict=False )
+    if net.prefixlen == 0:
+        return 'default'
+    if net.prefixlen == net.max_prefixlen:
+        return str( net.network_address )
+    return str( net )
+
+
+def routeKey( args ):
+    "The destination of a route given as 'ip route' arguments."
+    words = args.split()
+    return words[ 1 ] if words[ 0 ] in ROUTE_TYPES else words[ 0 ]
+
+
+class DesiredState( object ):
+    "What some nodes' addresses, routes and bridge ports should be."
+
+    def __init__( self ):
+        self.addrs = {}         # node -> { intf: set( cidr ) }
+        self.routes = {}        # node -> { dst: 'ip route' arguments }
+        self.masters = {}       # node -> { intf: bridge or None }
+
+    def interface( self, node, intf ):
+        "Manage intf's addresses (none until address() adds some)."
+        self.addrs.setdefault( node, {} ).setdefault( intf, set() )
+
+    def address( self, node, intf, cidr ):
+        iface = ip_interface( cidr )
+        self.interface( node, intf )
+        self.addrs[ node ][ intf ].add( '%s/%d' % (
+            iface.ip, iface.network.prefixlen ) )
+
+    def table( self, node ):
+        "Manage node's routes (none until route() adds some)."
+        return self.routes.setdefault( node, {} )
+
+    def route( self, node, dst, via=None, dev=None ):
+        "Route dst via a gateway and/or device; unreachable without both."
+        dst = routeDst( dst )
+        if via is None and dev is None:
+            args = 'unreachable %s' % dst
+        else:
+            args = dst + ( ' via %s' % via if via else '' ) + \
+                ( ' dev %s' % dev if dev else '' )
+        self.table( node )[ dst ] = args
+
+    def master( self, node, intf, bridge ):
+        "Make intf a port of bridge, or of no bridge if bridge is None."
+        self.masters.setdefault( node, {} )[ intf ] = bridge
+
+    def nodes( self ):
+        return sorted( set( self.addrs ) | set( self.routes ) |
+                       set( self.masters ) )
+
+    @classmethod
+    def fromRouteCompiler( cls, rc, aggregate=True ):
+        """The addresses, loopbacks and routes a RouteCompiler was given
+           and computes, for all of its nodes"""
+        desired = cls()
+        for n, name in enumerate( rc.names ):
+            for intf, addr, s in rc.intfs[ n ]:
+                desired.address( name, intf, '%s/%d' % (
+                    addr, ip_network( rc.prefixes[ s ] ).prefixlen ) )
+            for prefix in rc.loopbacks[ n ]:
+                desired.address( name, 'lo', prefix )
+            desired.table( name )
+            routes = rc.aggregated( name ) if aggregate else \
+                rc.routes( name )
+            for prefix, via, dev in routes:
+                desired.route( name, prefix, via, dev )
+        return desired
+
+
+def routeFields( args ):
+    "Split 'ip route' arguments into { keyword: value }."
+    words = args.split()
+    fields = { 'type': 'unicast' }
+    if words[ 0 ] in ROUTE_TYPES:
+        fields[ 'type' ] = words.pop( 0 )
+    fields[ 'dst' ] = words.pop( 0 )
+    if 'nexthop' in words:
+        i = words.index( 'nexthop' )
+        fields[ 'nexthop' ] = ' '.join( words[ i: ] )
+        words = words[ :i ]
+    fields.update( zip( words[ ::2 ], words[ 1::2 ] ) )
+    return fields
+
+
+def matches( goal, args ):
+    "Does the route args satisfy goal (which may leave out the dev)?"
+    want, have = routeFields( goal ), routeFields( args )
+    return all( have.get( key ) == value for key, value in want.items() ) \
+        and have.get( 'metric' ) == want.get( 'metric' ) \
+        and have.get( 'nexthop' ) == want.get( 'nexthop' )
+
+
+def addrChanges( current, wanted ):
+    "Return the commands making current addresses wanted."
+    dels, adds = [], []
+    for intf, goal in sorted( wanted.items() ):
+        # In the kernel's order: a subnet's primary before its secondaries
+        have = [ cidr for cidr, _brd in current.get( intf, [] )
+                 if '.' in cidr and not
+                 ( intf == 'lo' and cidr.startswith( '127.' ) ) ]
+        primaries = {}
+        for cidr in have:
+            primaries.setdefault( ip_interface( cidr ).network, cidr )
+        gone = [ cidr for cidr in have if cidr not in goal ]
+        dels += [ 'addr del %s dev %s' % ( cidr, intf )
+                  for cidr in sorted( gone ) ]
+        adds += [ 'addr add %s dev %s' % ( cidr, intf )
+                  for cidr in sorted( goal - set( have ) ) ]
+        # Deleting a primary deletes its secondaries too (unless
+        # promote_secondaries is set), so the wanted ones are put back;
+        # replace does not fail if they survived
+        orphaned = set( primaries.values() ) & set( gone )
+        adds += [ 'addr replace %s dev %s' % ( cidr, intf )
+                  for cidr in sorted( goal & set( have ) )
+                  if primaries[ ip_interface( cidr ).network ] in orphaned ]
+    # Deleting first keeps a new address in an old subnet primary
+    return dels + adds
+
+
+def masterChanges( links, wanted ):
+    "Return the commands making current bridge masters wanted."
+    current = dict( ( link[ 'name' ], link.get( 'master' ) )
+                    for link in links )
+    return [ 'link set dev %s %s' % (
+        intf, 'master %s' % bridge if bridge else 'nomaster' )
+        for intf, bridge in sorted( wanted.items() )
+        if current.get( intf ) != bridge ]
+
+
+def routeChanges( current, wanted ):
+    "Return ( deletes, replaces ) making the current routes wanted."
+    have = {}
+    for args in current:
+        have.setdefault( routeKey( args ), [] ).append( args )
+    dels, replaces = [], []
+    for dst in sorted( set( have ) | set( wanted ) ):
+        goal, old = wanted.get( dst ), have.get( dst, [] )
+        keep = [ a for a in old if goal and matches( goal, a ) ][ :1 ]
+        if goal and not keep:
+            replaces.append( 'route replace %s' % goal )
+        # replace overwrites the route to dst without a metric; routes
+        # with one, and any route beside the one kept, must go
+        dels += [ 'route del %s' % a for a in old if a not in keep and
+                  ( goal is None or keep or ' metric ' in ' %s ' % a ) ]
+    return dels, replaces
+
+
+def plan( state, desired, name ):
+    "Return the commands taking node name from state to desired."
+    addrs = addrChanges( state[ 'addrs' ], desired.addrs.get( name, {} ) )
+    masters = masterChanges( state[ 'links' ],
+                             desired.masters.get( name, {} ) )
+    dels, replaces = [], []
+    if name in desired.routes:
+        wanted = desired.routes[ name ]
+        dels, replaces = routeChanges( state[ 'routes' ], wanted )
+        if addrs:
+            # Address changes make the kernel drop the routes through
+            # them, so every wanted route is put back afterwards
+            replaces = [ 'route replace %s' % args
+                         for _dst, args in sorted( wanted.items() ) ]
+    # Routes go before the addresses they use, and come back after them
+    return dels + addrs + masters + replaces
+
+
+def stateOf( state, desired, name ):
+    "A DesiredState holding the part of state that desired manages."
+    back = DesiredState()
+    for intf in desired.addrs.get( name, {} ):
+        back.interface( name, intf )
+        for cidr, _brd in state[ 'addrs' ].get( intf, [] ):
+            if '.' in cidr and not ( intf == 'lo' and
+                                     cidr.startswith( '127.' ) ):
+                back.address( name, intf, cidr )
+    masters = dict( ( link[ 'name' ], link.get( 'master' ) )
+                    for link in state[ 'links' ] )
+    for intf in desired.masters.get( name, {} ):
+        back.master( name, intf, masters.get( intf ) )
+    if name in desired.routes:
+        table = back.table( name )
+        for args in state[ 'routes' ]:
+            table[ routeKey( args ) ] = args
+    return back
+
+
+def apply( net, changes, maxWorkers=32 ):
+    """Push { node name: [ ip command ] } as one batch per node; return
+       runConfigs()' report"""
+    configs = []
+    for name, cmds in sorted( changes.items() ):
+        config = NodeConfig( net[ name ] )
+        for cmd in cmds:
+            config.ip( cmd )
+        configs.append( config )
+    return runConfigs( configs, maxWorkers=maxWorkers )
+
+
+def reconcile( net, desired, dryRun=False, maxWorkers=32 ):
+    """Bring the nodes desired covers to the desired state; return
+       { node name: { 'changes': [ command ], 'failed': [ CmdFailure ],
+                      'rolledBack': bool } } for the nodes that changed.
+       dryRun: only compute the changes"""
+    start = time.time()
+    nodes = [ net[ name ] for name in desired.nodes() ]
+    # capture() skips them, and their state belongs to the machine
+    outside = [ node.name for node in nodes if not node.inNamespace ]
+    if outside:
+        raise ValueError( 'reconcile: %s not in a network namespace of '
+                          'its own' % ', '.join( outside ) )
+    current = capture( nodes, maxWorkers=maxWorkers )[ 'nodes' ]
+    changes = {}
+    for node in nodes:
+        cmds = plan( current[ node.name ], desired, node.name )
+        if cmds:
+            changes[ node.name ] = cmds
+    report = dict( ( name, { 'changes': cmds, 'failed': [],
+                             'rolledBack': False } )
+                   for name, cmds in changes.items() )
+    total = sum( len( cmds ) for cmds in changes.values() )
+    if dryRun or not changes:
+        info( '*** Reconcile: %d changes on %d of %d nodes%s\n' % (
+            total, len( changes ), len( nodes ),
+            ' (dry run)' if dryRun else '' ) )
+        return report
+    failed = []
+    for name, ( _seconds, failures ) in apply(
+            net, changes, maxWorkers ).items():
+        if failures:
+            report[ name ][ 'failed' ] = failures
+            report[ name ][ 'rolledBack' ] = True
+            failed.append( net[ name ] )
+    if failed:
+        # Take the failed nodes from wherever they ended up back to the
+        # state they were read in
+        now = capture( failed, maxWorkers=maxWorkers )[ 'nodes' ]
+        back = {}
+        for node in failed:
+            cmds = plan( now[ node.name ], stateOf(
+                current[ node.name ], desired, node.name ), node.name )
+            if cmds:
+                back[ node.name ] = cmds
+        for name, ( _seconds, failures ) in apply(
+                net, back, maxWorkers ).items():
+            if failures:
+                error( '*** %s: rollback incomplete, %d commands failed\n' %
+                       ( name, len( failures ) ) )
+    info( '*** Reconciled %d changes on %d of %d nodes in %.3fs '
+          '(%d nodes rolled back)\n' % (
+              total, len( changes ), len( nodes ), time.time() - start,
+              len( failed ) ) )
+    return report
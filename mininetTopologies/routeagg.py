@@ -0,0 +1,174 @@
+"""Route aggregation.
+
+Hand-written and compiled route tables carry one /32 per peer loopback
+and one entry per remote subnet, even when they all leave through the
+same next hop. aggregate() computes a minimal equivalent table with the
+ORTC algorithm (Draves et al., "Constructing Optimal IP Routing Tables"):
+routes sharing a next hop collapse into covering prefixes, or into a
+single default route.
+
+Two notions of equivalent are supported:
+
+- exact=True: every destination, including those with no route, gets
+  the same lookup result. Gaps that must stay unrouted inside an
+  aggregate come back as unreachable routes ( prefix, None ).
+- exact=False: only destinations covered by the original table must
+  resolve the same; unrouted space is "don't care". This is what lets a
+  stub host collapse everything into one default route.
+
+The node's connected subnets and own loopback are handled by the kernel,
+so they are passed in as connected prefixes: their space is "don't care"
+and no route, real or unreachable, is ever placed inside it.
+
+equivalent() checks a result: longest-prefix match can only change at
+the first address of a prefix or just past its last one, so comparing
+both tables at those breakpoints covers the whole address space.
+
+Routes are ( prefix, nexthop ) pairs, where nexthop is any hashable,
+sortable value such as ( via, dev ). IPv4 only.
+"""
+
+from ipaddress import ip_network, ip_address
+
+# Trie node fields
+LEFT, RIGHT, NEXTHOP, CANDIDATES = range( 4 )
+
+# No next hop set on a trie node (None means "no route" in exact mode)
+UNSET = object()
+
+# Next hop of a connected prefix: any choice will do, the kernel wins
+DONTCARE = object()
+
+# Candidate set of a region whose next hop does not matter
+ANY = None
+
+
+def parse( prefix ):
+    "Return ( network int, prefix length ) for '10.0.0.0/8' or 'default'."
+    if prefix == 'default':
+        return 0, 0
+    net = ip_network( prefix )
+    return int( net.network_address ), net.prefixlen
+
+
+def unparse( addr, plen ):
+    "Inverse of parse()."
+    if plen == 0:
+        return 'default'
+    return '%s/%d' % ( ip_address( addr ), plen )
+
+
+def order( nexthop ):
+    "Sort key that puts 'no route' first and keeps choices deterministic."
+    return ( nexthop is not None, nexthop )
+
+
+def build( routes, connected=() ):
+    "Build a binary trie from [ ( prefix, nexthop ) ] and connected prefixes."
+    root = [ None, None, UNSET, ANY ]
+    for prefix, nexthop in list( routes ) + [ ( p, DONTCARE )
+                                              for p in connected ]:
+        addr, plen = parse( prefix )
+        node = root
+        for depth in range( plen ):
+            bit = RIGHT if addr >> ( 31 - depth ) & 1 else LEFT
+            if node[ bit ] is None:
+                node[ bit ] = [ None, None, UNSET, ANY ]
+            node = node[ bit ]
+        node[ NEXTHOP ] = nexthop
+    return root
+
+
+def candidates( node, inherited ):
+    """ORTC passes one and two: push next hops down to the leaves, then
+       compute each node's candidate set bottom-up."""
+    if node[ NEXTHOP ] is not UNSET:
+        inherited = node[ NEXTHOP ]
+    if node[ LEFT ] is None and node[ RIGHT ] is None:
+        if inherited is UNSET or inherited is DONTCARE:
+            node[ CANDIDATES ] = ANY
+        else:
+            node[ CANDIDATES ] = frozenset( ( inherited, ) )
+        return node[ CANDIDATES ]
+    for bit in LEFT, RIGHT:
+        if node[ bit ] is None:
+            node[ bit ] = [ None, None, UNSET, ANY ]
+    a = candidates( node[ LEFT ], inherited )
+    b = candidates( node[ RIGHT ], inherited )
+    if a is ANY:
+        node[ CANDIDATES ] = b
+    elif b is ANY:
+        node[ CANDIDATES ] = a
+    else:
+        node[ CANDIDATES ] = ( a & b ) or ( a | b )
+    return node[ CANDIDATES ]
+
+
+def select( node, addr, plen, inherited, out ):
+    "ORTC pass three: choose next hops top-down, skipping inherited ones."
+    cands = node[ CANDIDATES ]
+    if cands is ANY:
+        return
+    if inherited in cands:
+        chosen = inherited
+    else:
+        chosen = min( cands, key=order )
+        out.append( ( unparse( addr, plen ), chosen ) )
+    if node[ LEFT ] is not None:
+        select( node[ LEFT ], addr, plen + 1, chosen, out )
+        select( node[ RIGHT ], addr | 1 << ( 31 - plen ), plen + 1,
+                chosen, out )
+
+
+def aggregate( routes, exact=True, connected=() ):
+    """Return a minimal route list equivalent to routes
+       ( [ ( prefix, nexthop ) ] ); see the module docstring for exact
+       and connected"""
+    routes = list( routes )
+    if not routes:
+        return []
+    root = build( routes, connected )
+    candidates( root, None if exact else UNSET )
+    out = []
+    # The root inherits "no route" in exact mode, so it never needs an
+    # explicit unreachable default
+    select( root, 0, 0, None if exact else UNSET, out )
+    return out
+
+
+def lookup( table, addr ):
+    "Longest-prefix match of addr in { ( network, plen ): nexthop }."
+    for plen in range( 32, -1, -1 ):
+        key = ( addr >> ( 32 - plen ) << ( 32 - plen ) if plen else 0, plen )
+        if key in table:
+            return table[ key ]
+    return None
+
+
+def equivalent( original, aggregated, exact=True, connected=() ):
+    """Prove that aggregated resolves like original; connected prefixes
+       (the node's own subnets) are present in both tables"""
+    tables = []
+    breaks = set( [ 0 ] )
+    for routes in original, aggregated:
+        table = {}
+        for prefix, nexthop in routes:
+            addr, plen = parse( prefix )
+            table[ addr, plen ] = nexthop
+            breaks.add( addr )
+            breaks.add( addr + ( 1 << ( 32 - plen ) ) )
+        for prefix in connected:
+            addr, plen = parse( prefix )
+            table[ addr, plen ] = 'connected'
+            breaks.add( addr )
+            breaks.add( addr + ( 1 << ( 32 - plen ) ) )
+        tables.append( table )
+    for addr in breaks:
+        if addr >= 1 << 32:
+            continue
+        want = lookup( tables[ 0 ], addr )
+        if want is None and not exact:
+            continue
+        if lookup( tables[ 1 ], addr ) != want:
+            return False
+    return True
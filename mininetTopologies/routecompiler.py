@@ -0,0 +1,193 @@
+"""Static route compiler.
+
+Derives every node's static routes from the L3 topology instead of
+hand-writing 'ip route add' lines. Two nodes are adjacent when they have
+interfaces in the same subnet, whether that subnet is a point to point
+link built with net.addLink() or a LAN behind an L2 switch. Each node
+gets a route to every remote subnet and loopback via the first hop of a
+shortest path (fewest L3 hops; ties go to the lowest interface/node name,
+so every run installs the same routes).
+
+    rc = RouteCompiler.fromNet( net, addresses, loopbacks )
+    rc.install( configs )    # queue the routes on NodeConfigs
+
+One breadth-first search per node keeps compilation at O(N * (N + E)),
+which is the same order as the size of the routing tables it produces.
+With install( configs, aggregate=True ) each node's table is first
+reduced to a minimal equivalent one (see routeagg), so with a contiguous
+address plan the per-node FIB stays small as the topology grows.
+"""
+
+from collections import deque
+from ipaddress import ip_interface
+
+from mininet.log import error
+
+import routeagg
+
+
+class RouteCompiler( object ):
+    "Compute shortest-path static routes for every node."
+
+    def __init__( self, hosts=() ):
+        "hosts: names of nodes that never forward traffic for others"
+        self.hosts = set( hosts )
+        self.index = {}        # node name -> node index
+        self.names = []        # node index -> node name
+        self.intfs = []        # node index -> [ ( intf, addr, subnet ) ]
+        self.loopbacks = []    # node index -> [ loopback prefix ]
+        self.subnets = {}      # subnet prefix -> subnet index
+        self.prefixes = []     # subnet index -> subnet prefix
+        self.members = []      # subnet index -> [ ( node, addr ) ]
+        self.frozen = False
+
+    def node( self, name ):
+        "Return the index of node name, adding it if needed."
+        i = self.index.get( name )
+        if i is None:
+            i = self.index[ name ] = len( self.names )
+            self.names.append( name )
+            self.intfs.append( [] )
+            self.loopbacks.append( [] )
+        return i
+
+    def addAddress( self, node, intf, cidr ):
+        "Declare that node's interface intf has address cidr."
+        iface = ip_interface( cidr )
+        if iface.network.prefixlen == iface.max_prefixlen:
+            return self.addLoopback( node, cidr )
+        n = self.node( node )
+        prefix = str( iface.network )
+        s = self.subnets.get( prefix )
+        if s is None:
+            s = self.subnets[ prefix ] = len( self.prefixes )
+            self.prefixes.append( prefix )
+            self.members.append( [] )
+        addr = str( iface.ip )
+        self.intfs[ n ].append( ( intf, addr, s ) )
+        self.members[ s ].append( ( n, addr ) )
+        self.frozen = False
+
+    def addLoopback( self, node, addr ):
+        "Declare node's loopback (/32) address."
+        iface = ip_interface( addr )
+        self.loopbacks[ self.node( node ) ].append(
+            str( iface.ip ) + '/%d' % iface.max_prefixlen )
+
+    @classmethod
+    def fromNet( cls, net, addresses, loopbacks=None, hosts=() ):
+        """Build a compiler for a built Mininet net.
+           addresses: { intf name: cidr }, e.g. { 'r1-eth0': '10.1.1.2/24' }
+           loopbacks: { node name: addr }, e.g. { 'r1': '122.1.1.1' }"""
+        owner = {}
+        for node in net.hosts + net.switches:
+            for intf in node.intfNames():
+                owner[ intf ] = node.name
+        rc = cls( hosts )
+        for intf, cidr in sorted( addresses.items() ):
+            # VLAN subinterfaces (r-eth0.10) belong to their parent's node
+            parent = intf.split( '.' )[ 0 ]
+            name = owner.get( intf, owner.get( parent ) )
+            if name is None:
+                raise ValueError( 'unknown interface %s' % intf )
+            rc.addAddress( name, intf, cidr )
+        for name, addr in sorted( ( loopbacks or {} ).items() ):
+            rc.addLoopback( name, addr )
+        return rc
+
+    def freeze( self ):
+        "Sort adjacency so that searches are deterministic."
+        if self.frozen:
+            return
+        for intfs in self.intfs:
+            intfs.sort()
+        for members in self.members:
+            members.sort( key=lambda m: ( self.names[ m[ 0 ] ], m[ 1 ] ) )
+        self.frozen = True
+
+    def routes( self, name ):
+        "Generate ( prefix, via, dev ) for every route node name needs."
+        self.freeze()
+        src = self.index[ name ]
+        names, intfs, members = self.names, self.intfs, self.members
+        seen = bytearray( len( names ) )
+        reached = bytearray( len( members ) )
+        hop = [ None ] * len( names )
+        seen[ src ] = 1
+        queue = deque()
+        done = set( self.loopbacks[ src ] )
+        for _intf, _addr, s in intfs[ src ]:
+            reached[ s ] = 1
+        for intf, _addr, s in intfs[ src ]:
+            for n, addr in members[ s ]:
+                if not seen[ n ]:
+                    seen[ n ] = 1
+                    hop[ n ] = ( addr, intf )
+                    queue.append( n )
+        while queue:
+            n = queue.popleft()
+            via, dev = hop[ n ]
+            for prefix in self.loopbacks[ n ]:
+                if prefix not in done:
+                    done.add( prefix )
+                    yield prefix, via, dev
+            if names[ n ] in self.hosts:
+                continue
+            for _intf, _addr, s in intfs[ n ]:
+                if reached[ s ]:
+                    continue
+                reached[ s ] = 1
+                yield self.prefixes[ s ], via, dev
+                for m, _maddr in members[ s ]:
+                    if not seen[ m ]:
+                        seen[ m ] = 1
+                        hop[ m ] = hop[ n ]
+                        queue.append( m )
+
+    def connected( self, name ):
+        "Return the prefixes node name reaches without a route."
+        n = self.index[ name ]
+        return ( [ self.prefixes[ s ] for _intf, _addr, s in self.intfs[ n ] ] +
+                 self.loopbacks[ n ] )
+
+    def aggregated( self, name, exact=None ):
+        """Generate node name's routes reduced to a minimal equivalent set;
+           unreachable routes have via and dev None. Hosts only need to
+           match where they have routes (so they end up with a default
+           route); routers match exactly unless exact says otherwise"""
+        if exact is None:
+            exact = name not in self.hosts
+        routes = [ ( prefix, ( via, dev ) )
+                   for prefix, via, dev in self.routes( name ) ]
+        connected = self.connected( name )
+        result = routeagg.aggregate( routes, exact=exact, connected=connected )
+        if not routeagg.equivalent( routes, result, exact=exact, connected=connected ):
+            error( '*** %s: aggregated routes are not equivalent, '
+                   'installing all %d routes\n' % ( name, len( routes ) ) )
+            result = routes
+        for prefix, nexthop in result:
+            via, dev = nexthop or ( None, None )
+            yield prefix, via, dev
+
+    def compile( self ):
+        "Return { node name: [ ( prefix, via, dev ) ] } for all nodes."
+        return dict( ( name, list( self.routes( name ) ) )
+                     for name in self.names )
+
+    def install( self, configs, aggregate=False ):
+        """Queue each node's routes on its NodeConfig, aggregated if asked;
+           return the number of routes queued"""
+        count = 0
+        for config in configs:
+            name = config.node.name
+            if name not in self.index:
+                continue
+            routes = ( self.aggregated( name ) if aggregate
+                       else self.routes( name ) )
+            for prefix, via, dev in routes:
+                if via is None and dev is None:
+                    config.unreachable( prefix )
+                else:
+                    config.routeAdd( prefix, via=via, dev=dev )
+                count += 1
+        return count
@@ -0,0 +1,551 @@
+"""rtnetlink configuration backend.
+
+NodeConfig pushes commands through the node's shell, which still forks
+an ip process per batch and brctl/vconfig/ifconfig per command. This
+module talks rtnetlink directly from Python instead: a worker thread
+briefly enters the node's network namespace (setns() only affects the
+calling thread), opens a NETLINK_ROUTE socket there, and the socket
+stays bound to that namespace after the thread switches back. Link,
+address and route messages are then packed many to a socket write and
+acknowledged in bulk, with no process spawned at all.
+
+NetlinkConfig is a drop-in NodeConfig: it understands the ip commands
+that NodeConfig and topospec generate (and plain 'ip' commands of the
+same forms), and passes anything else through the shell as before:
+
+    config = NetlinkConfig( s5 )
+    config.bridgeAdd( 'vlan10' )
+    config.vlanAdd( 's5-eth4', 10 )
+    config.linkMaster( 's5-eth4.10', 'vlan10' )
+    config.cmd( 'ip link set dev vlan10 up' )
+    failures = config.run()
+
+Failed messages come back as CmdFailures whose status is the errno and
+whose output is the error string. No bridge-utils or vlan packages
+are needed.
+"""
+
+import ctypes
+import errno
+import os
+import socket
+import struct
+from contextlib import contextmanager
+
+from mininet.log import error
+
+from nodeconfig import NodeConfig, CmdFailure
+
+NETLINK_ROUTE = 0
+CLONE_NEWNET = 0x40000000
+
+NLMSG_ERROR, NLMSG_DONE = 2, 3
+NLM_F_REQUEST, NLM_F_MULTI, NLM_F_ACK = 1, 2, 4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE, NLM_F_EXCL, NLM_F_CREATE = 0x100, 0x200, 0x400
+
+RTM_NEWLINK, RTM_DELLINK, RTM_GETLINK = 16, 17, 18
+RTM_NEWADDR, RTM_DELADDR, RTM_GETADDR = 20, 21, 22
+RTM_NEWROUTE, RTM_DELROUTE, RTM_GETROUTE = 24, 25, 26
+
+IFLA_IFNAME, IFLA_LINK, IFLA_MASTER, IFLA_LINKINFO = 3, 5, 10, 18
+IFLA_INFO_KIND, IFLA_INFO_DATA = 1, 2
+IFLA_VLAN_ID = 1
+IFA_ADDRESS, IFA_LOCAL = 1, 2
+RTA_DST, RTA_OIF, RTA_GATEWAY = 1, 4, 5
+
+IFF_UP, IFF_LOWER_UP = 1, 0x10000
+RT_TABLE_MAIN, RTPROT_BOOT, RTPROT_STATIC = 254, 3, 4
+RT_SCOPE_UNIVERSE, RT_SCOPE_LINK, RT_SCOPE_NOWHERE = 0, 253, 255
+RTN_UNICAST, RTN_UNREACHABLE = 1, 7
+
+NLMSGHDR = struct.Struct( '=IHHII' )
+IFINFOMSG = struct.Struct( '=BxHiII' )
+IFADDRMSG = struct.Struct( '=BBBBI' )
+RTMSG = struct.Struct( '=BBBBBBBBI' )
+RTATTR = struct.Struct( '=HH' )
+NLMSGERR = struct.Struct( '=i' )
+
+# Keep each socket write, and the acks it triggers (each ack costs a
+# whole skb in the receive buffer), well inside the socket buffers
+CHUNK = 32768
+CHUNK_MSGS = 256
+RCVBUF = 1 << 22
+SO_RCVBUFFORCE = 33
+
+
+class NetlinkError( Exception ):
+    "An rtnetlink request the kernel rejected."
+
+    def __init__( self, err, request ):
+        Exception.__init__( self, '%s: %s' % ( request, os.strerror( err ) ) )
+        self.errno = err
+        self.request = request
+
+
+def align( n ):
+    return ( n + 3 ) & ~3
+
+
+def attr( kind, data ):
+    "Pack one rtattr; data is bytes, a str, or a list of nested attrs."
+    if isinstance( data, list ):
+        data = b''.join( data )
+    elif not isinstance( data, bytes ):
+        data = data.encode( 'utf-8' ) + b'\0'
+    length = RTATTR.size + len( data )
+    return RTATTR.pack( length, kind ) + data + b'\0' * ( align( length ) -
+                                                         length )
+
+
+def attrs( data ):
+    "Parse packed rtattrs into { type: bytes }."
+    result = {}
+    offset = 0
+    while offset + RTATTR.size <= len( data ):
+        length, kind = RTATTR.unpack_from( data, offset )
+        if length < RTATTR.size:
+            break
+        result[ kind & 0x3fff ] = data[ offset + RTATTR.size:
+                                        offset + length ]
+        offset += align( length )
+    return result
+
+
+def u32( value ):
+    return struct.pack( '=I', value )
+
+
+def cstr( data ):
+    return data.split( b'\0', 1 )[ 0 ].decode( 'utf-8' )
+
+
+def prefix( text ):
+    """Parse '10.0.0.1/24', '10.0.0.1' or 'default' into
+       ( packed address, prefix length ); much cheaper than ipaddress"""
+    if text == 'default':
+        return b'\0\0\0\0', 0
+    addr, _, plen = text.partition( '/' )
+    plen = int( plen ) if plen else 32
+    if not 0 <= plen <= 32:
+        raise ValueError( 'invalid prefix %s' % text )
+    try:
+        return socket.inet_aton( addr ), plen
+    except socket.error:
+        raise ValueError( 'invalid address %s' % text )
+
+
+_libc = None
+
+
+def setns( fd ):
+    "Move the calling thread into the network namespace open on fd."
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL( None, use_errno=True )
+    if _libc.setns( fd, CLONE_NEWNET ) != 0:
+        err = ctypes.get_errno()
+        raise OSError( err, os.strerror( err ) )
+
+
+@contextmanager
+def netns( pid ):
+    "Run the body in pid's network namespace (this thread only)."
+    here = os.open( '/proc/thread-self/ns/net', os.O_RDONLY )
+    try:
+        there = os.open( '/proc/%d/ns/net' % pid, os.O_RDONLY )
+        try:
+            setns( there )
+        finally:
+            os.close( there )
+        try:
+            yield
+        finally:
+            setns( here )
+    finally:
+        os.close( here )
+
+
+class RtnlSocket( object ):
+    "A NETLINK_ROUTE socket that sends requests in batches."
+
+    def __init__( self, pid=None ):
+        "pid: open the socket in that process's network namespace"
+        if pid is None:
+            self.sock = self.open()
+        else:
+            with netns( pid ):
+                self.sock = self.open()
+        self.seq = 0
+        self.pending = []     # [ ( seq, packed message, request ) ]
+
+    @staticmethod
+    def open():
+        sock = socket.socket( socket.AF_NETLINK, socket.SOCK_RAW,
+                              NETLINK_ROUTE )
+        try:
+            sock.setsockopt( socket.SOL_SOCKET, SO_RCVBUFFORCE, RCVBUF )
+        except socket.error:
+            sock.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF )
+        sock.bind( ( 0, 0 ) )
+        return sock
+
+    def close( self ):
+        self.sock.close()
+
+    def message( self, kind, flags, body ):
+        self.seq += 1
+        return self.seq, NLMSGHDR.pack( NLMSGHDR.size + len( body ), kind,
+                                        flags | NLM_F_REQUEST, self.seq,
+                                        0 ) + body
+
+    def queue( self, kind, flags, body, request ):
+        "Queue a request; it is sent, and acked, by flush()."
+        seq, msg = self.message( kind, flags | NLM_F_ACK, body )
+        self.pending.append( ( seq, msg, request ) )
+
+    def messages( self ):
+        "Receive one datagram and generate its ( type, flags, seq, body )."
+        data = self.sock.recv( 1 << 16 )
+        offset = 0
+        while offset + NLMSGHDR.size <= len( data ):
+            length, kind, flags, seq, _pid = NLMSGHDR.unpack_from(
+                data, offset )
+            yield kind, flags, seq, data[ offset + NLMSGHDR.size:
+                                          offset + length ]
+            offset += align( length )
+
+    def flush( self ):
+        "Send all queued requests; return [ ( request, NetlinkError ) ]."
+        errors = []
+        pending, self.pending = self.pending, []
+        start = 0
+        while start < len( pending ):
+            end, size = start + 1, len( pending[ start ][ 1 ] )
+            while end < len( pending ) and end - start < CHUNK_MSGS and \
+                    size + len( pending[ end ][ 1 ] ) <= CHUNK:
+                size += len( pending[ end ][ 1 ] )
+                end += 1
+            chunk, start = pending[ start:end ], end
+            self.sock.send( b''.join( msg for _seq, msg, _req in chunk ) )
+            waiting = dict( ( seq, req ) for seq, _msg, req in chunk )
+            while waiting:
+                for kind, _flags, seq, body in self.messages():
+                    if kind != NLMSG_ERROR or seq not in waiting:
+                        continue
+                    request = waiting.pop( seq )
+                    err = -NLMSGERR.unpack_from( body )[ 0 ]
+                    if err:
+                        errors.append( ( request,
+                                         NetlinkError( err, request ) ) )
+        return errors
+
+    def dump( self, kind, body ):
+        "Generate the bodies of a dump request's replies."
+        seq, msg = self.message( kind, NLM_F_DUMP, body )
+        self.sock.send( msg )
+        while True:
+            for rkind, _flags, rseq, rbody in self.messages():
+                if rseq != seq:
+                    continue
+                if rkind == NLMSG_DONE:
+                    return
+                if rkind == NLMSG_ERROR:
+                    err = -NLMSGERR.unpack_from( rbody )[ 0 ]
+                    if err:
+                        raise NetlinkError( err, 'dump %d' % kind )
+                    return
+                yield rbody
+
+    def links( self ):
+        "Return { name: ifindex }."
+        return dict( ( name, index ) for name, ( index, _flags )
+                     in self.linkStates().items() )
+
+    def linkStates( self ):
+        "Return { name: ( ifindex, flags ) }; flags are IFF_* bits."
+        result = {}
+        for body in self.dump( RTM_GETLINK,
+                               IFINFOMSG.pack( 0, 0, 0, 0, 0 ) ):
+            _family, _type, index, flags, _change = IFINFOMSG.unpack_from(
+                body )
+            name = attrs( body[ IFINFOMSG.size: ] ).get( IFLA_IFNAME )
+            if name is not None:
+                result[ cstr( name ) ] = ( index, flags )
+        return result
+
+    def addrs( self ):
+        "Return [ ( ifindex, IPv4 address, prefixlen ) ]."
+        result = []
+        for body in self.dump( RTM_GETADDR,
+                               IFADDRMSG.pack( socket.AF_INET, 0, 0, 0, 0 ) ):
+            _family, plen, _flags, _scope, index = IFADDRMSG.unpack_from(
+                body )
+            a = attrs( body[ IFADDRMSG.size: ] )
+            local = a.get( IFA_LOCAL, a.get( IFA_ADDRESS ) )
+            if local is not None:
+                result.append( ( index, socket.inet_ntoa( local ), plen ) )
+        return result
+
+    def routes( self ):
+        """Return [ ( 'prefix/len', protocol, oif or None ) ] for the
+           unicast routes of the IPv4 main table"""
+        result = []
+        for body in self.dump( RTM_GETROUTE, RTMSG.pack(
+                socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0 ) ):
+            _family, plen, _src, _tos, table, proto, _scope, kind, \
+                _flags = RTMSG.unpack_from( body )
+            if table != RT_TABLE_MAIN or kind != RTN_UNICAST:
+                continue
+            a = attrs( body[ RTMSG.size: ] )
+            oif = a.get( RTA_OIF )
+            result.append( ( '%s/%d' % (
+                socket.inet_ntoa( a.get( RTA_DST, b'\0\0\0\0' ) ), plen ),
+                proto, struct.unpack( '=I', oif )[ 0 ] if oif else None ) )
+        return result
+
+    # Requests
+
+    def linkCreate( self, name, kind, link=None, data=None, request=None ):
+        "Create link name of kind ('bridge', 'vlan', ...)."
+        info = [ attr( IFLA_INFO_KIND, kind ) ]
+        if data:
+            info.append( attr( IFLA_INFO_DATA, data ) )
+        body = IFINFOMSG.pack( 0, 0, 0, 0, 0 ) + attr( IFLA_IFNAME, name )
+        if link is not None:
+            body += attr( IFLA_LINK, u32( link ) )
+        body += attr( IFLA_LINKINFO, info )
+        self.queue( RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, body, request )
+
+    def linkSet( self, index, up=None, master=None, request=None ):
+        "Change link index's up/down state and/or master."
+        flags = change = 0
+        if up is not None:
+            flags, change = ( IFF_UP if up else 0 ), IFF_UP
+        body = IFINFOMSG.pack( 0, 0, index, flags, change )
+        if master is not None:
+            body += attr( IFLA_MASTER, u32( master ) )
+        self.queue( RTM_NEWLINK, 0, body, request )
+
+    def linkDel( self, index, request=None ):
+        self.queue( RTM_DELLINK, 0, IFINFOMSG.pack( 0, 0, index, 0, 0 ),
+                    request )
+
+    def addr( self, kind, index, cidr, request=None ):
+        "Add ( RTM_NEWADDR ) or delete ( RTM_DELADDR ) an IPv4 address."
+        packed, plen = prefix( cidr )
+        body = ( IFADDRMSG.pack( socket.AF_INET, plen, 0, 0, index ) +
+                 attr( IFA_LOCAL, packed ) + attr( IFA_ADDRESS, packed ) )
+        flags = NLM_F_CREATE | NLM_F_EXCL if kind == RTM_NEWADDR else 0
+        self.queue( kind, flags, body, request )
+
+    def routeAdd( self, dst, via=None, oif=None, unreachable=False,
+                  replace=False, proto=RTPROT_BOOT, request=None ):
+        """Add an IPv4 route to dst ('default' or a prefix).
+           replace: overwrite the route to dst if there is one"""
+        addr, plen = prefix( dst )
+        if unreachable:
+            kind, scope = RTN_UNREACHABLE, RT_SCOPE_UNIVERSE
+        else:
+            kind = RTN_UNICAST
+            scope = RT_SCOPE_UNIVERSE if via else RT_SCOPE_LINK
+        body = RTMSG.pack( socket.AF_INET, plen, 0, 0,
+                           RT_TABLE_MAIN, proto, scope, kind, 0 )
+        if plen:
+            body += attr( RTA_DST, addr )
+        if via:
+            body += attr( RTA_GATEWAY, prefix( via )[ 0 ] )
+        if oif is not None:
+            body += attr( RTA_OIF, u32( oif ) )
+        self.queue( RTM_NEWROUTE, NLM_F_CREATE | (
+            NLM_F_REPLACE if replace else NLM_F_EXCL ), body, request )
+
+    def routeDel( self, dst, proto=0, request=None ):
+        "Delete the IPv4 route to dst, only if proto installed it if given."
+        addr, plen = prefix( dst )
+        body = RTMSG.pack( socket.AF_INET, plen, 0, 0, RT_TABLE_MAIN,
+                           proto, RT_SCOPE_NOWHERE, 0, 0 )
+        if plen:
+            body += attr( RTA_DST, addr )
+        self.queue( RTM_DELROUTE, 0, body, request )
+
+
+def parseIp( command ):
+    """Parse the ip commands NodeConfig and topospec generate into
+       ( op, args ) for NetlinkConfig; return None for anything else"""
+    words = command.split()
+    if len( words ) < 3 or words[ 0 ] != 'ip':
+        return None
+    obj, verb, rest = words[ 1 ], words[ 2 ], words[ 3: ]
+    keys = ( 'dev', 'name', 'link', 'type', 'id', 'via', 'to', 'master' )
+    opts, flags, args = {}, set(), []
+    i = 0
+    while i < len( rest ):
+        word = rest[ i ]
+        if word in keys and i + 1 < len( rest ):
+            opts[ word ] = rest[ i + 1 ]
+            i += 2
+            continue
+        if word in ( 'up', 'down', 'unreachable' ):
+            flags.add( word )
+        else:
+            args.append( word )
+        i += 1
+    try:
+        if obj in ( 'addr', 'address', 'a' ):
+            if verb == 'flush' and 'dev' in opts and not args:
+                return 'addrFlush', ( opts[ 'dev' ], )
+            if verb == 'add' and 'dev' in opts and len( args ) == 1:
+                prefix( args[ 0 ] )
+                return 'addrAdd', ( opts[ 'dev' ], args[ 0 ] )
+        elif obj == 'link':
+            dev = opts.get( 'dev' ) or ( args[ 0 ] if len( args ) == 1
+                                        else None )
+            if verb == 'set' and dev and len( opts ) + len( args ) <= 2:
+                if 'master' in opts and not flags:
+                    return 'linkMaster', ( dev, opts[ 'master' ] )
+                if flags in ( set( [ 'up' ] ), set( [ 'down' ] ) ) and \
+                        'master' not in opts:
+                    return 'linkState', ( dev, 'up' in flags )
+            # Anything left over (vlan_filtering 1, protocol 802.1ad, up)
+            # is something we cannot express: leave it to the shell
+            name = None
+            if verb == 'add' and not flags:
+                name = opts.get( 'name' ) if not args else \
+                    args[ 0 ] if len( args ) == 1 and 'name' not in opts \
+                    else None
+            if name and opts.get( 'type' ) == 'bridge' and \
+                    set( opts ) <= set( [ 'name', 'type' ] ):
+                return 'bridgeAdd', ( name, )
+            if name and opts.get( 'type' ) == 'vlan' and \
+                    set( opts ) == set( [ 'name', 'type', 'link', 'id' ] ):
+                return 'vlanAdd', ( opts[ 'link' ], int( opts[ 'id' ] ),
+                                    name )
+        elif obj in ( 'route', 'r' ) and verb == 'add':
+            dst = opts.get( 'to' ) or ( args[ 0 ] if len( args ) == 1
+                                       else None )
+            if dst and len( args ) <= ( 0 if 'to' in opts else 1 ) and \
+                    set( opts ) <= set( [ 'to', 'via', 'dev' ] ):
+                prefix( dst )
+                if 'via' in opts:
+                    prefix( opts[ 'via' ] )
+                if 'unreachable' in flags:
+                    if flags == set( [ 'unreachable' ] ) and \
+                            set( opts ) <= set( [ 'to' ] ):
+                        return 'unreachable', ( dst, )
+                elif not flags:
+                    return 'routeAdd', ( dst, opts.get( 'via' ),
+                                         opts.get( 'dev' ) )
+    except ValueError:
+        pass
+    return None
+
+
+class NetlinkConfig( NodeConfig ):
+    "A NodeConfig that applies ip commands over rtnetlink, without forks."
+
+    def segments( self ):
+        "Split the queue into runs of netlink ops and runs of shell commands."
+        segments = []
+        for index, command in enumerate( self.cmds ):
+            op = parseIp( command )
+            kind = 'netlink' if op else 'shell'
+            if not segments or segments[ -1 ][ 0 ] != kind:
+                segments.append( ( kind, [] ) )
+            segments[ -1 ][ 1 ].append( ( index, command, op ) )
+        return segments
+
+    def apply( self, rtnl, ops ):
+        "Apply [ ( index, command, op ) ] over rtnl; return CmdFailures."
+        failures = []
+        links = rtnl.links()
+
+        def index( name, i, command ):
+            if name not in links:
+                # Created earlier in this batch: send what we have first
+                for request, err in rtnl.flush():
+                    failures.append( self.failure( request, err ) )
+                links.update( rtnl.links() )
+            if name not in links:
+                failures.append( CmdFailure(
+                    self.node, i, command, errno.ENODEV,
+                    'Cannot find device "%s"' % name ) )
+                return None
+            return links[ name ]
+
+        for i, command, ( op, args ) in ops:
+            request = ( i, command )
+            if op == 'bridgeAdd':
+                rtnl.linkCreate( args[ 0 ], 'bridge', request=request )
+            elif op == 'vlanAdd':
+                parent = index( args[ 0 ], i, command )
+                if parent is not None:
+                    rtnl.linkCreate( args[ 2 ], 'vlan', link=parent,
+                                     data=[ attr( IFLA_VLAN_ID,
+                                                  struct.pack( '=H',
+                                                               args[ 1 ] ) ) ],
+                                     request=request )
+            elif op == 'linkState':
+                dev = index( args[ 0 ], i, command )
+                if dev is not None:
+                    rtnl.linkSet( dev, up=args[ 1 ], request=request )
+            elif op == 'linkMaster':
+                dev = index( args[ 0 ], i, command )
+                master = index( args[ 1 ], i, command )
+                if dev is not None and master is not None:
+                    rtnl.linkSet( dev, master=master, request=request )
+            elif op == 'addrFlush':
+                dev = index( args[ 0 ], i, command )
+                if dev is not None:
+                    for request_, err in rtnl.flush():
+                        failures.append( self.failure( request_, err ) )
+                    for ifindex, addr, plen in rtnl.addrs():
+                        if ifindex == dev:
+                            rtnl.addr( RTM_DELADDR, dev,
+                                       '%s/%d' % ( addr, plen ),
+                                       request=request )
+            elif op == 'addrAdd':
+                dev = index( args[ 0 ], i, command )
+                if dev is not None:
+                    rtnl.addr( RTM_NEWADDR, dev, args[ 1 ], request=request )
+            elif op == 'routeAdd':
+                dst, via, devname = args
+                dev = index( devname, i, command ) if devname else None
+                if dev is not None or not devname:
+                    rtnl.routeAdd( dst, via=via, oif=dev, request=request )
+            elif op == 'unreachable':
+                rtnl.routeAdd( args[ 0 ], unreachable=True, request=request )
+        for request, err in rtnl.flush():
+            failures.append( self.failure( request, err ) )
+        return failures
+
+    def failure( self, request, err ):
+        i, command = request
+        return CmdFailure( self.node, i, command, err.errno,
+                           os.strerror( err.errno ) )
+
+    def run( self ):
+        "Apply the queue; netlink ops never touch the node's shell."
+        failures = []
+        rtnl = None
+        try:
+            for kind, ops in self.segments():
+                if kind == 'shell':
+                    shell = NodeConfig( self.node )
+                    shell.cmds = [ command for _i, command, _op in ops ]
+                    for failure in shell.run():
+                        failure.index = ops[ failure.index ][ 0 ]
+                        failures.append( failure )
+                    continue
+                if rtnl is None:
+                    rtnl = RtnlSocket( self.node.pid )
+                for failure in self.apply( rtnl, ops ):
+                    error( '*** %s: %s failed (%s): %s\n' % (
+                        self.node, failure.command, failure.status,
+                        failure.output ) )
+                    failures.append( failure )
+        finally:
+            if rtnl is not None:
+                rtnl.close()
+        self.cmds = []
+        return sorted( failures, key=lambda f: f.index )
@@ -0,0 +1,150 @@
+"""Starting daemons on many hosts at once.
+
+hi.cmd( '/usr/sbin/sshd' ) in a loop starts one host at a time and never
+checks that the daemon came up, so traffic can start against a server
+that is not listening yet. launch() starts a Service on all hosts
+concurrently, then polls each host until it is ready or the timeout
+expires:
+
+    sshd = Service( 'sshd', '/usr/sbin/sshd', port=22 )
+    report = launch( net.hosts, sshd, timeout=10 )
+    if report[ 'failed' ]:
+        ...
+
+A service is ready when its port has a listening socket in the host's
+namespace (read from /proc/<pid>/net, see procnet) and, if it has one,
+when its pid file names a live process. Commands and pid files may use
+%(node)s for the host's name, so hosts sharing one filesystem do not
+overwrite each other's pid files; no other % is special.
+"""
+
+import time
+
+from mininet.log import info, error, debug
+
+from procnet import listening, alive, readPid
+
+# Printed by the start command with the daemon command's exit status
+STATUS = '@@services'
+
+
+class Service( object ):
+    "A daemon to start on hosts, and how to tell that it is ready."
+
+    def __init__( self, name, cmd, port=None, proto='tcp', pidfile=None ):
+        """name: for reports
+           cmd: start command; it should return once the daemon is
+                running, i.e. daemonize or end in &
+           port: ready when this port is listening (tcp) or bound (udp)
+           pidfile: ready when this file names a live process"""
+        self.name = name
+        self.cmd = cmd
+        self.port = port
+        self.proto = proto
+        self.pidfile = pidfile
+
+    @staticmethod
+    def expand( template, node ):
+        """Substitute node's name for %(node)s; any other % is literal,
+           e.g. date +%s or a printf format"""
+        return template.replace( '%(node)s', node.name )
+
+    def command( self, node ):
+        return self.expand( self.cmd, node )
+
+    def check( self, node ):
+        "Return None if the service is ready on node, else why not."
+        if self.pidfile:
+            path = self.expand( self.pidfile, node )
+            pid = readPid( path )
+            if pid is None:
+                return 'no pid in %s' % path
+            if not alive( pid ):
+                return 'pid %d from %s is not running' % ( pid, path )
+        if self.port is not None and \
+                self.port not in listening( node.pid, self.proto ):
+            return 'nothing listening on %s/%d' % ( self.proto, self.port )
+        return None
+
+
+def interrupt( node, timeoutms=1000 ):
+    "Interrupt node's running command, leaving its shell usable if we can."
+    node.sendInt()
+    end = time.time() + timeoutms / 1000.0
+    while node.waiting and time.time() < end:
+        node.monitor( timeoutms=timeoutms )
+    if node.waiting:
+        error( '*** %s: shell still busy after interrupt\n' % node.name )
+
+
+def launch( hosts, service, timeout=10, interval=.05 ):
+    """Start service on hosts concurrently and wait until each is ready,
+       fails to start, or timeout seconds pass (a start command still
+       running then is interrupted); return
+       { 'ready': { host name: seconds }, 'failed': { host name: reason } }"""
+    hosts = list( hosts )
+    ready, failed = {}, {}
+    start = time.time()
+    # Every shell gets its command before we wait on any of them
+    for node in hosts:
+        node.sendCmd( '( %s ); echo %s $?' % ( service.command( node ),
+                                                STATUS ) )
+    deadline = start + timeout
+    output = dict( ( node.name, '' ) for node in hosts )
+    # starting: start command not done yet; pending: not ready yet
+    starting, pending, stuck = hosts, [], []
+    while starting or pending:
+        expired = time.time() >= deadline
+        waiting = []
+        for node in starting:
+            while node.waiting:
+                data = node.monitor( timeoutms=0 )
+                if not data:
+                    break
+                output[ node.name ] += data
+            if node.waiting:
+                if expired:
+                    failed[ node.name ] = 'start command still running ' \
+                        'after %ss' % timeout
+                    stuck.append( node )
+                else:
+                    waiting.append( node )
+                continue
+            out = output[ node.name ]
+            status = out.rsplit( STATUS, 1 )[ -1 ].strip()
+            if status != '0':
+                failed[ node.name ] = 'exited with status %s: %s' % (
+                    status, out.split( STATUS )[ 0 ].strip() )
+            else:
+                pending.append( node )
+        starting = waiting
+        waiting = []
+        for node in pending:
+            reason = service.check( node )
+            if reason is None:
+                ready[ node.name ] = time.time() - start
+                debug( '*** %s ready on %s in %.3fs\n' % (
+                    service.name, node.name, ready[ node.name ] ) )
+            elif expired:
+                failed[ node.name ] = '%s after %ss' % ( reason, timeout )
+            else:
+                waiting.append( node )
+        pending = waiting
+        if starting:
+            # Wake up early if a start command finishes
+            starting[ 0 ].waitReadable( int( interval * 1000 ) )
+        elif pending:
+            time.sleep( interval )
+    # Only now, so that waiting on them does not delay the others
+    for node in stuck:
+        interrupt( node )
+    for name in sorted( failed ):
+        error( '*** %s failed on %s: %s\n' % (
+            service.name, name, failed[ name ] ) )
+    summary = '*** %s ready on %d/%d hosts in %.3fs' % (
+        service.name, len( ready ), len( hosts ), time.time() - start )
+    if ready:
+        slowest = max( ready, key=ready.get )
+        summary += ' (slowest %s: %.3fs)' % ( slowest, ready[ slowest ] )
+    info( summary + '\n' )
+    return { 'ready': ready, 'failed': failed }
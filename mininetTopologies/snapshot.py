@@ -0,0 +1,245 @@
+"""Network state snapshots.
+
+The example scripts reach their working state through long sequences of
+commands: addresses, routes, bridges, VLAN subinterfaces. capture()
+reads the resulting state of every node at once, save() stores it in a
+compact (gzipped if the name ends in .gz) JSON file, and restore() puts
+it back onto a freshly built copy of the same topology, with one
+NodeConfig batch per node run concurrently (see nodeconfig):
+
+    save( capture( net.hosts ), 'lab.json.gz' )
+    ...
+    restore( net.hosts, load( 'lab.json.gz' ) )
+
+Each node's state is read in one round trip on its shell with the JSON
+output of ip and bridge ( ip -d -j link, ip -j addr, ip -j route,
+bridge -c -j vlan ) and holds:
+- links: bridges and VLAN subinterfaces (recreated unless the node
+  already has them), and the MAC, bridge master and up/down state of
+  every link;
+- addresses of every interface (IPv6 link-local ones are left to the
+  kernel);
+- IPv4 routes of the main table, except the kernel's connected routes;
+- bridge port VLANs of VLAN-filtering bridges;
+- net.ipv4.ip_forward.
+
+Only nodes with their own network namespace are captured; the root
+namespace (and OVS switches in it) belongs to the machine.
+"""
+
+import gzip
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mininet.log import info, error
+
+from nodeconfig import NodeConfig, runConfigs
+
+VERSION = 1
+# Link kinds that restore() creates; the others come with the topology
+CREATED = ( 'bridge', 'vlan' )
+SEP = '@@snapshot'
+CAPTURE = ( '; echo %s; ' % SEP ).join( (
+    'ip -d -j link show', 'ip -j addr show', 'ip -j route show',
+    'bridge -c -j vlan show', 'sysctl -n net.ipv4.ip_forward' ) )
+
+
+def parseJSON( text ):
+    text = text.strip()
+    return json.loads( text ) if text else []
+
+
+def linkState( link ):
+    "The part of an 'ip -d -j link' entry that restore() needs."
+    state = { 'name': link[ 'ifname' ] }
+    kind = link.get( 'linkinfo', {} ).get( 'info_kind' )
+    data = link.get( 'linkinfo', {} ).get( 'info_data', {} )
+    if kind in CREATED:
+        state[ 'kind' ] = kind
+    if kind == 'vlan':
+        state[ 'link' ] = link[ 'link' ]
+        state[ 'id' ] = data[ 'id' ]
+    elif kind == 'bridge' and data.get( 'vlan_filtering' ):
+        state[ 'vlan_filtering' ] = 1
+        state[ 'vlan_default_pvid' ] = data.get( 'vlan_default_pvid', 1 )
+    if link.get( 'master' ):
+        state[ 'master' ] = link[ 'master' ]
+    if 'UP' in link.get( 'flags', [] ):
+        state[ 'up' ] = 1
+    if link.get( 'link_type' ) == 'ether':
+        state[ 'mac' ] = link[ 'address' ]
+    return state
+
+
+def routeArgs( route ):
+    "Return the 'ip route' arguments recreating route, None to skip it."
+    if route.get( 'protocol' ) == 'kernel':
+        return None
+    args = []
+    if route.get( 'type', 'unicast' ) != 'unicast':
+        args.append( route[ 'type' ] )
+    args.append( route[ 'dst' ] )
+    for key, word in ( ( 'gateway', 'via' ), ( 'dev', 'dev' ),
+                       ( 'prefsrc', 'src' ), ( 'metric', 'metric' ) ):
+        if key in route:
+            args += [ word, str( route[ key ] ) ]
+    for hop in route.get( 'nexthops', [] ):
+        args.append( 'nexthop' )
+        for key, word in ( ( 'gateway', 'via' ), ( 'dev', 'dev' ),
+                           ( 'weight', 'weight' ) ):
+            if key in hop:
+                args += [ word, str( hop[ key ] ) ]
+    return ' '.join( args )
+
+
+def vlanEntries( data ):
+    "Return { port: [ [ vid, last vid, pvid, untagged ] ] }."
+    if isinstance( data, dict ):
+        # Older iproute2: { port: [ vlans ] }
+        data = [ { 'ifname': port, 'vlans': vlans }
+                 for port, vlans in data.items() ]
+    ports = {}
+    for entry in data:
+        for vlan in entry.get( 'vlans', [] ):
+            flags = vlan.get( 'flags', [] )
+            ports.setdefault( entry[ 'ifname' ], [] ).append( [
+                vlan[ 'vlan' ], vlan.get( 'vlanEnd', vlan[ 'vlan' ] ),
+                int( 'PVID' in flags ), int( 'Egress Untagged' in flags ) ] )
+    return ports
+
+
+def nodeState( output ):
+    "Parse the output of CAPTURE into a node's state."
+    links, addrs, routes, vlans, forward = [
+        part.strip() for part in output.split( SEP ) ]
+    state = { 'links': [ linkState( link )
+                         for link in parseJSON( links ) ],
+              'addrs': {}, 'routes': [], 'forward': int( forward or 0 ) }
+    for link in parseJSON( addrs ):
+        state[ 'addrs' ][ link[ 'ifname' ] ] = [
+            [ '%s/%d' % ( a[ 'local' ], a[ 'prefixlen' ] ),
+              a.get( 'broadcast' ) ]
+            for a in link.get( 'addr_info', [] )
+            if not ( a[ 'family' ] == 'inet6' and a[ 'scope' ] == 'link' ) ]
+    for route in parseJSON( routes ):
+        args = routeArgs( route )
+        if args:
+            state[ 'routes' ].append( args )
+    filtering = set( link[ 'name' ] for link in state[ 'links' ]
+                     if link.get( 'vlan_filtering' ) )
+    masters = dict( ( link[ 'name' ], link.get( 'master' ) )
+                    for link in state[ 'links' ] )
+    # Only VLAN-filtering bridges use their VLANs
+    state[ 'vlans' ] = dict(
+        ( port, entries )
+        for port, entries in vlanEntries( parseJSON( vlans ) ).items()
+        if port in filtering or masters.get( port ) in filtering )
+    return state
+
+
+def capture( nodes, maxWorkers=32 ):
+    """Read the network state of nodes concurrently; return the
+       snapshot { 'version': 1, 'nodes': { name: state } }"""
+    nodes = [ n for n in nodes if n.inNamespace ]
+    start = time.time()
+
+    def read( node ):
+        return node.name, nodeState( node.cmd( CAPTURE ) )
+
+    snapshot = { 'version': VERSION, 'nodes': {} }
+    if nodes:
+        with ThreadPoolExecutor(
+                max_workers=min( maxWorkers, len( nodes ) ) ) as pool:
+            for name, state in pool.map( read, nodes ):
+                snapshot[ 'nodes' ][ name ] = state
+    info( '*** Captured %d nodes in %.3fs\n' % (
+        len( snapshot[ 'nodes' ] ), time.time() - start ) )
+    return snapshot
+
+
+def save( snapshot, path ):
+    opener = gzip.open if path.endswith( '.gz' ) else open
+    with opener( path, 'wt' ) as f:
+        json.dump( snapshot, f, separators=( ',', ':' ), sort_keys=True )
+
+
+def load( path ):
+    opener = gzip.open if path.endswith( '.gz' ) else open
+    with opener( path, 'rt' ) as f:
+        snapshot = json.load( f )
+    if snapshot.get( 'version' ) != VERSION:
+        raise ValueError( '%s: unsupported snapshot version %s' % (
+            path, snapshot.get( 'version' ) ) )
+    return snapshot
+
+
+def restoreConfig( node, state ):
+    "Queue the commands that bring node to state on a NodeConfig."
+    config = NodeConfig( node )
+    links = state[ 'links' ]
+    # Links are in ifindex order, so a VLAN's parent comes first. Node
+    # classes such as VlanSwitch and VlanRouter create theirs at build
+    # time, so only links that are missing are added
+    for link in links:
+        if link.get( 'kind' ) == 'bridge':
+            args = 'link add name %s type bridge' % link[ 'name' ]
+            if link.get( 'vlan_filtering' ):
+                args += ' vlan_filtering 1 vlan_default_pvid %d' % \
+                    link[ 'vlan_default_pvid' ]
+        elif link.get( 'kind' ) == 'vlan':
+            args = 'link add link %s name %s type vlan id %d' % (
+                link[ 'link' ], link[ 'name' ], link[ 'id' ] )
+        else:
+            continue
+        config.cmd( 'ip link show dev %s >/dev/null 2>&1 || ip %s' % (
+            link[ 'name' ], args ) )
+    for link in links:
+        if 'mac' in link:
+            config.ip( 'link set dev %s address %s' % (
+                link[ 'name' ], link[ 'mac' ] ) )
+    for link in links:
+        if link.get( 'master' ):
+            config.linkMaster( link[ 'name' ], link[ 'master' ] )
+    defaults = dict( ( link[ 'name' ], link[ 'vlan_default_pvid' ] )
+                     for link in links if link.get( 'vlan_filtering' ) )
+    masters = dict( ( link[ 'name' ], link.get( 'master' ) )
+                    for link in links )
+    for port, entries in sorted( state[ 'vlans' ].items() ):
+        onBridge = port in defaults
+        # Ports (and the bridge) get the default VLAN when enslaved
+        default = defaults.get( port, defaults.get( masters.get( port ) ) )
+        if default and not any( first <= default <= last
+                                for first, last, _p, _u in entries ):
+            config.cmd( 'bridge vlan del vid %d dev %s%s' % (
+                default, port, ' self' if onBridge else '' ) )
+        for first, last, pvid, untagged in entries:
+            config.bridgeVlan( port, first if first == last else
+                               '%d-%d' % ( first, last ), pvid=pvid,
+                               untagged=untagged, master=onBridge )
+    for link in links:
+        if link.get( 'up' ):
+            config.linkUp( link[ 'name' ] )
+    # After the links are up: bringing lo up re-adds 127.0.0.1
+    for intf, addrs in sorted( state[ 'addrs' ].items() ):
+        config.addrFlush( intf )
+        for cidr, broadcast in addrs:
+            config.ip( 'addr add %s %sdev %s' % (
+                cidr, 'broadcast %s ' % broadcast if broadcast else '',
+                intf ) )
+    for args in state[ 'routes' ]:
+        config.ip( 'route replace %s' % args )
+    config.ipForward( state[ 'forward' ] )
+    return config
+
+
+def restore( nodes, snapshot, maxWorkers=32 ):
+    """Apply snapshot to the nodes of a freshly built topology, one batch
+       per node; return runConfigs()' report"""
+    states = snapshot[ 'nodes' ]
+    byName = dict( ( node.name, node ) for node in nodes )
+    for name in sorted( set( states ) - set( byName ) ):
+        error( '*** snapshot: no node %s to restore\n' % name )
+    return runConfigs( [ restoreConfig( byName[ name ], state )
+                         for name, state in sorted( states.items() )
+                         if name in byName ], maxWorkers=maxWorkers )
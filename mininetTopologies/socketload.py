@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+"""Socket load generator and echo server.
+
+An asyncio server and client that run on any Mininet host. The client
+holds many concurrent connections, each sending requests of a given
+size and waiting for responses of a given size. It reports requests per
+second and a latency histogram. TCP and UDP are both supported.
+
+    h2 python socketload.py server --port 9000 &
+    h1 python socketload.py client 13.1.1.2 --connections 2000 \\
+        --request 64 --response 1024 --rate 20000 --duration 10
+
+Each request is a header ( request size, response size ) followed by
+the request payload, and the server answers with response-size bytes.
+UDP requests also carry a sequence number after the header, which the
+answer starts with, so an answer that comes in after its request timed
+out is not taken for the next one's.
+--rate paces the requests of all connections together (requests/s).
+Without it, every connection sends its next request as soon as the
+previous answer arrives. Latency is measured from sending a request to
+its full answer; UDP requests without an answer within --timeout count
+as errors.
+
+From a Mininet script, serve() starts servers on hosts and waits until
+they listen (see services), and load() runs a client on a host and
+returns its report:
+
+    serve( [ h2 ], port=9000 )
+    report = load( h1, '13.1.1.2', port=9000, connections=500 )
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import struct
+import sys
+import time
+
+HEADER = struct.Struct( '!II' )
+SEQ = struct.Struct( '!I' )
+UDP_MAX = 65507
+SUBBUCKETS = 8
+
+
+class Histogram( object ):
+    """Log-linear latency histogram in microseconds: eight buckets per
+       power of two, so values are kept to within 12.5%"""
+
+    def __init__( self ):
+        self.counts = [ 0 ] * ( 64 * SUBBUCKETS )
+        self.n = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    @staticmethod
+    def index( us ):
+        v = int( us )
+        if v < SUBBUCKETS:
+            return v
+        e = v.bit_length() - 1
+        return ( e - 2 ) * SUBBUCKETS + ( ( v >> ( e - 3 ) ) & 7 )
+
+    @staticmethod
+    def lower( i ):
+        "Smallest value in bucket i."
+        if i < SUBBUCKETS:
+            return i
+        e = i // SUBBUCKETS + 2
+        return ( SUBBUCKETS + i % SUBBUCKETS ) << ( e - 3 )
+
+    def record( self, seconds ):
+        us = seconds * 1e6
+        self.counts[ self.index( us ) ] += 1
+        self.n += 1
+        self.total += us
+        self.max = max( self.max, us )
+        self.min = us if self.min is None else min( self.min, us )
+
+    def percentile( self, p ):
+        "Upper bound of the bucket holding the p-th percentile, in us."
+        rank = p / 100.0 * self.n
+        seen = 0
+        for i, count in enumerate( self.counts ):
+            seen += count
+            if count and seen >= rank:
+                return min( self.lower( i + 1 ), self.max )
+        return self.max
+
+    def rows( self ):
+        "Return [ ( from us, to us, count ) ] per power of two."
+        rows = []
+        for start in range( 0, len( self.counts ), SUBBUCKETS ):
+            count = sum( self.counts[ start:start + SUBBUCKETS ] )
+            if count:
+                rows.append( ( self.lower( start ),
+                               self.lower( start + SUBBUCKETS ), count ) )
+        return rows
+
+
+class Pacer( object ):
+    "Hands out send slots at rate per second, shared by all connections."
+
+    def __init__( self, rate ):
+        self.interval = 1.0 / rate
+        self.next = time.perf_counter()
+
+    async def wait( self ):
+        now = time.perf_counter()
+        slot = max( self.next, now )
+        self.next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep( slot - now )
+
+
+# Server
+
+async def tcpHandler( reader, writer ):
+    zeros = {}
+    try:
+        while True:
+            reqSize, respSize = HEADER.unpack(
+                await reader.readexactly( HEADER.size ) )
+            await reader.readexactly( reqSize )
+            if respSize not in zeros:
+                zeros[ respSize ] = bytes( respSize )
+            writer.write( zeros[ respSize ] )
+            await writer.drain()
+    except ( asyncio.IncompleteReadError, ConnectionError ):
+        pass
+    finally:
+        writer.close()
+
+
+class UdpServer( asyncio.DatagramProtocol ):
+
+    def connection_made( self, transport ):
+        self.transport = transport
+
+    def datagram_received( self, data, addr ):
+        if len( data ) >= HEADER.size + SEQ.size:
+            _reqSize, respSize = HEADER.unpack_from( data )
+            seq = data[ HEADER.size:HEADER.size + SEQ.size ]
+            self.transport.sendto( seq + bytes(
+                max( 0, min( respSize, UDP_MAX ) - SEQ.size ) ), addr )
+
+
+async def server( args ):
+    loop = asyncio.get_running_loop()
+    if args.proto == 'udp':
+        await loop.create_datagram_endpoint(
+            UdpServer, local_addr=( '0.0.0.0', args.port ) )
+    else:
+        await asyncio.start_server( tcpHandler, port=args.port,
+                                    backlog=4096, reuse_address=True )
+    await asyncio.Event().wait()
+
+
+# Client
+
+async def tcpConnection( args, deadline, pacer, hist, stats ):
+    try:
+        reader, writer = await asyncio.open_connection( args.host, args.port )
+    except OSError:
+        stats[ 'connectFailed' ] += 1
+        return
+    request = HEADER.pack( args.request, args.response ) + \
+        bytes( args.request )
+    try:
+        while time.perf_counter() < deadline:
+            if pacer:
+                await pacer.wait()
+            start = time.perf_counter()
+            writer.write( request )
+            await reader.readexactly( args.response )
+            hist.record( time.perf_counter() - start )
+    except ( asyncio.IncompleteReadError, ConnectionError ):
+        stats[ 'errors' ] += 1
+    finally:
+        writer.close()
+
+
+class UdpClient( asyncio.DatagramProtocol ):
+
+    def __init__( self ):
+        self.waiter = None
+        self.seq = None
+
+    def datagram_received( self, data, addr ):
+        # Answers to requests that already timed out are dropped
+        if len( data ) >= SEQ.size and \
+                SEQ.unpack_from( data )[ 0 ] == self.seq and \
+                self.waiter and not self.waiter.done():
+            self.waiter.set_result( None )
+
+
+async def udpConnection( args, deadline, pacer, hist, stats ):
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        UdpClient, remote_addr=( args.host, args.port ) )
+    header = HEADER.pack( args.request, args.response )
+    payload = bytes( args.request )
+    seq = 0
+    try:
+        while time.perf_counter() < deadline:
+            if pacer:
+                await pacer.wait()
+            seq = ( seq + 1 ) & 0xffffffff
+            protocol.seq = seq
+            protocol.waiter = loop.create_future()
+            start = time.perf_counter()
+            transport.sendto( header + SEQ.pack( seq ) + payload )
+            try:
+                await asyncio.wait_for( protocol.waiter, args.timeout )
+            except asyncio.TimeoutError:
+                stats[ 'errors' ] += 1
+                continue
+            hist.record( time.perf_counter() - start )
+    finally:
+        transport.close()
+
+
+async def client( args ):
+    "Run the load; return the report."
+    hist = Histogram()
+    stats = { 'errors': 0, 'connectFailed': 0 }
+    pacer = Pacer( args.rate ) if args.rate else None
+    connection = udpConnection if args.proto == 'udp' else tcpConnection
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather( *[ connection( args, deadline, pacer, hist, stats )
+                             for _ in range( args.connections ) ] )
+    seconds = time.perf_counter() - start
+
+    def ms( us ):
+        return round( us / 1e3, 3 )
+
+    return {
+        'proto': args.proto, 'connections': args.connections,
+        'request': args.request, 'response': args.response,
+        'seconds': seconds, 'requests': hist.n,
+        'rps': hist.n / seconds, 'errors': stats[ 'errors' ],
+        'connectFailed': stats[ 'connectFailed' ],
+        'latencyMs': {
+            'min': ms( hist.min or 0 ), 'avg': ms( hist.total / hist.n )
+            if hist.n else 0, 'p50': ms( hist.percentile( 50 ) ),
+            'p90': ms( hist.percentile( 90 ) ),
+            'p99': ms( hist.percentile( 99 ) ), 'max': ms( hist.max ) },
+        'histogramUs': hist.rows() }
+
+
+def show( report ):
+    "Print a report like the client does."
+    lat = report[ 'latencyMs' ]
+    print( '%d %s connections: %d requests in %.1fs, %.0f requests/s, '
+           '%d errors, %d failed connects' % (
+               report[ 'connections' ], report[ 'proto' ],
+               report[ 'requests' ], report[ 'seconds' ], report[ 'rps' ],
+               report[ 'errors' ], report[ 'connectFailed' ] ) )
+    print( 'latency ms: min %(min)s avg %(avg)s p50 %(p50)s p90 %(p90)s '
+           'p99 %(p99)s max %(max)s' % lat )
+    top = max( [ count for _lo, _hi, count in report[ 'histogramUs' ] ] +
+               [ 1 ] )
+    for lo, hi, count in report[ 'histogramUs' ]:
+        print( '%9dus - %9dus %9d %s' % (
+            lo, hi, count, '#' * int( 40.0 * count / top ) ) )
+
+
+def raiseFileLimit():
+    "Allow as many sockets as the hard limit does."
+    soft, hard = resource.getrlimit( resource.RLIMIT_NOFILE )
+    if soft < hard:
+        resource.setrlimit( resource.RLIMIT_NOFILE, ( hard, hard ) )
+
+
+def main( argv=None ):
+    parser = argparse.ArgumentParser( description=__doc__.split( '\n' )[ 0 ] )
+    sub = parser.add_subparsers( dest='mode' )
+    sub.required = True
+    for mode in 'server', 'client':
+        p = sub.add_parser( mode )
+        p.add_argument( '--port', type=int, default=9000 )
+        p.add_argument( '--proto', choices=( 'tcp', 'udp' ), default='tcp' )
+        if mode == 'client':
+            p.add_argument( 'host' )
+            p.add_argument( '--connections', type=int, default=100 )
+            p.add_argument( '--request', type=int, default=64,
+                            help='request payload bytes' )
+            p.add_argument( '--response', type=int, default=64,
+                            help='response bytes (at least 1; UDP '
+                            'answers carry a 4-byte sequence number)' )
+            p.add_argument( '--rate', type=float, default=0,
+                            help='total requests/s (default: closed loop)' )
+            p.add_argument( '--duration', type=float, default=10 )
+            p.add_argument( '--timeout', type=float, default=1,
+                            help='UDP response timeout, seconds' )
+            p.add_argument( '--json', action='store_true',
+                            help='print the report as JSON' )
+    args = parser.parse_args( argv )
+    raiseFileLimit()
+    if args.mode == 'server':
+        asyncio.run( server( args ) )
+        return
+    args.response = max( 1, args.response )
+    report = asyncio.run( client( args ) )
+    if args.json:
+        json.dump( report, sys.stdout )
+    else:
+        show( report )
+
+
+# Mininet helpers
+
+def serve( hosts, port=9000, proto='tcp', timeout=10 ):
+    "Start servers on hosts and wait until they listen; see launch()."
+    from services import Service, launch
+    return launch( hosts, Service(
+        'socketload', '%s %s server --port %d --proto %s '
+        '> /tmp/socketload-%%(node)s.log 2>&1 &' % (
+            sys.executable, os.path.abspath( __file__ ), port, proto ),
+        port=port, proto=proto ), timeout=timeout )
+
+
+def load( node, host, **opts ):
+    """Run a client on node against host; return its report.
+       opts: client options, e.g. connections=500, rate=1e4"""
+    argv = [ sys.executable, os.path.abspath( __file__ ), 'client', host,
+             '--json' ]
+    for name, value in sorted( opts.items() ):
+        argv += [ '--%s' % name, str( value ) ]
+    out, err, _code = node.pexec( argv )
+    try:
+        return json.loads( out )
+    except ValueError:
+        raise RuntimeError( 'socketload client on %s failed: %s' % (
+            node, err.strip() ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,11 @@
    s1----s2----s3--...---sN
 
 N can be set with the -N command-line option; the default value is 4.
+main() creates the line hop by hop with addLine(), without a Topo graph
+in between; LineTopo builds the same line for Mininet( topo=... ).
+--mem reports how much memory each hop costs, for sizing long lines.
+sshd is started on every host concurrently; hosts where it is not
+listening within --timeout seconds are reported.
 
 """
 
@@ -12,61 +17,85 @@ from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.node import Node, Host, OVSSwitch, OVSKernelSwitch, Controller, RemoteController, DefaultController
 from mininet.cli import CLI
-from mininet.log import setLogLevel
+from mininet.log import setLogLevel, info
+from services import Service, launch
 import argparse
+import resource
+import tracemalloc
 
 class LineTopo( Topo ):
     "Linear topology example."
 
-    def __init__( self , **kwargs):
+    def build( self, N=4 ):
         "Create linear topology"
-        super(LineTopo, self).__init__(**kwargs)
-        for key in kwargs:
-           if key == 'N': N=kwargs[key]
-
-        h = []		# list of hosts; h[0] will be h1, etc
-        s = []		# list of switches
-
-        # add N hosts  h1..hN
-        for i in range(1,N+1):
-           h.append(self.addHost('h' + str(i)))
-
-        # add N switches s1..sN
-        for i in range(1,N+1):
-           s.append(self.addSwitch('s' + str(i)))
-
-        # Add links from hi to si
-        for i in range(N):
-           self.addLink(h[i], s[i])
-
-
-        # link switches
-        for i in range(N-1):
-           self.addLink(s[i],s[i+1])
-
-def main(**kwargs):
+        # One pass over the hops: add hi and si, link them, and link si
+        # to s(i-1). Only the previous switch's name is kept around, so
+        # building a long line needs no per-hop lists of our own.
+        prev = None
+        for i in range(1, N+1):
+           h = self.addHost('h%d' % i)
+           s = self.addSwitch('s%d' % i)
+           self.addLink(h, s)
+           if prev is not None:
+              self.addLink(prev, s)
+           prev = s
+
+def addLine( net, N=4 ):
+    """Create the line directly in net, one hop at a time: each hop's
+       host, switch and links exist (processes and veth pairs included)
+       before the next hop is looked at, and only the previous switch is
+       kept around"""
+    prev = None
+    for i in range(1, N+1):
+       h = net.addHost('h%d' % i)
+       s = net.addSwitch('s%d' % i)
+       net.addLink(h, s)
+       if prev is not None:
+          net.addLink(prev, s)
+       prev = s
+
+def maxRSS():
+    "Peak resident set size of this process, in bytes"
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('-N', '--N', type=int)
+    parser.add_argument('-N', '--N', type=int, default=4)
+    parser.add_argument('--mem', action='store_true',
+                        help='report memory used per hop')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='seconds to wait for sshd on each host')
     args = parser.parse_args()
-    if args.N is None:
-        N = 4
-    else:
-        N = args.N
+    N = args.N
+    if N < 1:
+        parser.error('-N must be at least 1')
 
-    ltopo = LineTopo(N=N)
     setLogLevel('info')
-    net = Mininet(topo = ltopo, switch = OVSKernelSwitch, 
+    net = Mininet(switch = OVSKernelSwitch, 
                 controller = DefaultController,
 		autoSetMacs = True
                 )
+    net.addController('c0')
+    rss = maxRSS()
+    if args.mem:
+        tracemalloc.start()
+    info('*** Creating %d hops\n' % N)
+    addLine(net, N)
+    if args.mem:
+        netBytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
     net.start()
-    
-    for i in range(1, N+1):
-       hi = net['h' + str(i)]
-       hi.cmd('/usr/sbin/sshd')
+    if args.mem:
+        info('*** Memory per hop: %d bytes of Python objects, %d bytes of '
+             'Mininet process RSS\n' % (netBytes // N,
+                                        (maxRSS() - rss) // N))
+
+    # Start sshd on all hosts at once and wait until each one listens
+    launch(net.hosts, Service('sshd', '/usr/sbin/sshd', port=22),
+           timeout=args.timeout)
 
     CLI( net)
     net.stop()
 
-main()
-
+if __name__ == '__main__':
+    main()
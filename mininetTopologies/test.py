@@ -8,11 +8,15 @@ from mininet.log import setLogLevel
 
 from mininet.link import Link, TCLink
 
+from flowcompiler import FlowCompiler
+
+from controller import ProactiveController
+
 
 
 def topology():
 
-    net = Mininet( controller=RemoteController, link=TCLink, switch=OVSKernelSwitch )
+    net = Mininet( controller=ProactiveController, link=TCLink, switch=OVSKernelSwitch )
 
 
 
@@ -28,7 +32,7 @@ def topology():
 
     s1 = net.addSwitch( 's1')
 
-    c0 = net.addController( 'c0', controller=RemoteController, ip='127.0.0.1', port=6633 )
+    c0 = net.addController( 'c0', controller=ProactiveController, ip='127.0.0.1', port=6633 )
 
 
 
@@ -44,6 +48,12 @@ def topology():
 
     c0.start()
 
+    # c0 pushes s1's table when s1 connects: ARP flooding, r1's MAC to
+    # r1's port and each host subnet to its host's port, derived from
+    # the links
+
+    c0.program( s1, FlowCompiler.fromSwitch( s1, gateways=[ r1 ] ) )
+
     s1.start( [c0] )
 
     r1.cmd("ifconfig r1-eth0 0")
@@ -62,21 +72,11 @@ def topology():
 
     h3.cmd("ip route add default via 10.0.3.1") 
 
-    s1.cmd("ovs-ofctl add-flow s1 priority=1,arp,actions=flood")
-
-    s1.cmd("ovs-ofctl add-flow s1 priority=65535,ip,dl_dst=00:00:00:00:01:00,actions=output:1")
-
-    s1.cmd("ovs-ofctl add-flow s1 priority=10,ip,nw_dst=10.0.1.0/24,actions=output:2")
-
-    s1.cmd("ovs-ofctl add-flow s1 priority=10,ip,nw_dst=10.0.2.0/24,actions=output:3")
-
-    s1.cmd("ovs-ofctl add-flow s1 priority=10,ip,nw_dst=10.0.3.0/24,actions=output:4")
-
-    print "*** Running CLI"
+    print( "*** Running CLI" )
 
     CLI( net )
 
-    print "*** Stopping network"
+    print( "*** Stopping network" )
 
     net.stop()
 
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+"""Traffic-matrix throughput benchmark.
+
+runFlows() runs a set of flows between hosts at the same time and
+measures what they deliver:
+
+    report = runFlows( net, 'all', proto='tcp', duration=5,
+                       hosts=[ h1, h2, h3, h4 ] )
+    report = runFlows( net, [ ( 'h1', 'h3' ), ( 'h2', 'h4' ) ],
+                       proto='udp', rate=50e6 )
+
+The senders and receivers are this file run as a script inside the
+hosts, one sender and one receiver process per host whatever its number
+of flows, so no iperf is needed:
+
+    throughput.py recv PROTO PORT FLOWS DEADLINE
+    throughput.py send PROTO START DURATION RATE ID:ADDR:PORT ...
+
+All senders wait for the same start time. Receivers time each flow from
+its first byte to its last. The report holds:
+- per-flow goodput, plus loss for UDP;
+- aggregate goodput;
+- per-link utilization from the /proc/net/dev counters of both ends of
+  every link, as a share of the link's bw where TCLink sets one.
+"""
+
+import json
+import os
+import selectors
+import socket
+import struct
+import sys
+import threading
+import time
+
+from mininet.log import info, error
+
+from procnet import netDev, listening
+
+WORKER = os.path.abspath( __file__ )
+
+# Flow id sent first on TCP connections; ( flow id, sequence ) on UDP
+TCP_HEADER = struct.Struct( '!Q' )
+UDP_HEADER = struct.Struct( '!QQ' )
+# Sequence number of the packets that end a UDP flow
+UDP_FIN = ( 1 << 64 ) - 1
+UDP_SIZE = 1470
+CHUNK = 1 << 17
+
+
+def tcpSend( fid, addr, port, start, end, result ):
+    sock = socket.create_connection( ( addr, port ) )
+    sock.sendall( TCP_HEADER.pack( fid ) )
+    buf = memoryview( bytearray( CHUNK ) )
+    sent = 0
+    time.sleep( max( 0, start - time.time() ) )
+    while time.time() < end:
+        sent += sock.send( buf )
+    sock.shutdown( socket.SHUT_WR )
+    # Wait for the receiver to drain and close
+    sock.recv( 1 )
+    sock.close()
+    result[ fid ] = { 'bytes': sent }
+
+
+def udpSend( fid, addr, port, start, end, rate, result ):
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    buf = bytearray( UDP_SIZE )
+    interval = UDP_SIZE * 8.0 / rate
+    seq = 0
+    due = start
+    time.sleep( max( 0, start - time.time() ) )
+    while True:
+        now = time.time()
+        if now >= end:
+            break
+        # Catch up in a burst when sleep() overshot
+        while due <= now:
+            UDP_HEADER.pack_into( buf, 0, fid, seq )
+            sock.sendto( buf, ( addr, port ) )
+            seq += 1
+            due += interval
+        time.sleep( max( 0, due - time.time() ) )
+    fin = UDP_HEADER.pack( fid, UDP_FIN ) + TCP_HEADER.pack( seq )
+    for _ in range( 3 ):
+        sock.sendto( fin, ( addr, port ) )
+    sock.close()
+    result[ fid ] = { 'bytes': seq * UDP_SIZE, 'packets': seq }
+
+
+def send( proto, start, duration, rate, targets ):
+    "Run one thread per flow; return { flow id: sender stats }."
+    result = {}
+    threads = []
+    end = start + duration
+    for target in targets:
+        fid, addr, port = target.split( ':' )
+        args = ( int( fid ), addr, int( port ), start, end )
+        if proto == 'udp':
+            args += ( rate, )
+        threads.append( threading.Thread(
+            target=udpSend if proto == 'udp' else tcpSend,
+            args=args + ( result, ) ) )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result
+
+
+def tcpRecv( port, flows, deadline ):
+    "Receive flows TCP flows; return { flow id: stats }."
+    server = socket.socket()
+    server.setsockopt( socket.SOL_SOCKET, socket.SO_REUSEADDR, 1 )
+    server.bind( ( '', port ) )
+    server.listen( max( flows, 16 ) )
+    server.setblocking( False )
+    sel = selectors.DefaultSelector()
+    sel.register( server, selectors.EVENT_READ )
+    buf = memoryview( bytearray( CHUNK ) )
+    result, open_ = {}, {}
+    while len( result ) < flows and time.time() < deadline:
+        for key, _ in sel.select( timeout=.5 ):
+            sock = key.fileobj
+            if sock is server:
+                conn, _peer = server.accept()
+                fid = TCP_HEADER.unpack(
+                    conn.recv( TCP_HEADER.size, socket.MSG_WAITALL ) )[ 0 ]
+                conn.setblocking( False )
+                open_[ conn ] = [ fid, 0, None, None ]
+                sel.register( conn, selectors.EVENT_READ )
+                continue
+            state = open_[ sock ]
+            try:
+                n = sock.recv_into( buf )
+            except BlockingIOError:
+                continue
+            if n:
+                state[ 1 ] += n
+                state[ 3 ] = time.time()
+                if state[ 2 ] is None:
+                    state[ 2 ] = state[ 3 ]
+                continue
+            sel.unregister( sock )
+            sock.close()
+            del open_[ sock ]
+            fid, nbytes, first, last = state
+            result[ fid ] = { 'bytes': nbytes,
+                              'seconds': last - first if first else 0 }
+    return result
+
+
+def udpRecv( port, flows, deadline ):
+    "Receive flows UDP flows; return { flow id: stats }."
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    sock.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22 )
+    sock.bind( ( '', port ) )
+    sock.settimeout( .5 )
+    buf = memoryview( bytearray( UDP_SIZE ) )
+    state = {}      # flow id -> [ bytes, packets, first, last, sent ]
+    done = 0
+    while done < flows and time.time() < deadline:
+        try:
+            n = sock.recv_into( buf )
+        except socket.timeout:
+            continue
+        fid, seq = UDP_HEADER.unpack_from( buf )
+        now = time.time()
+        s = state.setdefault( fid, [ 0, 0, now, now, None ] )
+        if seq == UDP_FIN:
+            if s[ 4 ] is None:
+                s[ 4 ] = TCP_HEADER.unpack_from( buf, UDP_HEADER.size )[ 0 ]
+                done += 1
+            continue
+        s[ 0 ] += n
+        s[ 1 ] += 1
+        s[ 3 ] = now
+    return dict( ( fid, { 'bytes': b, 'packets': p, 'seconds': last - first,
+                          'sent': sent } )
+                 for fid, ( b, p, first, last, sent ) in state.items() )
+
+
+def worker( args ):
+    "Entry point inside a host; prints the result as JSON."
+    if args[ 0 ] == 'recv':
+        proto, port, flows, deadline = args[ 1: ]
+        fn = udpRecv if proto == 'udp' else tcpRecv
+        result = fn( int( port ), int( flows ), float( deadline ) )
+    else:
+        proto, start, duration, rate = args[ 1:5 ]
+        result = send( proto, float( start ), float( duration ),
+                       float( rate ), args[ 5: ] )
+    json.dump( result, sys.stdout )
+
+
+# Harness, run from the Mininet script
+
+def address( node ):
+    "The node's current default address (scripts often change it)."
+    intf = node.defaultIntf()
+    return ( intf.updateIP() if intf else None ) or node.IP()
+
+
+def counters( nodes ):
+    "Return ( time, { pid: netDev } ) for the namespaces of nodes."
+    stats = {}
+    for node in nodes:
+        if node.pid not in stats:
+            stats[ node.pid ] = netDev( node.pid )
+    return time.time(), stats
+
+
+def netLinks( net ):
+    """Every link between net's nodes, including those made with a bare
+       Link( node1, node2 ), which net.links does not list"""
+    seen, links = set(), []
+    for node in net.hosts + net.switches:
+        for intf in node.intfList():
+            link = getattr( intf, 'link', None )
+            if link and id( link ) not in seen:
+                seen.add( id( link ) )
+                links.append( link )
+    return links
+
+
+def linkStats( net, before, after, start ):
+    """Per-link bits/s in each direction, and utilization of the links
+       with a bandwidth limit (TCLink bw)"""
+    seconds = after[ 0 ] - max( before[ 0 ], start )
+    links = {}
+    for link in netLinks( net ):
+        intf1, intf2 = link.intf1, link.intf2
+        try:
+            b = before[ 1 ][ intf1.node.pid ][ intf1.name ]
+            a = after[ 1 ][ intf1.node.pid ][ intf1.name ]
+        except KeyError:
+            continue
+        fwd = ( a[ 'tx_bytes' ] - b[ 'tx_bytes' ] ) * 8.0 / seconds
+        rev = ( a[ 'rx_bytes' ] - b[ 'rx_bytes' ] ) * 8.0 / seconds
+        bw = intf1.params.get( 'bw' ) or intf2.params.get( 'bw' )
+        links[ '%s<->%s' % ( intf1, intf2 ) ] = {
+            'fwd': fwd, 'rev': rev, 'bw': bw,
+            'utilization': max( fwd, rev ) / ( bw * 1e6 ) if bw else None }
+    return links
+
+
+def runFlows( net, flows='all', proto='tcp', duration=5, rate=10e6,
+              hosts=None, port=5001, grace=5 ):
+    """Run flows concurrently and return
+       { 'flows': [ flow stats ], 'aggregate': bits/s, 'links': ... }
+       flows: [ ( src, dst ) ] hosts or names, or 'all' for every ordered
+              pair of hosts (net.hosts unless hosts is given)
+       proto: 'tcp' or 'udp'; rate: UDP send rate per flow, bits/s"""
+    hosts = [ net[ h ] if isinstance( h, str ) else h
+              for h in ( hosts or net.hosts ) ]
+    if flows == 'all':
+        flows = [ ( s, d ) for s in hosts for d in hosts if s is not d ]
+    flows = [ tuple( net[ n ] if isinstance( n, str ) else n for n in flow )
+              for flow in flows ]
+    addrs = dict( ( dst, address( dst ) ) for _src, dst in flows )
+    bySrc, byDst = {}, {}
+    for fid, ( src, dst ) in enumerate( flows ):
+        bySrc.setdefault( src, [] ).append(
+            '%d:%s:%d' % ( fid, addrs[ dst ], port ) )
+        byDst.setdefault( dst, [] ).append( fid )
+    deadline = time.time() + duration + grace + .01 * len( flows ) + 2
+    py = sys.executable
+    receivers = dict( ( dst, dst.popen(
+        [ py, WORKER, 'recv', proto, str( port ), str( len( fids ) ),
+          repr( deadline ) ] ) ) for dst, fids in byDst.items() )
+    # Receivers must be listening before the senders connect
+    limit = time.time() + grace
+    waiting = list( byDst )
+    while waiting and time.time() < limit:
+        waiting = [ dst for dst in waiting
+                    if port not in listening( dst.pid, proto ) ]
+        if waiting:
+            time.sleep( .02 )
+    for dst in waiting:
+        error( '*** throughput: receiver on %s not ready\n' % dst )
+    before = counters( net.hosts + net.switches )
+    start = time.time() + .2 + .005 * len( bySrc )
+    senders = dict( ( src, src.popen(
+        [ py, WORKER, 'send', proto, repr( start ), str( duration ),
+          str( rate ) ] + targets ) ) for src, targets in bySrc.items() )
+    sent = {}
+    for src, popen in senders.items():
+        out, err = popen.communicate()
+        try:
+            sent.update( ( int( k ), v )
+                         for k, v in json.loads( out ).items() )
+        except ValueError:
+            error( '*** throughput: sender on %s failed: %s\n' % ( src, err ) )
+    received = {}
+    for dst, popen in receivers.items():
+        out, err = popen.communicate()
+        try:
+            received.update( ( int( k ), v )
+                             for k, v in json.loads( out ).items() )
+        except ValueError:
+            error( '*** throughput: receiver on %s failed: %s\n' % (
+                dst, err ) )
+    after = counters( net.hosts + net.switches )
+    report = { 'proto': proto, 'duration': duration, 'flows': [] }
+    info( '*** %d %s flows for %ss\n' % ( len( flows ), proto, duration ) )
+    for fid, ( src, dst ) in enumerate( flows ):
+        got = received.get( fid, {} )
+        flow = { 'src': src.name, 'dst': dst.name,
+                 'bytes': got.get( 'bytes', 0 ),
+                 'sent': sent.get( fid, {} ).get( 'bytes' ) }
+        flow[ 'goodput' ] = ( flow[ 'bytes' ] * 8.0 / got[ 'seconds' ]
+                              if got.get( 'seconds' ) else 0.0 )
+        if proto == 'udp':
+            packets = got.get( 'sent' ) or sent.get( fid, {} ).get( 'packets' )
+            flow[ 'loss' ] = ( 1 - float( got.get( 'packets', 0 ) ) / packets
+                               if packets else None )
+        report[ 'flows' ].append( flow )
+        info( '%s -> %s %10.2f Mbit/s%s\n' % (
+            src, dst, flow[ 'goodput' ] / 1e6,
+            '' if flow.get( 'loss' ) is None else
+            '  %.2f%% lost' % ( 100 * flow[ 'loss' ] ) ) )
+    report[ 'aggregate' ] = sum( f[ 'goodput' ] for f in report[ 'flows' ] )
+    report[ 'links' ] = linkStats( net, before, after, start )
+    info( '*** Aggregate goodput %.2f Mbit/s\n' % (
+        report[ 'aggregate' ] / 1e6 ) )
+    for name, link in sorted( report[ 'links' ].items() ):
+        if link[ 'fwd' ] + link[ 'rev' ] < 1e5:
+            continue
+        info( '%s %10.2f / %.2f Mbit/s%s\n' % (
+            name, link[ 'fwd' ] / 1e6, link[ 'rev' ] / 1e6,
+            '' if link[ 'bw' ] is None else '  %.0f%% of %s Mbit/s' % (
+                100 * link[ 'utilization' ], link[ 'bw' ] ) ) )
+    return report
+
+
+if __name__ == '__main__':
+    worker( sys.argv[ 1: ] )
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+
+"""Parameterized topology generators.
+
+Topo classes for the shapes used to measure how things scale, each
+with its complete address plan:
+
+    RingTopo( N=16 )           N routers in a ring
+    GridTopo( rows=8, cols=8 ) routers in a 2-D grid
+    FatTreeTopo( k=4 )         k-ary fat-tree: k pods of k/2 edge and k/2
+                               aggregation routers, (k/2)^2 core routers
+    ChainTopo( N=3 )           h1 - r1 - ... - rN - h2, as in
+                               pure_l3_routing.py
+    VlanFabricTopo( vlans=2 )  a switch s1 with one bridge per VLAN, as
+                               in 4h_1sw.py, and a router on a stick r
+
+Ring, grid and chain routers get hosts= hosts each (fat-tree edge
+routers k/2). Every node is a Mininet host: routers forward in their
+own namespace as in pure_l3_routing.py, and s1 bridges like the s5 of
+the inter-VLAN example, so no OVS or controller is needed:
+
+    topo = RingTopo( N=100 )
+    net = Mininet( topo=topo, controller=None )
+    net.start()
+    rc = topo.configure( net )      # addresses, VLANs, routes
+
+Addresses come from an IPAM (see ipam): router to router links get a
+/30 from its transit pool, host links a /30 from the stub pool, VLANs a
+/24 from the lan pool and routers a /32 loopback, and every interface
+a MAC, the same on every run. Building the topology and its plan takes
+time and memory linear in the number of nodes: each link and node is
+visited once and each allocation is O(1). configure() pushes
+the plan with one NodeConfig batch per node; routes=True adds static
+routes from RouteCompiler (O(N * (N + E))), routes='hosts' only the
+hosts' default routes, e.g. to let dvrouted find the rest.
+
+    sudo python topogen.py ring -N 16 [--hosts 1] [--dv]
+"""
+
+import argparse
+
+from mininet.topo import Topo
+from mininet.net import Mininet
+from mininet.cli import CLI
+from mininet.log import setLogLevel, info
+
+from ipam import IPAM, ntoa, cidr
+from nodeconfig import NodeConfig, runConfigs
+from routecompiler import RouteCompiler
+
+
+class PlannedTopo( Topo ):
+    "A Topo of routers and hosts that also plans their addresses."
+
+    def __init__( self, *args, **params ):
+        "ipam: the IPAM to allocate from (default: IPAM())"
+        self.ipam = params.pop( 'ipam', None ) or IPAM()
+        self.addresses = {}     # intf -> cidr
+        self.loopbacks = {}     # router -> addr
+        self.gateways = {}      # host -> ( gateway addr, intf )
+        self.routers = []
+        self.vlans = {}         # switch -> { vid: [ access port ] }
+        self.trunks = {}        # node -> { parent intf: [ vid ] }
+        Topo.__init__( self, *args, **params )
+
+    def link( self, node1, node2 ):
+        "Link node1 and node2, with MACs from the IPAM."
+        return self.addLink( node1, node2, addr1=self.ipam.mac(),
+                             addr2=self.ipam.mac() )
+
+    def intf( self, node ):
+        "Name of node's next interface (Mininet numbers them from 0)."
+        return '%s-eth%d' % ( node, len( self.ports.get( node, {} ) ) )
+
+    def router( self, name ):
+        self.addHost( name )
+        self.routers.append( name )
+        self.loopbacks[ name ] = self.ipam.loopback()
+        return name
+
+    def connect( self, node1, node2, pool ):
+        """Link node1 and node2 over a subnet of pool; node1 gets its
+           first address; return their addresses"""
+        intf1, intf2 = self.intf( node1 ), self.intf( node2 )
+        self.link( node1, node2 )
+        base, plen = self.ipam.subnet( pool )
+        self.addresses[ intf1 ] = cidr( base + 1, plen )
+        self.addresses[ intf2 ] = cidr( base + 2, plen )
+        return ntoa( base + 1 ), ntoa( base + 2 )
+
+    def host( self, name, router ):
+        "Add host name on its own link to router."
+        self.addHost( name )
+        intf = self.intf( name )
+        gateway, _addr = self.connect( router, name, 'stub' )
+        self.gateways[ name ] = ( gateway, intf )
+        return name
+
+    def hostsOn( self, router, count, first ):
+        "Add count hosts h<first>... on router; return the next number."
+        for i in range( first, first + count ):
+            self.host( 'h%d' % i, router )
+        return first + count
+
+    # Configuration
+
+    def owner( self, intf ):
+        return intf.split( '-eth' )[ 0 ]
+
+    def routeCompiler( self ):
+        "A RouteCompiler holding the address plan."
+        rc = RouteCompiler( hosts=[ name for name in self.nodes( sort=False )
+                                    if name not in self.loopbacks ] )
+        for intf, cidr in sorted( self.addresses.items() ):
+            rc.addAddress( self.owner( intf ), intf, cidr )
+        for name, addr in sorted( self.loopbacks.items() ):
+            rc.addLoopback( name, addr )
+        return rc
+
+    def configure( self, net, routes=True, configClass=NodeConfig,
+                   maxWorkers=32 ):
+        """Apply the plan to a started net; return the RouteCompiler.
+           routes: True for static routes everywhere, 'hosts' for the
+           hosts' default routes only, False for none"""
+        configs = dict( ( name, configClass( net[ name ] ) )
+                        for name in self.nodes( sort=False ) )
+        # Mininet gives every host's first interface an address
+        for name, config in configs.items():
+            if self.ports.get( name ):
+                config.addrFlush( '%s-eth0' % name )
+        for name, trunks in sorted( self.trunks.items() ):
+            for parent, vids in sorted( trunks.items() ):
+                for vid in vids:
+                    configs[ name ].vlanAdd( parent, vid )
+                    configs[ name ].linkUp( '%s.%d' % ( parent, vid ) )
+        for name, vlans in sorted( self.vlans.items() ):
+            config = configs[ name ]
+            # Each VLAN's bridge also holds the trunks' subinterfaces
+            trunked = {}
+            for parent, vids in sorted( self.trunks.get( name, {} ).items() ):
+                for vid in vids:
+                    trunked.setdefault( vid, [] ).append(
+                        '%s.%d' % ( parent, vid ) )
+            for vid, ports in sorted( vlans.items() ):
+                bridge = 'vlan%d' % vid
+                config.bridgeAdd( bridge )
+                for port in ports + trunked.get( vid, [] ):
+                    config.linkMaster( port, bridge )
+                config.linkUp( bridge )
+        for intf, cidr in sorted( self.addresses.items() ):
+            configs[ self.owner( intf ) ].addrAdd( intf, cidr )
+        for name, addr in sorted( self.loopbacks.items() ):
+            configs[ name ].loopback( addr )
+        for name in self.routers:
+            configs[ name ].ipForward()
+        rc = None
+        if routes is True:
+            rc = self.routeCompiler()
+            rc.install( configs.values(), aggregate=True )
+        elif routes == 'hosts':
+            for name, ( gateway, intf ) in sorted( self.gateways.items() ):
+                configs[ name ].routeAdd( 'default', via=gateway, dev=intf )
+        runConfigs( configs.values(), maxWorkers=maxWorkers )
+        return rc
+
+
+class RingTopo( PlannedTopo ):
+    "N routers in a ring, hosts hosts on each."
+
+    def build( self, N=4, hosts=1 ):
+        if N < 3:
+            raise ValueError( 'a ring needs at least 3 routers' )
+        first = 1
+        for i in range( 1, N + 1 ):
+            self.router( 'r%d' % i )
+            first = self.hostsOn( 'r%d' % i, hosts, first )
+            if i > 1:
+                self.connect( 'r%d' % ( i - 1 ), 'r%d' % i, 'transit' )
+        self.connect( 'r%d' % N, 'r1', 'transit' )
+
+
+class GridTopo( PlannedTopo ):
+    "rows x cols routers, each linked to its right and lower neighbours."
+
+    def build( self, rows=3, cols=3, hosts=1 ):
+        first = 1
+        for row in range( rows ):
+            for col in range( cols ):
+                i = row * cols + col + 1
+                self.router( 'r%d' % i )
+                first = self.hostsOn( 'r%d' % i, hosts, first )
+                if col:
+                    self.connect( 'r%d' % ( i - 1 ), 'r%d' % i, 'transit' )
+                if row:
+                    self.connect( 'r%d' % ( i - cols ), 'r%d' % i,
+                                  'transit' )
+
+
+class FatTreeTopo( PlannedTopo ):
+    """k-ary fat-tree: core routers c1.., aggregation routers a1..,
+       edge routers e1.. and k/2 hosts per edge router"""
+
+    def build( self, k=4 ):
+        if k < 2 or k % 2:
+            raise ValueError( 'k must be even' )
+        half = k // 2
+        for c in range( 1, half * half + 1 ):
+            self.router( 'c%d' % c )
+        first = 1
+        for pod in range( k ):
+            aggs = [ self.router( 'a%d' % ( pod * half + i + 1 ) )
+                     for i in range( half ) ]
+            for i, agg in enumerate( aggs ):
+                for j in range( half ):
+                    self.connect( 'c%d' % ( i * half + j + 1 ), agg,
+                                  'transit' )
+            for i in range( half ):
+                edge = self.router( 'e%d' % ( pod * half + i + 1 ) )
+                for agg in aggs:
+                    self.connect( agg, edge, 'transit' )
+                first = self.hostsOn( edge, half, first )
+
+
+class ChainTopo( PlannedTopo ):
+    "h1 - r1 - r2 - ... - rN - h2, like pure_l3_routing.py."
+
+    def build( self, N=3, hosts=1 ):
+        first = self.hostsOn( self.router( 'r1' ), hosts, 1 )
+        for i in range( 2, N + 1 ):
+            self.router( 'r%d' % i )
+            self.connect( 'r%d' % ( i - 1 ), 'r%d' % i, 'transit' )
+        self.hostsOn( 'r%d' % N, hosts, first )
+
+
+class VlanFabricTopo( PlannedTopo ):
+    """Switch s1 with hosts hosts in each of vlans VLANs (ids from
+       first), like 4h_1sw.py; with router, r routes between the VLANs
+       over a trunk, like the inter-VLAN routing example"""
+
+    def build( self, vlans=2, hosts=2, first=10, router=True ):
+        if first + vlans - 1 > 4094:
+            raise ValueError( 'VLAN ids go up to 4094' )
+        if hosts > 253:
+            raise ValueError( 'at most 253 hosts per VLAN' )
+        self.addHost( 's1' )
+        vids = list( range( first, first + vlans ) )
+        if router:
+            self.router( 'r' )
+            self.trunks[ 's1' ] = { self.intf( 's1' ): vids }
+            self.trunks[ 'r' ] = { self.intf( 'r' ): vids }
+            self.link( 's1', 'r' )
+        self.vlans[ 's1' ] = {}
+        n = 1
+        for vid in vids:
+            base, plen = self.ipam.subnet( 'lan' )
+            gateway = ntoa( base + 254 )
+            if router:
+                self.addresses[ 'r-eth0.%d' % vid ] = cidr( base + 254,
+                                                            plen )
+            ports = self.vlans[ 's1' ][ vid ] = []
+            for i in range( 1, hosts + 1 ):
+                name = 'h%d' % n
+                n += 1
+                self.addHost( name )
+                ports.append( self.intf( 's1' ) )
+                self.addresses[ self.intf( name ) ] = cidr( base + i, plen )
+                if router:
+                    self.gateways[ name ] = ( gateway, self.intf( name ) )
+                self.link( name, 's1' )
+
+
+TOPOS = { 'ring': RingTopo, 'grid': GridTopo, 'fattree': FatTreeTopo,
+          'chain': ChainTopo, 'vlans': VlanFabricTopo }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( 'shape', choices=sorted( TOPOS ) )
+    parser.add_argument( '-N', '--N', type=int, default=4,
+                         help='routers (ring, chain), fat-tree k, VLANs' )
+    parser.add_argument( '--cols', type=int,
+                         help='grid columns (default: N)' )
+    parser.add_argument( '--hosts', type=int, default=1,
+                         help='hosts per router (per VLAN for vlans)' )
+    parser.add_argument( '--dv', action='store_true',
+                         help='route with dvrouted instead of static routes' )
+    args = parser.parse_args()
+    setLogLevel( 'info' )
+    if args.shape == 'grid':
+        topo = GridTopo( rows=args.N, cols=args.cols or args.N,
+                         hosts=args.hosts )
+    elif args.shape == 'fattree':
+        topo = FatTreeTopo( k=args.N )
+    elif args.shape == 'vlans':
+        topo = VlanFabricTopo( vlans=args.N, hosts=args.hosts )
+    else:
+        topo = TOPOS[ args.shape ]( N=args.N, hosts=args.hosts )
+    info( '*** %s: %d nodes, %d links, %d addresses\n' % (
+        args.shape, len( topo.g ), len( topo.links() ),
+        len( topo.addresses ) ) )
+    net = Mininet( topo=topo, controller=None )
+    net.start()
+    rc = topo.configure( net, routes='hosts' if args.dv else True )
+    routers = [ net[ name ] for name in topo.routers ]
+    if args.dv:
+        import dvrouted
+        dvrouted.start( routers )
+        # Converged once every router reaches every subnet and router
+        # loopback, not merely when the FIBs stop changing for a while
+        dvrouted.show( dvrouted.converge(
+            routers, reachable=len( set( rc.prefixes ) ) +
+            len( topo.loopbacks ) ) )
+    CLI( net )
+    if args.dv:
+        dvrouted.stop( routers )
+    net.stop()
+
+
+if __name__ == '__main__':
+    main()
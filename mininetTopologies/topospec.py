@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+
+"""Declarative topology specs.
+
+Instead of an imperative script, a topology is described in a JSON (or,
+if PyYAML is installed, YAML) spec listing its nodes, links, VLANs,
+addresses and loopbacks; see specs/intervlan.json for the inter-VLAN
+routing example. The spec is compiled into a build plan: the links to
+create plus each node's configuration commands, with static routes
+computed and aggregated by RouteCompiler.
+
+Compiled plans are cached on disk, keyed by a hash of the spec, so
+running the same large topology again skips planning altogether. When
+the spec changes, only the fragments whose inputs changed are compiled
+again: each node's local configuration is keyed by that node's part of
+the spec, and the routes by the L3 part (addresses, loopbacks, routers).
+
+Spec format:
+
+    { "link": "tc",                      # optional, use TCLink
+      "nodes": {
+        "h1": { "loopback": "122.1.1.1" },
+        "s5": { "vlans": { "10": [ "s5-eth0", "s5-eth1" ] },
+                "trunks": { "s5-eth4": [ 10, 20 ] } },
+        "r":  { "router": true, "loopback": "122.1.1.122",
+                "trunks": { "r-eth0": [ 10, 20 ] } } },
+      "links": [ [ "h1", "s5" ], [ "s5", "r" ] ],
+      "addresses": { "h1-eth0": "10.0.10.1/24",
+                     "r-eth0.10": "10.0.10.254/24" },
+      "routes": "auto" }                 # or { node: [ [ dst, via, dev ] ] }
+
+Each VLAN on a switch becomes a bridge 'vlan<id>' holding its access
+ports and the switch's trunk subinterfaces for that VLAN. Interfaces are
+named <node>-eth<n> in link order, like Link() does.
+
+    sudo python topospec.py [--netlink] specs/intervlan.json
+
+--netlink applies the plan over rtnetlink (see rtnl) instead of ip -batch.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+from mininet.net import Mininet
+from mininet.link import Link, TCLink
+from mininet.cli import CLI
+from mininet.log import setLogLevel, info
+
+from nodeconfig import NodeConfig, runConfigs
+from routecompiler import RouteCompiler
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+CACHE_DIR = os.path.expanduser( '~/.cache/topospec' )
+
+# Bump when the plan format or the compilers change
+PLAN_VERSION = 1
+
+
+def digest( obj ):
+    "Stable hash of a JSON-serializable object."
+    data = json.dumps( obj, sort_keys=True, separators=( ',', ':' ) )
+    return hashlib.sha256( data.encode( 'utf-8' ) ).hexdigest()
+
+
+class PlanCache( object ):
+    "Directory of compiled plans and plan fragments, keyed by hash."
+
+    def __init__( self, path=CACHE_DIR ):
+        self.path = path
+
+    def filename( self, kind, key ):
+        return os.path.join( self.path, '%s-%s.json' % ( kind, key ) )
+
+    def get( self, kind, key ):
+        "Return the cached object or None."
+        if not self.path:
+            return None
+        try:
+            with open( self.filename( kind, key ) ) as f:
+                return json.load( f )
+        except ( IOError, OSError, ValueError ):
+            return None
+
+    def put( self, kind, key, obj ):
+        "Store obj; the rename keeps concurrent runs from seeing partial files."
+        if not self.path:
+            return
+        if not os.path.isdir( self.path ):
+            os.makedirs( self.path )
+        path = self.filename( kind, key )
+        tmp = '%s.%d' % ( path, os.getpid() )
+        with open( tmp, 'w' ) as f:
+            json.dump( obj, f )
+        os.rename( tmp, path )
+
+
+class TopoSpec( object ):
+    "A declarative topology spec and its compiler."
+
+    def __init__( self, spec, cache=None ):
+        self.spec = spec
+        self.cache = cache if cache is not None else PlanCache()
+        self.nodes = spec.get( 'nodes', {} )
+        for link in spec.get( 'links', [] ):
+            for name in link:
+                if name not in self.nodes:
+                    raise ValueError( 'link to unknown node %s' % name )
+
+    @classmethod
+    def load( cls, path, cache=None ):
+        "Read a spec from a .json or .yaml/.yml file."
+        with open( path ) as f:
+            if path.endswith( ( '.yaml', '.yml' ) ):
+                if yaml is None:
+                    raise ImportError( 'PyYAML is needed to read %s' % path )
+                spec = yaml.safe_load( f )
+            else:
+                spec = json.load( f )
+        return cls( spec, cache )
+
+    def links( self ):
+        "Return [ ( node1, intf1, node2, intf2 ) ], naming ports in order."
+        ports = dict( ( name, 0 ) for name in self.nodes )
+        links = []
+        for node1, node2 in self.spec.get( 'links', [] ):
+            intf1 = '%s-eth%d' % ( node1, ports[ node1 ] )
+            ports[ node1 ] += 1
+            intf2 = '%s-eth%d' % ( node2, ports[ node2 ] )
+            ports[ node2 ] += 1
+            links.append( ( node1, intf1, node2, intf2 ) )
+        return links
+
+    def l3( self ):
+        "The part of the spec that routing depends on."
+        return {
+            'addresses': self.spec.get( 'addresses', {} ),
+            'loopbacks': dict( ( name, node[ 'loopback' ] )
+                               for name, node in self.nodes.items()
+                               if node.get( 'loopback' ) ),
+            'routers': sorted( name for name, node in self.nodes.items()
+                               if node.get( 'router' ) ),
+            'routes': self.spec.get( 'routes', 'auto' ) }
+
+    def compileNode( self, name, intfs ):
+        "Return the commands configuring node name, routes excepted."
+        node = self.nodes[ name ]
+        cmds = []
+        for intf in intfs:
+            cmds.append( 'ip addr flush dev %s' % intf )
+        for parent, vids in sorted( node.get( 'trunks', {} ).items() ):
+            for vid in vids:
+                sub = '%s.%d' % ( parent, int( vid ) )
+                cmds.append( 'ip link add link %s name %s type vlan id %d' %
+                             ( parent, sub, int( vid ) ) )
+                cmds.append( 'ip link set dev %s up' % sub )
+        for vid, ports in sorted( node.get( 'vlans', {} ).items(),
+                                  key=lambda item: int( item[ 0 ] ) ):
+            vid = int( vid )
+            bridge = 'vlan%d' % vid
+            cmds.append( 'ip link add name %s type bridge' % bridge )
+            trunks = [ '%s.%d' % ( parent, vid ) for parent, vids in
+                       sorted( node.get( 'trunks', {} ).items() )
+                       if vid in [ int( v ) for v in vids ] ]
+            for port in list( ports ) + trunks:
+                cmds.append( 'ip link set dev %s master %s' % ( port, bridge ) )
+            cmds.append( 'ip link set dev %s up' % bridge )
+        addresses = self.spec.get( 'addresses', {} )
+        for intf in sorted( addresses ):
+            if intf.split( '.' )[ 0 ] in intfs:
+                cmds.append( 'ip addr add %s dev %s' %
+                             ( addresses[ intf ], intf ) )
+        if node.get( 'loopback' ):
+            addr = node[ 'loopback' ]
+            cmds.append( 'ip addr add %s dev lo' %
+                         ( addr if '/' in addr else addr + '/32' ) )
+        if node.get( 'router' ):
+            cmds.append( 'sysctl -q -w net.ipv4.ip_forward=1' )
+        return cmds
+
+    def compileRoutes( self, links ):
+        "Return { node: [ route commands ] } for the whole topology."
+        l3 = self.l3()
+        if l3[ 'routes' ] != 'auto':
+            return dict( ( name, [ 'ip route add to %s via %s dev %s' %
+                                   tuple( route ) for route in routes ] )
+                         for name, routes in l3[ 'routes' ].items() )
+        owner = {}
+        for node1, intf1, node2, intf2 in links:
+            owner[ intf1 ], owner[ intf2 ] = node1, node2
+        rc = RouteCompiler( hosts=[ name for name in self.nodes
+                                    if name not in l3[ 'routers' ] ] )
+        for intf, cidr in sorted( l3[ 'addresses' ].items() ):
+            name = owner.get( intf.split( '.' )[ 0 ] )
+            if name is None:
+                raise ValueError( 'address on unknown interface %s' % intf )
+            rc.addAddress( name, intf, cidr )
+        for name, addr in sorted( l3[ 'loopbacks' ].items() ):
+            rc.addLoopback( name, addr )
+        routes = {}
+        for name in rc.names:
+            cmds = routes[ name ] = []
+            for prefix, via, dev in rc.aggregated( name ):
+                if via is None and dev is None:
+                    cmds.append( 'ip route add unreachable %s' % prefix )
+                else:
+                    cmds.append( 'ip route add to %s via %s dev %s' %
+                                 ( prefix, via, dev ) )
+        return routes
+
+    def compile( self ):
+        "Return the build plan, from the cache when possible."
+        key = digest( [ PLAN_VERSION, self.spec ] )
+        plan = self.cache.get( 'plan', key )
+        if plan is not None:
+            info( '*** Using cached build plan %s\n' % key[ :12 ] )
+            return plan
+        links = self.links()
+        intfs = dict( ( name, [] ) for name in self.nodes )
+        for node1, intf1, node2, intf2 in links:
+            intfs[ node1 ].append( intf1 )
+            intfs[ node2 ].append( intf2 )
+        compiled = []
+        config = {}
+        addresses = self.spec.get( 'addresses', {} )
+        for name in sorted( self.nodes ):
+            own = dict( ( intf, cidr ) for intf, cidr in addresses.items()
+                        if intf.split( '.' )[ 0 ] in intfs[ name ] )
+            fragment = digest( [ PLAN_VERSION, name, self.nodes[ name ],
+                                 intfs[ name ], own ] )
+            cmds = self.cache.get( 'node', fragment )
+            if cmds is None:
+                cmds = self.compileNode( name, intfs[ name ] )
+                self.cache.put( 'node', fragment, cmds )
+                compiled.append( name )
+            config[ name ] = cmds
+        fragment = digest( [ PLAN_VERSION, self.l3(), links ] )
+        routes = self.cache.get( 'routes', fragment )
+        if routes is None:
+            routes = self.compileRoutes( links )
+            self.cache.put( 'routes', fragment, routes )
+            compiled.append( 'routes' )
+        for name, cmds in routes.items():
+            config[ name ] = config[ name ] + cmds
+        plan = { 'version': PLAN_VERSION,
+                 'link': self.spec.get( 'link' ),
+                 'nodes': sorted( self.nodes ),
+                 'links': links,
+                 'config': config }
+        self.cache.put( 'plan', key, plan )
+        info( '*** Compiled build plan %s (%s)\n' % (
+            key[ :12 ], ' '.join( compiled ) or 'all fragments cached' ) )
+        return plan
+
+    def build( self, plan=None, configClass=NodeConfig ):
+        """Create, build and configure a Mininet from plan; return the net.
+           configClass: NodeConfig, or rtnl.NetlinkConfig to skip the shell"""
+        if plan is None:
+            plan = self.compile()
+        net = Mininet( link=TCLink if plan[ 'link' ] == 'tc' else Link )
+        for name in plan[ 'nodes' ]:
+            net.addHost( name )
+        for node1, intf1, node2, intf2 in plan[ 'links' ]:
+            net.addLink( node1, node2, intfName1=intf1, intfName2=intf2 )
+        net.build()
+        configs = []
+        for name in plan[ 'nodes' ]:
+            config = configClass( net[ name ] )
+            for cmd in plan[ 'config' ].get( name, [] ):
+                config.cmd( cmd )
+            configs.append( config )
+        runConfigs( configs )
+        return net
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument( 'spec', help='spec.json or spec.yaml' )
+    parser.add_argument( '--netlink', action='store_true',
+                         help='configure nodes over rtnetlink' )
+    args = parser.parse_args()
+    setLogLevel( 'info' )
+    if args.netlink:
+        from rtnl import NetlinkConfig
+        net = TopoSpec.load( args.spec ).build( configClass=NetlinkConfig )
+    else:
+        net = TopoSpec.load( args.spec ).build()
+    CLI( net )
+    net.stop()
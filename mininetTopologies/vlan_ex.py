@@ -4,6 +4,9 @@ from mininet.cli import CLI
 from mininet.link import Link, TCLink, Intf
 from mininet.node import RemoteController
 
+from CustomTopo_Router import VlanRouter
+from vlanswitch import VlanSwitch
+
 
 
 if '__main__' == __name__:
@@ -18,13 +21,19 @@ if '__main__' == __name__:
 
     h4 = net.addHost('h4')
 
-    #h5 is a switch
+    #h5 is a switch: h5-eth0 and h5-eth1 are access ports in vlan 10,
+    #h5-eth2 and h5-eth3 in vlan 20, and h5-eth4 trunks both to h6
 
-    h5 = net.addHost('h5')
+    h5 = net.addHost('h5', cls=VlanSwitch,
+                     access={'h5-eth0': 10, 'h5-eth1': 10,
+                             'h5-eth2': 20, 'h5-eth3': 20},
+                     trunks={'h5-eth4': [10, 20]})
 
-    #h6 is a router
+    #h6 is a router on a stick: VlanRouter creates h6-eth0.10 and
+    #h6-eth0.20 with their gateway addresses and enables forwarding
 
-    h6 = net.addHost('h6')
+    h6 = net.addHost('h6', cls=VlanRouter,
+                     vlans={10: '10.0.10.254/24', 20: '10.0.20.254/24'})
 
     Link(h1, h5)
 
@@ -46,56 +55,6 @@ if '__main__' == __name__:
 
     h4.cmd("ifconfig h4-eth0 0")
 
-    h5.cmd("ifconfig h5-eth0 0")
-
-    h5.cmd("ifconfig h5-eth1 0")
-
-    h5.cmd("ifconfig h5-eth2 0")
-
-    h5.cmd("ifconfig h5-eth3 0")
-
-    h5.cmd("ifconfig h5-eth4 0")
-
-    h6.cmd("ifconfig h6-eth0 0")
-
-    h5.cmd("vconfig add h5-eth4 10")
-
-    h5.cmd("vconfig add h5-eth4 20")
-
-    h6.cmd("vconfig add h6-eth0 10")
-
-    h6.cmd("vconfig add h6-eth0 20")
-
-    h5.cmd("ifconfig h5-eth4.10 up")
-
-    h5.cmd("ifconfig h5-eth4.20 up")
-
-    h5.cmd("brctl addbr brvlan10")
-
-    h5.cmd("brctl addbr brvlan20")
-
-    h5.cmd("brctl addif brvlan10 h5-eth0")
-
-    h5.cmd("brctl addif brvlan10 h5-eth1")
-
-    h5.cmd("brctl addif brvlan10 h5-eth4.10")
-
-    h5.cmd("brctl addif brvlan20 h5-eth2")
-
-    h5.cmd("brctl addif brvlan20 h5-eth3")
-
-    h5.cmd("brctl addif brvlan20 h5-eth4.20")
-
-    h5.cmd("ifconfig brvlan10 up")
-
-    h5.cmd("ifconfig brvlan20 up")
-
-    h6.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
-
-    h6.cmd("ifconfig h6-eth0.10 10.0.10.254 netmask 255.255.255.0")
-
-    h6.cmd("ifconfig h6-eth0.20 10.0.20.254 netmask 255.255.255.0")
-
     h1.cmd("ifconfig h1-eth0 10.0.10.1 netmask 255.255.255.0")
 
     h2.cmd("ifconfig h2-eth0 10.0.10.2 netmask 255.255.255.0")
@@ -0,0 +1,100 @@
+"""VLAN-aware L2 switch node.
+
+4h_1sw.py, vlan_ex.py and the inter-VLAN example turn a host into a
+switch with one Linux bridge per VLAN (brctl addbr vlan10) and, on
+trunks, one 8021q subinterface per VLAN and trunk port (vconfig add
+s5-eth4 10). Kernel objects and commands grow with VLANs x trunk ports.
+
+VlanSwitch keeps every port on one VLAN-filtering bridge instead.
+Access ports carry one VLAN untagged. Trunk ports carry tagged VLANs,
+given as ids and 'first-last' ranges. A range costs one
+'bridge vlan add' command however many VLANs it holds, so the switch
+has one bridge whatever the number of VLANs, and its commands grow
+with ports only:
+
+    s5 = net.addHost( 's5', cls=VlanSwitch,
+                      access={ 's5-eth0': 10, 's5-eth1': 10,
+                               's5-eth2': 20, 's5-eth3': 20 },
+                      trunks={ 's5-eth4': [ 10, 20, '100-4000' ] } )
+
+The whole configuration is pushed in one NodeConfig batch when the net
+configures its hosts (net.build()). The kernel needs
+CONFIG_BRIDGE_VLAN_FILTERING.
+"""
+
+from mininet.node import Node
+
+from nodeconfig import NodeConfig
+
+MAX_VID = 4094
+
+
+def vlanRanges( vids ):
+    """Return vids (an id, a 'first-last' range, or a list of both) as
+       the fewest 'first-last' ranges, e.g. [ 10, 11, 12, 20 ] ->
+       [ '10-12', '20' ]"""
+    if isinstance( vids, ( int, str ) ):
+        vids = [ vids ]
+    spans = []
+    for vid in vids:
+        first, _, last = str( vid ).partition( '-' )
+        first, last = int( first ), int( last or first )
+        if not 1 <= first <= last <= MAX_VID:
+            raise ValueError( 'bad VLAN id or range %s' % vid )
+        spans.append( ( first, last ) )
+    merged = []
+    for first, last in sorted( spans ):
+        if merged and first <= merged[ -1 ][ 1 ] + 1:
+            merged[ -1 ][ 1 ] = max( merged[ -1 ][ 1 ], last )
+        else:
+            merged.append( [ first, last ] )
+    return [ '%d-%d' % ( first, last ) if first != last else str( first )
+             for first, last in merged ]
+
+
+class VlanSwitch( Node ):
+    "A Node that switches its ports through one VLAN-filtering bridge."
+
+    def config( self, access=None, trunks=None, native=None, bridge='br0',
+                **params ):
+        """access: { port: vid } untagged access ports
+           trunks: { port: vids } tagged trunk ports; vids as vlanRanges()
+           native: { trunk port: vid } untagged VLAN of a trunk
+           bridge: name of the bridge"""
+        r = super( VlanSwitch, self ).config( **params )
+        self.bridge = bridge
+        self.access = dict( access or {} )
+        self.trunks = dict( trunks or {} )
+        self.native = dict( native or {} )
+        self.configure( NodeConfig( self ) ).run()
+        return r
+
+    def configure( self, config ):
+        "Queue the bridge and port configuration on NodeConfig config."
+        config.ip( 'link add name %s type bridge vlan_filtering 1 '
+                   'vlan_default_pvid 0' % self.bridge )
+        ports = sorted( set( self.access ) | set( self.trunks ) )
+        for port in ports:
+            config.addrFlush( port )
+            config.linkMaster( port, self.bridge )
+            config.linkUp( port )
+        for port in ports:
+            if port in self.access:
+                config.bridgeVlan( port, self.access[ port ], pvid=True,
+                                   untagged=True )
+            for span in vlanRanges( self.trunks.get( port, [] ) ):
+                config.bridgeVlan( port, span )
+            if port in self.native:
+                config.bridgeVlan( port, self.native[ port ], pvid=True,
+                                   untagged=True )
+        config.linkUp( self.bridge )
+        return config
+
+    def addVlans( self, port, vids ):
+        "Add tagged VLANs vids to trunk port in one batch; return failures."
+        config = NodeConfig( self )
+        for span in vlanRanges( vids ):
+            config.bridgeVlan( port, span )
+        self.trunks[ port ] = vlanRanges(
+            vlanRanges( self.trunks.get( port, [] ) ) + vlanRanges( vids ) )
+        return config.run()